@@ -8,7 +8,7 @@ Permite disparar manualmente a coleta de dados do Instagram para um perfil.
 
 Endpoints:
   POST /collect/initial  — pipeline completo (descoberta + snapshots + métricas)
-  POST /collect/refresh  — atualização rápida (snapshots + métricas, sem redescoberta)
+  POST /collect/refresh  — atualização rápida (snapshots + métricas, sem comentários)
 
 Auth: header obrigatório X-Profile-ID (validado via oauth_tokens no MongoDB).
 """
@@ -18,8 +18,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 
 from app.utils.auth import get_authenticated_profile
 from app.services.profile_service import run_profile_service
-from app.services.media_discovery_service import run_media_discovery_service
-from app.services.snapshot_service import run_snapshot_service
+from app.services.snapshot_service import run_media_and_snapshot_service
 from app.services.insights_service import run_post_insights_service
 from app.services.comments_service import run_comments_service
 from app.services.engagement_service import run_engagement_service
@@ -61,8 +60,7 @@ async def collect_initial(profile_id: str = Depends(get_authenticated_profile)):
 
     steps = [
         _run_step("profile_service",          run_profile_service,          profile_id),
-        _run_step("media_discovery_service",  run_media_discovery_service,  profile_id),
-        _run_step("snapshot_service",         run_snapshot_service,         profile_id),
+        _run_step("media_and_snapshot_service", run_media_and_snapshot_service, profile_id),
         _run_step("post_insights_service",    run_post_insights_service,    profile_id),
         _run_step("comments_service",         run_comments_service,         profile_id),
         _run_step("engagement_service",       run_engagement_service,       profile_id),
@@ -84,17 +82,22 @@ async def collect_initial(profile_id: str = Depends(get_authenticated_profile)):
 
 @router.post(
     "/refresh",
-    summary="Atualização rápida (sem redescoberta de posts)",
+    summary="Atualização rápida (sem comentários)",
     description=(
-        "Executa apenas as etapas de atualização de dados existentes: "
-        "snapshot → insights de posts → métricas de engajamento → métricas de vídeo. "
-        "Não redescobre posts novos. Use para atualizar dados de forma recorrente "
-        "entre execuções do Airflow."
+        "Executa as etapas de atualização de dados: "
+        "snapshot (com registro de posts novos) → insights de posts → métricas de engajamento → "
+        "métricas de vídeo. Não coleta comentários. Use para atualizar dados de forma "
+        "recorrente entre execuções do Airflow."
     ),
 )
 async def collect_refresh(profile_id: str = Depends(get_authenticated_profile)):
     """
-    Atualização rápida — apenas dados recentes, sem redescoberta de posts.
+    Atualização rápida — apenas dados recentes, sem comentários.
+
+    Usa a mesma passada única de /media do DAG: o snapshot percorre todas as
+    páginas de qualquer forma, e gravar os posts novos encontrados nelas custa só
+    um $in por página — sem isso, posts publicados desde a última coleta ficariam
+    com snapshot mas sem documento em 'posts' (e sem insights).
 
     Indicado para execuções recorrentes. O Airflow (dag_instagram_etl) faz
     a mesma coisa automaticamente @daily — este endpoint é para atualizações manuais.
@@ -102,7 +105,7 @@ async def collect_refresh(profile_id: str = Depends(get_authenticated_profile)):
     logger.info(f"[collect/refresh] Iniciando atualização rápida para profile_id={profile_id}")
 
     steps = [
-        _run_step("snapshot_service",         run_snapshot_service,         profile_id),
+        _run_step("media_and_snapshot_service", run_media_and_snapshot_service, profile_id),
         _run_step("post_insights_service",    run_post_insights_service,    profile_id),
         _run_step("engagement_service",       run_engagement_service,       profile_id),
         _run_step("video_metrics_service",    run_video_metrics_service,    profile_id),
@@ -7,21 +7,27 @@ DAGs disponíveis:
         Pipeline diário de Extract (coleta de dados) + Transform (métricas de posts).
         Schedule padrão: @daily (03:00) — altere SCHEDULE_INTERVAL no arquivo.
 
-        Tasks de Extração:
-            extract_profile >> extract_media_discovery >> extract_snapshot
-            >> extract_post_insights >> extract_comments
+        list_profiles >> profile_etl (task group mapeado, uma instância por perfil ativo)
 
-        Tasks de Transformação (posts):
-            >> transform_engagement >> transform_video_metrics >> transform_sentiment
+        Ramos paralelos por perfil:
+            extract_profile >> extract_media_and_snapshot >> [extract_post_insights, extract_comments]
+            extract_post_insights >> [transform_engagement, transform_video_metrics]
+            extract_comments >> transform_sentiment
 
     dag_weekly_insights.py
         Pipeline semanal de métricas de conta + crescimento de perfil.
         Schedule: domingos às 04:00 (cron: 0 4 * * 0).
 
-        Tasks de Extração:
+        list_profiles >> weekly_profile (task group mapeado, uma instância por perfil ativo)
+
+        Dentro de cada weekly_profile:
             extract_profile_insights   (reach, accounts_engaged, views, demographics)
+                >> transform_growth    (série de crescimento 1d/7d/28d/90d dos profile_snapshots da semana)
+
+    profile_fanout.py
+        Helpers compartilhados do fan-out por perfil (list_profiles_to_process e
+        limites de paralelismo). Não define DAG.
 
-        Tasks de Transformação (perfil):
-            >> transform_growth        (followers_growth_7d + loyalty_rate)
-            >> transform_qualification (placeholder — aguarda qualification_service 2.5)
+    datasets.py
+        Airflow Datasets das collections (outlets/inlets das tasks). Não define DAG.
 """
@@ -5,25 +5,45 @@ Orquestra o pipeline ETL de coleta (Extract) e transformações de posts (Transf
 
 Fluxo de execução (bitshift >>):
 
-    [EXTRACT]
+    list_profiles                       (perfis ativos em ig_profiles, lidos a cada execução)
+        >> profile_etl[profile_id]      (task group mapeado — uma instância por perfil)
+
+    Dentro de cada profile_etl (ramos paralelos — cada task depende só do que lê):
+
     extract_profile
-        >> extract_media_discovery
-        >> extract_snapshot
-        >> extract_post_insights
-        >> extract_comments
+        >> extract_media_and_snapshot   (descoberta de posts + snapshot numa única paginação de /media)
+            >> extract_post_insights
+                >> transform_engagement      (post_snapshots + post_insights)
+                >> transform_video_metrics   (post_insights)
+            >> extract_comments              (incremental: usa os post_snapshots do dia)
+                >> transform_sentiment       (comments)
+
+    extract_comments não depende de extract_post_insights: os dois ramos rodam ao
+    mesmo tempo, e cada transform começa assim que os seus dados de entrada estão
+    gravados. engagement e video_metrics escrevem campos distintos do mesmo
+    documento de engagement_metrics ($set por campo), então podem rodar juntos.
+
+    Leitura consistente: os services de extração só avançam o watermark do dataset
+    (etl_watermarks) depois de gravar a última página, e os transforms leem até o
+    watermark — nunca o estado parcial de uma coleta em andamento.
 
-    [TRANSFORM — métricas de posts]  ← só inicia após toda a cadeia de extração
-        >> transform_engagement
-        >> transform_video_metrics
-        >> transform_sentiment
+    Datasets: cada task declara em outlets/inlets as collections que escreve/lê
+    (app/dags/datasets.py), expostas como Airflow Datasets.
 
-Nota: transform_growth e loyaty_rate são responsabilidade do dag_weekly_insights,
-pois dependem de profile_insights (account-level) que é coletado semanalmente.
+Nota: transform_growth é responsabilidade do dag_weekly_insights, que roda logo
+depois da coleta semanal de profile_insights (account-level).
 
-Cada task delega para o respectivo run_*_service(profile_id),passando profile_id via Airflow Variable "ig_profile_id".
+Fan-out por perfil (dynamic task mapping):
+    Cada task delega para o respectivo run_*_service(profile_id). O grupo é mapeado
+    sobre a lista de list_profiles, e as dependências valem por perfil (mesmo
+    map_index): a falha de um perfil só marca upstream_failed as tasks daquele perfil.
+
+    MAX_ACTIVE_TASKS limita as tasks simultâneas do DAG run inteiro e
+    MAX_PROFILES_IN_FLIGHT quantos perfis rodam cada task ao mesmo tempo.
 
 Configuração:
-    - AIRFLOW_VAR_IG_PROFILE_ID : profile_id do usuário Instagram a processar
+    - AIRFLOW_VAR_IG_PROFILE_ID_OVERRIDE : (opcional) restringe a execução a um único profile_id
+    - IG_ETL_MAX_ACTIVE_TASKS / IG_ETL_MAX_PROFILES_IN_FLIGHT : limites de paralelismo (env)
     - AIRFLOW_CONN_MONGO_DEFAULT : URI de conexão MongoDB (usado pelos services)
 
 Agendamento:
@@ -36,18 +56,21 @@ import logging
 from datetime import datetime
 
 from airflow import DAG
-from airflow.models import Variable
+from airflow.decorators import task_group
 from airflow.operators.python import PythonOperator
 
 # Import dos serviços ETL
 from app.services.profile_service import run_profile_service
-from app.services.media_discovery_service import run_media_discovery_service
-from app.services.snapshot_service import run_snapshot_service
+from app.services.snapshot_service import run_media_and_snapshot_service
 from app.services.insights_service import run_post_insights_service
 from app.services.comments_service import run_comments_service
 from app.services.engagement_service import run_engagement_service
 from app.services.video_metrics_service import run_video_metrics_service
 from app.services.sentiment_service import run_sentiment_service
+from app.dags import datasets
+from app.dags.profile_fanout import (
+    MAX_ACTIVE_TASKS, MAX_PROFILES_IN_FLIGHT, list_profiles_to_process,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -63,21 +86,7 @@ DEFAULT_ARGS = {
     "email_on_failure": False,
 }
 
-# Helpers — wrappers que lêem profile_id do Airflow Variables
-
-def _get_profile_id() -> str:
-    """
-    Lê o profile_id da Airflow Variable 'ig_profile_id'.
-    Lança ValueError se não estiver configurada, fazendo a task falhar de forma clara antes de tentar qualquer chamada à API.
-    """
-    profile_id = Variable.get("ig_profile_id", default_var=None)
-    if not profile_id:
-        raise ValueError(
-            "Airflow Variable 'ig_profile_id' não configurada. "
-            "Acesse Admin > Variables e adicione a chave 'ig_profile_id'."
-        )
-    return profile_id
-
+# Helpers
 
 def _log_result(service_name: str, result: dict) -> None:
     """Loga o resultado de um service e levanta exceção se status == 'error'."""
@@ -90,64 +99,56 @@ def _log_result(service_name: str, result: dict) -> None:
 
 # Funções de task — uma por service
 
-def task_fn_profile(**context):
-    profile_id = _get_profile_id()
+def task_fn_profile(profile_id: str, **context):
     result = run_profile_service(profile_id=profile_id)
     _log_result("profile_service", result)
 
 
-def task_fn_media_discovery(**context):
-    profile_id = _get_profile_id()
-    result = run_media_discovery_service(profile_id=profile_id)
-    _log_result("media_discovery_service", result)
-
-
-def task_fn_snapshot(**context):
+def task_fn_media_and_snapshot(profile_id: str, **context):
     """
+    Descoberta de posts + snapshot numa única paginação de /media.
     Passa data de execução do Airflow como target_date para snapshot.
     Isso garante que, mesmo rodando semanalmente, o snapshot registra a data correta do período de coleta.
     """
-    profile_id = _get_profile_id()
     execution_date = context["data_interval_end"].date()
-    result = run_snapshot_service(profile_id=profile_id, target_date=execution_date)
-    _log_result("snapshot_service", result)
+    result = run_media_and_snapshot_service(profile_id=profile_id, target_date=execution_date)
+    _log_result("media_and_snapshot_service", result)
 
 
-def task_fn_post_insights(**context):
-    profile_id = _get_profile_id()
+def task_fn_post_insights(profile_id: str, **context):
     result = run_post_insights_service(profile_id=profile_id)
     _log_result("post_insights_service", result)
 
 
-def task_fn_comments(**context):
-    profile_id = _get_profile_id()
-    result = run_comments_service(profile_id=profile_id)
+def task_fn_comments(profile_id: str, **context):
+    """
+    Incremental: roda depois do snapshot do dia, então só rastreia os posts cujo
+    comments_count mudou (ou publicados recentemente).
+    """
+    result = run_comments_service(profile_id=profile_id, incremental=True)
     _log_result("comments_service", result)
 
 
-def task_fn_engagement(**context):
+def task_fn_engagement(profile_id: str, **context):
     """
     Usa data_interval_end como target_date para calcular métricas do período correto, independente da frequência do schedule.
     """
-    profile_id = _get_profile_id()
     target_date = context["data_interval_end"].date()
     result = run_engagement_service(profile_id=profile_id, target_date=target_date)
     _log_result("engagement_service", result)
 
 
-def task_fn_video_metrics(**context):
-    profile_id = _get_profile_id()
+def task_fn_video_metrics(profile_id: str, **context):
     target_date = context["data_interval_end"].date()
     result = run_video_metrics_service(profile_id=profile_id, target_date=target_date)
     _log_result("video_metrics_service", result)
 
 
-def task_fn_sentiment(**context):
+def task_fn_sentiment(profile_id: str, **context):
     """
     Processa TODOS os comentários sem score do perfil.
     Não usa target_date: o serviço já filtra por índice sparse (sem sentiment_score).
     """
-    profile_id = _get_profile_id()
     result = run_sentiment_service(profile_id=profile_id)
     _log_result("sentiment_service", result)
 
@@ -159,61 +160,86 @@ with DAG(
     start_date=START_DATE,
     catchup=CATCHUP,
     default_args=DEFAULT_ARGS,
+    max_active_tasks=MAX_ACTIVE_TASKS,
     tags=["instagram", "etl", "extract", "transform"],
     doc_md=__doc__,
 ) as dag:
 
-    # ------ EXTRACT ------
-    t_profile = PythonOperator(
-        task_id="extract_profile",
-        python_callable=task_fn_profile,
+    t_list_profiles = PythonOperator(
+        task_id="list_profiles",
+        python_callable=list_profiles_to_process,
     )
 
-    t_media_discovery = PythonOperator(
-        task_id="extract_media_discovery",
-        python_callable=task_fn_media_discovery,
-    )
+    @task_group(group_id="profile_etl")
+    def profile_etl(profile_id: str):
+        """Pipeline completo de um perfil — mapeado uma vez por profile_id."""
+        task_kwargs = {
+            "op_kwargs": {"profile_id": profile_id},
+            "max_active_tis_per_dagrun": MAX_PROFILES_IN_FLIGHT,
+        }
+
+        # ------ EXTRACT ------
+        t_profile = PythonOperator(
+            task_id="extract_profile",
+            python_callable=task_fn_profile,
+            outlets=[datasets.IG_PROFILES],
+            **task_kwargs,
+        )
 
-    t_snapshot = PythonOperator(
-        task_id="extract_snapshot",
-        python_callable=task_fn_snapshot,
-    )
+        t_media_and_snapshot = PythonOperator(
+            task_id="extract_media_and_snapshot",
+            python_callable=task_fn_media_and_snapshot,
+            inlets=[datasets.IG_PROFILES],
+            outlets=[datasets.POSTS, datasets.POST_SNAPSHOTS, datasets.PROFILE_SNAPSHOTS],
+            **task_kwargs,
+        )
 
-    t_post_insights = PythonOperator(
-        task_id="extract_post_insights",
-        python_callable=task_fn_post_insights,
-    )
+        t_post_insights = PythonOperator(
+            task_id="extract_post_insights",
+            python_callable=task_fn_post_insights,
+            inlets=[datasets.POSTS],
+            outlets=[datasets.POST_INSIGHTS],
+            **task_kwargs,
+        )
 
-    t_comments = PythonOperator(
-        task_id="extract_comments",
-        python_callable=task_fn_comments,
-    )
+        t_comments = PythonOperator(
+            task_id="extract_comments",
+            python_callable=task_fn_comments,
+            inlets=[datasets.POSTS, datasets.POST_SNAPSHOTS],
+            outlets=[datasets.COMMENTS],
+            **task_kwargs,
+        )
 
-    # ------ TRANSFORM ------
-    t_engagement = PythonOperator(
-        task_id="transform_engagement",
-        python_callable=task_fn_engagement,
-    )
+        # ------ TRANSFORM ------
+        t_engagement = PythonOperator(
+            task_id="transform_engagement",
+            python_callable=task_fn_engagement,
+            inlets=[datasets.POSTS, datasets.POST_SNAPSHOTS, datasets.POST_INSIGHTS],
+            outlets=[datasets.ENGAGEMENT_METRICS],
+            **task_kwargs,
+        )
 
-    t_video_metrics = PythonOperator(
-        task_id="transform_video_metrics",
-        python_callable=task_fn_video_metrics,
-    )
+        t_video_metrics = PythonOperator(
+            task_id="transform_video_metrics",
+            python_callable=task_fn_video_metrics,
+            inlets=[datasets.POSTS, datasets.POST_INSIGHTS],
+            outlets=[datasets.ENGAGEMENT_METRICS],
+            **task_kwargs,
+        )
 
-    t_sentiment = PythonOperator(
-        task_id="transform_sentiment",
-        python_callable=task_fn_sentiment,
-    )
+        t_sentiment = PythonOperator(
+            task_id="transform_sentiment",
+            python_callable=task_fn_sentiment,
+            inlets=[datasets.COMMENTS],
+            outlets=[datasets.COMMENTS],
+            **task_kwargs,
+        )
 
-    # Dependências (pipeline linear)
-    # transform_growth está no dag_weekly_insights (requer profile_insights account-level)
-    (
-        t_profile
-        >> t_media_discovery
-        >> t_snapshot
-        >> t_post_insights
-        >> t_comments
-        >> t_engagement
-        >> t_video_metrics
-        >> t_sentiment
-    )
+        # Dependências (ramos paralelos, por perfil)
+        # transform_growth está no dag_weekly_insights (requer profile_insights account-level)
+        t_profile >> t_media_and_snapshot >> [t_post_insights, t_comments]
+        t_post_insights >> [t_engagement, t_video_metrics]
+        t_comments >> t_sentiment
+
+    # Fan-out: uma instância do grupo por perfil ativo
+    profile_etl.expand(profile_id=t_list_profiles.output)
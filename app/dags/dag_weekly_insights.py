@@ -7,34 +7,46 @@ na janela de 7 dias:
 
   - Coleta de profile insights da Graph API (accounts_engaged, views, reach,
     demographics), que a Meta só disponibiliza com agregação de período.
-  - Cálculo de crescimento de seguidores (7d) que depende dos profile_snapshots
+  - Cálculo de crescimento de seguidores (1d/7d/28d/90d) que depende dos profile_snapshots
     coletados diariamente pelo dag_instagram_etl.
 
 Fluxo de execução (bitshift >>):
 
+    list_profiles
+        >> weekly_profile[profile_id]   (task group mapeado — uma instância por perfil ativo)
+
+    Dentro de cada weekly_profile:
+
     [EXTRACT]
     extract_profile_insights
 
     [TRANSFORM — métricas de perfil]
         >> transform_growth
 
+A falha de um perfil não afeta os demais (dependências por map_index).
+
 Pré-requisito: dag_instagram_etl deve ter rodado pelo menos uma vez antes,
 para que profile_snapshots existam no banco.
 
 Configuração:
-    - AIRFLOW_VAR_IG_PROFILE_ID : profile_id do usuário Instagram a processar
+    - AIRFLOW_VAR_IG_PROFILE_ID_OVERRIDE : (opcional) restringe a execução a um único profile_id
+    - IG_ETL_MAX_ACTIVE_TASKS / IG_ETL_MAX_PROFILES_IN_FLIGHT : limites de paralelismo (env)
     - AIRFLOW_CONN_MONGO_DEFAULT : URI de conexão MongoDB (usado pelos services)
 """
 
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from airflow import DAG
-from airflow.models import Variable
+from airflow.decorators import task_group
 from airflow.operators.python import PythonOperator
 
 from app.services.insights_service import run_profile_insights_service
 from app.services.growth_service import run_growth_service
+from app.dags import datasets
+from app.dags.profile_fanout import (
+    MAX_ACTIVE_TASKS, MAX_PROFILES_IN_FLIGHT, list_profiles_to_process,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -53,16 +65,6 @@ DEFAULT_ARGS = {
 PROFILE_INSIGHTS_PERIOD_DAYS = 7     # janela de coleta da Graph API
 
 # Helpers
-def _get_profile_id() -> str:
-    profile_id = Variable.get("ig_profile_id", default_var=None)
-    if not profile_id:
-        raise ValueError(
-            "Airflow Variable 'ig_profile_id' não configurada. "
-            "Acesse Admin > Variables e adicione a chave 'ig_profile_id'."
-        )
-    return profile_id
-
-
 def _log_result(service_name: str, result: dict) -> None:
     if result.get("status") == "error":
         raise RuntimeError(
@@ -72,11 +74,10 @@ def _log_result(service_name: str, result: dict) -> None:
 
 
 # Funções de task
-def task_fn_profile_insights(**context):
+def task_fn_profile_insights(profile_id: str, **context):
     """
     Coleta métricas de conta (reach, accounts_engaged, views, demographics) para a janela de 7 dias encerrada em data_interval_end.
     """
-    profile_id = _get_profile_id()
     target_until = context["data_interval_end"].date()
     result = run_profile_insights_service(
         profile_id=profile_id,
@@ -86,21 +87,25 @@ def task_fn_profile_insights(**context):
     _log_result("profile_insights_service", result)
 
 
-def task_fn_growth(**context):
+def task_fn_growth(profile_id: str, **context):
     """
-    Calcula crescimento semanal de seguidores (7d) e Loyalty Rate.
+    Calcula a série de crescimento (1d/7d/28d/90d) dos snapshots da semana.
 
     Depende de:
       - profile_snapshots coletados diariamente pelo dag_instagram_etl
       - profile_insights coletado pela task anterior (extract_profile_insights)
     """
-    profile_id = _get_profile_id()
     target_date = context["data_interval_end"].date()
-    result = run_growth_service(profile_id=profile_id, target_date=target_date)
+    # Os 7 snapshots diários do intervalo — a curva não tem buracos entre execuções
+    result = run_growth_service(
+        profile_id=profile_id,
+        target_date=target_date,
+        since=target_date - timedelta(days=6),
+    )
     _log_result("growth_service", result)
 
 
-def task_fn_qualification(**context):
+def task_fn_qualification(profile_id: str, **context):
     """
     Placeholder — ativado quando qualification_service estiver implementado (task 2.5).
     """
@@ -109,7 +114,6 @@ def task_fn_qualification(**context):
         "Task reservada para quando qualification_service estiver pronto"
     )
     # from app.services.qualification_service import run_qualification_service
-    # profile_id = _get_profile_id()
     # result = run_qualification_service(profile_id=profile_id)
     # _log_result("qualification_service", result)
 
@@ -121,21 +125,43 @@ with DAG(
     start_date=START_DATE,
     catchup=CATCHUP,
     default_args=DEFAULT_ARGS,
+    max_active_tasks=MAX_ACTIVE_TASKS,
     tags=["instagram", "etl", "insights", "weekly", "growth"],
     doc_md=__doc__,
 ) as dag:
 
-    # ------ EXTRACT ------
-    t_profile_insights = PythonOperator(
-        task_id="extract_profile_insights",
-        python_callable=task_fn_profile_insights,
+    t_list_profiles = PythonOperator(
+        task_id="list_profiles",
+        python_callable=list_profiles_to_process,
     )
 
-    # ------ TRANSFORM ------
-    t_growth = PythonOperator(
-        task_id="transform_growth",
-        python_callable=task_fn_growth,
-    )
+    @task_group(group_id="weekly_profile")
+    def weekly_profile(profile_id: str):
+        """Coleta semanal + crescimento de um perfil — mapeado uma vez por profile_id."""
+        task_kwargs = {
+            "op_kwargs": {"profile_id": profile_id},
+            "max_active_tis_per_dagrun": MAX_PROFILES_IN_FLIGHT,
+        }
+
+        # ------ EXTRACT ------
+        t_profile_insights = PythonOperator(
+            task_id="extract_profile_insights",
+            python_callable=task_fn_profile_insights,
+            inlets=[datasets.IG_PROFILES],
+            outlets=[datasets.PROFILE_INSIGHTS],
+            **task_kwargs,
+        )
+
+        # ------ TRANSFORM ------
+        t_growth = PythonOperator(
+            task_id="transform_growth",
+            python_callable=task_fn_growth,
+            inlets=[datasets.PROFILE_SNAPSHOTS, datasets.PROFILE_INSIGHTS],
+            **task_kwargs,
+        )
+
+        # ------ DEPENDÊNCIAS ------
+        t_profile_insights >> t_growth
 
-    # ------ DEPENDÊNCIAS ------
-    t_profile_insights >> t_growth
+    # Fan-out: uma instância do grupo por perfil ativo
+    weekly_profile.expand(profile_id=t_list_profiles.output)
@@ -0,0 +1,26 @@
+"""
+Airflow Datasets das collections do ETL.
+
+Cada task declara em outlets as collections que escreve e em inlets as que lê.
+O Airflow registra um evento de dataset a cada task concluída com sucesso, o que
+dá a linhagem collection → task na UI e permite que DAGs consumidores sejam
+agendados por dados (schedule=[POST_INSIGHTS, ...]) em vez de por horário.
+
+URI: mongodb://instagram_etl/{collection}
+"""
+
+from airflow.datasets import Dataset
+
+
+def _collection(name: str) -> Dataset:
+    return Dataset(f"mongodb://instagram_etl/{name}")
+
+
+IG_PROFILES        = _collection("ig_profiles")
+POSTS              = _collection("posts")
+POST_SNAPSHOTS     = _collection("post_snapshots")
+PROFILE_SNAPSHOTS  = _collection("profile_snapshots")
+POST_INSIGHTS      = _collection("post_insights")
+PROFILE_INSIGHTS   = _collection("profile_insights")
+COMMENTS           = _collection("comments")
+ENGAGEMENT_METRICS = _collection("engagement_metrics")
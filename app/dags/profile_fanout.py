@@ -0,0 +1,57 @@
+"""
+Fan-out por perfil — helpers compartilhados pelos DAGs.
+
+Os DAGs não processam mais um único perfil fixo: a task list_profiles lê os
+perfis ativos de ig_profiles a cada execução e o pipeline de cada perfil roda
+numa instância de um task group mapeado (dynamic task mapping).
+
+Configuração:
+    - AIRFLOW_VAR_IG_PROFILE_ID_OVERRIDE : (opcional) restringe a execução a um único profile_id
+    - IG_ETL_MAX_ACTIVE_TASKS            : máximo de tasks simultâneas por DAG run
+    - IG_ETL_MAX_PROFILES_IN_FLIGHT      : máximo de perfis executando a mesma task ao mesmo tempo
+
+A antiga Variable 'ig_profile_id' (obrigatória antes do fan-out, então presente em
+toda instalação existente) é ignorada — só gera um aviso. Restringir a um perfil
+é opt-in pela Variable 'ig_profile_id_override'.
+"""
+
+import os
+import logging
+
+from airflow.models import Variable
+
+from app.services.profile_service import list_active_profile_ids
+
+logger = logging.getLogger(__name__)
+
+MAX_ACTIVE_TASKS = int(os.getenv("IG_ETL_MAX_ACTIVE_TASKS", "16"))
+MAX_PROFILES_IN_FLIGHT = int(os.getenv("IG_ETL_MAX_PROFILES_IN_FLIGHT", "4"))
+
+OVERRIDE_VARIABLE = "ig_profile_id_override"
+LEGACY_VARIABLE = "ig_profile_id"
+
+
+def list_profiles_to_process() -> list[str]:
+    """
+    profile_ids a processar nesta execução: todos os perfis ativos de ig_profiles.
+    Se a Airflow Variable 'ig_profile_id_override' estiver configurada, processa só esse perfil.
+    Lança ValueError se não houver nenhum perfil, fazendo a task falhar de forma clara.
+    """
+    if Variable.get(LEGACY_VARIABLE, default_var=None):
+        logger.warning(
+            f"[profile_fanout] A Airflow Variable '{LEGACY_VARIABLE}' não restringe mais a execução e "
+            f"será ignorada — todos os perfis ativos são processados. Para um único perfil use "
+            f"'{OVERRIDE_VARIABLE}'; caso contrário, remova a Variable antiga."
+        )
+
+    profile_id = Variable.get(OVERRIDE_VARIABLE, default_var=None)
+    if profile_id:
+        logger.warning(f"[profile_fanout] '{OVERRIDE_VARIABLE}' configurada — processando só profile_id={profile_id}")
+    profile_ids = [profile_id] if profile_id else list_active_profile_ids()
+    if not profile_ids:
+        raise ValueError(
+            "Nenhum perfil ativo em ig_profiles. Conecte uma conta via OAuth "
+            f"ou configure a Airflow Variable '{OVERRIDE_VARIABLE}'."
+        )
+    logger.info(f"[profile_fanout] {len(profile_ids)} perfis a processar: {profile_ids}")
+    return profile_ids
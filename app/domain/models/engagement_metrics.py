@@ -56,12 +56,6 @@ class EngagementMetrics(BaseModel):
         default=None,
         description="Delta de comentários nas últimas 24h (hoje - ontem).",
     )
-    loyalty_rate: Optional[float] = Field(
-        default=None,
-        ge=0,
-        le=1,
-        description="Taxa de fidelidade: interações únicas / total de seguidores. Entre 0 e 1.",
-    )
     days_since_published: Optional[int] = Field(
         default=None,
         ge=0,
@@ -83,7 +77,6 @@ class EngagementMetrics(BaseModel):
                 "er_reach": 0.251,
                 "velocity_likes_24h": 12,
                 "velocity_comments_24h": 2,
-                "loyalty_rate": 0.034,
                 "days_since_published": 120,
                 "calculated_at": "2026-03-17T04:00:00Z",
             }
@@ -0,0 +1,132 @@
+"""
+Escrita em lote para as collections insert-only/write-once do ETL.
+
+Os services de extração gravam documentos que podem já existir (re-runs do DAG,
+posts e comentários vistos em execuções anteriores). Em vez de um insert_one
+por documento com DuplicateKeyError como dedup, os documentos são acumulados
+e enviados com insert_many(ordered=False): o MongoDB insere todos os que não
+violam índice único e devolve um BulkWriteError listando os que falharam.
+
+BulkWriteError.details:
+    nInserted   -> documentos gravados
+    writeErrors -> [{index, code, errmsg, ...}] — index relativo ao lote enviado
+                   code 11000 = duplicate key (documento já conhecido, não é erro)
+
+As contagens inserted / duplicates / errors reproduzem exatamente as de um loop
+de insert_one (sucesso / DuplicateKeyError / outra exceção).
+
+Uso:
+    with BulkInserter(mongo_repo.comments, "[comments_service]", key_field="comment_id") as writer:
+        for doc in docs:
+            writer.add(doc)
+    writer.result.inserted, writer.result.duplicates, writer.result.errors
+"""
+
+import logging
+from dataclasses import dataclass
+
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY_ERROR = 11000
+
+# Documentos por insert_many (bem abaixo do limite de 16 MB / 100k ops por lote do MongoDB)
+DEFAULT_BULK_BATCH_SIZE = 500
+
+
+@dataclass
+class BulkInsertResult:
+    inserted: int = 0
+    duplicates: int = 0
+    errors: int = 0
+
+    def add(self, other: "BulkInsertResult") -> None:
+        self.inserted   += other.inserted
+        self.duplicates += other.duplicates
+        self.errors     += other.errors
+
+
+def insert_many_unordered(
+    collection,
+    docs: list[dict],
+    log_prefix: str = "[bulk_writer]",
+    key_field: str | None = None,
+) -> BulkInsertResult:
+    """
+    Insere `docs` com um único insert_many(ordered=False).
+
+    Duplicatas (code 11000) contam como `duplicates`; qualquer outro erro por
+    documento conta como `errors` e é logado (com o valor de `key_field`, se dado).
+    Uma falha do lote inteiro (rede, timeout) conta todos os documentos como erro.
+    """
+    if not docs:
+        return BulkInsertResult()
+
+    try:
+        result = collection.insert_many(docs, ordered=False)
+        return BulkInsertResult(inserted=len(result.inserted_ids))
+    except BulkWriteError as e:
+        outcome = BulkInsertResult(inserted=e.details.get("nInserted", 0))
+        for err in e.details.get("writeErrors", []):
+            if err.get("code") == DUPLICATE_KEY_ERROR:
+                outcome.duplicates += 1
+                continue
+            outcome.errors += 1
+            key = docs[err["index"]].get(key_field) if key_field else err["index"]
+            logger.error(f"{log_prefix} Erro ao inserir {key_field or 'documento'}={key}: {err.get('errmsg')}")
+        return outcome
+    except PyMongoError as e:
+        logger.error(f"{log_prefix} Falha no insert_many de {len(docs)} documentos em {collection.name}: {e}")
+        return BulkInsertResult(errors=len(docs))
+
+
+class BulkInserter:
+    """
+    Buffer de documentos com flush automático a cada `batch_size`.
+
+    Acumula os resultados de todos os flushes em `result`. Usado como context
+    manager, faz o flush final na saída do bloco.
+    """
+
+    def __init__(
+        self,
+        collection,
+        log_prefix: str = "[bulk_writer]",
+        key_field: str | None = None,
+        batch_size: int = DEFAULT_BULK_BATCH_SIZE,
+    ):
+        self.collection = collection
+        self.log_prefix = log_prefix
+        self.key_field  = key_field
+        self.batch_size = batch_size
+        self.result     = BulkInsertResult()
+        self._buffer: list[dict] = []
+
+    def add(self, doc: dict) -> None:
+        self._buffer.append(doc)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def extend(self, docs) -> None:
+        for doc in docs:
+            self.add(doc)
+
+    def flush(self) -> BulkInsertResult:
+        """Grava o buffer atual e o esvazia. Retorna o resultado só deste lote."""
+        if not self._buffer:
+            return BulkInsertResult()
+        batch, self._buffer = self._buffer, []
+        outcome = insert_many_unordered(self.collection, batch, self.log_prefix, self.key_field)
+        self.result.add(outcome)
+        logger.info(
+            f"{self.log_prefix} {self.collection.name} insert_many: {len(batch)} documentos | "
+            f"novos={outcome.inserted} | já existiam={outcome.duplicates} | erros={outcome.errors}"
+        )
+        return outcome
+
+    def __enter__(self) -> "BulkInserter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.flush()
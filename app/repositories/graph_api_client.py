@@ -0,0 +1,469 @@
+"""
+Cliente HTTP central da Graph API (Meta) para o projeto Instagram Analytics ETL.
+
+Este módulo é o único ponto de contato entre os services Python e a Graph API
+(graph.facebook.com, graph.instagram.com e api.instagram.com).
+Todos os services importam `graph_client` daqui — nunca chamam requests.get/requests.post diretamente.
+
+Por que um cliente compartilhado?
+  Cada `requests.get` solto abre uma conexão TCP nova + handshake TLS.
+  Numa execução diária com milhares de chamadas (insights, comentários, replies)
+  o setup de conexão vira boa parte do tempo total. Uma `requests.Session` com
+  HTTPAdapter mantém conexões keep-alive em pool, reaproveitadas entre chamadas
+  ao mesmo host.
+
+Pool por host (HOST_POOL_SIZES):
+  graph.facebook.com / graph.instagram.com -> pool grande (coleta diária, chamadas concorrentes)
+  api.instagram.com                         -> pool pequeno (apenas troca de code OAuth)
+
+Batch (GraphApiClient.batch):
+  A Graph API aceita até GRAPH_BATCH_MAX_SIZE sub-requisições num único POST com o
+  parâmetro `batch`. A resposta é uma lista na mesma ordem, cada item com seu próprio
+  `code` e `body` (JSON serializado). batch() devolve, por item, o body decodificado
+  ou um GraphApiError — erros individuais não derrubam o lote inteiro.
+
+Cota (RateGovernor, ver graph_rate_governor.py):
+  Toda chamada passa pelo governador antes de sair (pode atrasar ou pausar o
+  caller quando o uso de cota está alto) e toda resposta alimenta a estimativa
+  com os headers X-App-Usage / X-Business-Use-Case-Usage / X-Ad-Account-Usage.
+  Erros de throttling (4/17/32/613/80002) pausam o escopo e a chamada é refeita
+  até MAX_THROTTLE_RETRIES vezes em vez de falhar.
+
+Falhas transitórias (rede, timeout, HTTP 5xx, códigos 1/2 ou is_transient da Meta):
+  Chamadas idempotentes (GET e batch de GETs) são refeitas até MAX_RETRIES vezes
+  com backoff exponencial + jitter. Como a URL refeita é a mesma, a paginação
+  retoma do cursor da página que falhou — as páginas anteriores não são pedidas
+  de novo. Um circuit breaker por host abre após CIRCUIT_FAILURE_THRESHOLD falhas
+  transitórias seguidas e falha rápido por CIRCUIT_COOLDOWN_SECONDS, liberando
+  depois uma única chamada de teste (half-open).
+
+Paginação (GraphApiClient.iter_pages):
+  Segue paging.next gerando uma página por vez — usado por todos os loops
+  cursor-based dos services. Com prefetch=True a próxima página já é pedida
+  enquanto o caller grava a atual.
+
+Erros:
+  Qualquer falha (rede, timeout ou status != 200) é levantada como GraphApiError,
+  com status_code, code, error_subcode e message já decodificados do corpo
+  `{"error": {...}}` retornado pela Meta. Os services capturam GraphApiError e
+  decidem se logam, contam como inelegível ou interrompem a coleta.
+"""
+
+import os
+import re
+import json
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.repositories.graph_rate_governor import RateGovernor, THROTTLING_ERROR_CODES
+
+logger = logging.getLogger(__name__)
+
+GRAPH_VERSION = "v25.0"
+
+# Sobrescrevíveis por env para apontar a coleta para o stub local (benchmarks/graph_api_stub.py)
+FACEBOOK_GRAPH_URL  = os.getenv("GRAPH_FACEBOOK_BASE_URL", "https://graph.facebook.com").rstrip("/")
+INSTAGRAM_GRAPH_URL = os.getenv("GRAPH_INSTAGRAM_BASE_URL", "https://graph.instagram.com").rstrip("/")
+INSTAGRAM_API_URL   = "https://api.instagram.com"
+
+# (connect, read) em segundos — mesmo timeout para todos os services
+DEFAULT_TIMEOUT = (5, 20)
+
+# Tamanho do pool de conexões keep-alive por host
+DEFAULT_POOL_SIZE = 10
+HOST_POOL_SIZES = {
+    "graph.facebook.com":  32,
+    "graph.instagram.com": 32,
+    "api.instagram.com":   4,
+}
+
+# Novas tentativas após erro de throttling (cada uma espera a pausa do governador)
+MAX_THROTTLE_RETRIES = 3
+
+# Falhas transitórias: novas tentativas com backoff exponencial + jitter
+MAX_RETRIES = 4
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS  = 30.0
+TRANSIENT_ERROR_CODES = {1, 2}
+
+# Circuit breaker por host
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_COOLDOWN_SECONDS  = 30.0
+
+# Limite da Graph API de sub-requisições por chamada batch
+GRAPH_BATCH_MAX_SIZE = 50
+
+# Remove tokens de mensagens de erro de rede (o requests inclui a URL completa)
+_TOKEN_PATTERN = re.compile(r"(access_token|client_secret|input_token)=[^&\s'\"]+")
+
+
+def _redact(text: str) -> str:
+    return _TOKEN_PATTERN.sub(r"\1=***", text)
+
+
+def _extract_token(url: str, params: dict | None, data: dict | None) -> str | None:
+    """Localiza o access_token da chamada (params, corpo ou query string da URL de paginação)."""
+    for source in (params, data):
+        if source and source.get("access_token"):
+            return source["access_token"]
+    values = parse_qs(urlsplit(url).query).get("access_token")
+    return values[0] if values else None
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Backoff exponencial com full jitter: uniforme em [0, min(max, base * 2^attempt)]."""
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+def get_base_url(auth_method: str) -> str:
+    """Retorna o host da Graph API para o fluxo de autenticação do perfil."""
+    return FACEBOOK_GRAPH_URL if auth_method == "facebook" else INSTAGRAM_GRAPH_URL
+
+
+class GraphApiError(Exception):
+    """
+    Erro decodificado de uma chamada à Graph API.
+
+    status_code é None para falhas de rede/timeout (a requisição não chegou a ter resposta).
+    code / error_subcode seguem a tabela de erros da Meta, ex:
+        4, 17, 32, 613 -> throttling
+        100            -> parâmetro inválido / mídia inelegível para insights
+        190            -> token inválido ou expirado
+    """
+
+    def __init__(
+        self,
+        message: str,
+        status_code: int | None = None,
+        code: int | None = None,
+        error_subcode: int | None = None,
+        error_type: str | None = None,
+        is_transient: bool = False,
+    ):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.code = code
+        self.error_subcode = error_subcode
+        self.error_type = error_type
+        self.is_transient = is_transient
+
+    @classmethod
+    def from_response(cls, response: requests.Response) -> "GraphApiError":
+        """Decodifica o corpo de erro padrão da Meta: {"error": {"message", "type", "code", "error_subcode"}}."""
+        try:
+            error = response.json().get("error", {})
+        except ValueError:
+            error = {}
+        if not isinstance(error, dict):
+            error = {"message": str(error)}
+        return cls(
+            message=error.get("message") or response.text[:500],
+            status_code=response.status_code,
+            code=error.get("code"),
+            error_subcode=error.get("error_subcode"),
+            error_type=error.get("type"),
+            is_transient=bool(error.get("is_transient")),
+        )
+
+    @classmethod
+    def from_batch_item(cls, item: dict) -> "GraphApiError":
+        """Decodifica um item de erro de uma resposta batch: {"code": 400, "body": "{\"error\": {...}}"}."""
+        try:
+            error = json.loads(item.get("body") or "{}").get("error", {})
+        except ValueError:
+            error = {"message": item.get("body")}
+        return cls(
+            message=error.get("message") or f"Erro no item do batch (HTTP {item.get('code')})",
+            status_code=item.get("code"),
+            code=error.get("code"),
+            error_subcode=error.get("error_subcode"),
+            error_type=error.get("type"),
+            is_transient=bool(error.get("is_transient")),
+        )
+
+    @classmethod
+    def from_exception(cls, exc: requests.RequestException) -> "GraphApiError":
+        return cls(message=_redact(f"{type(exc).__name__}: {exc}"))
+
+    @property
+    def is_network_error(self) -> bool:
+        return self.status_code is None
+
+    @property
+    def is_throttling(self) -> bool:
+        return self.code in THROTTLING_ERROR_CODES
+
+    @property
+    def is_retryable(self) -> bool:
+        """Falha transitória: vale tentar de novo a mesma chamada."""
+        return (
+            self.is_network_error
+            or self.status_code >= 500
+            or self.code in TRANSIENT_ERROR_CODES
+            or self.is_transient
+        )
+
+    def __str__(self) -> str:
+        if self.is_network_error:
+            return f"erro de rede: {self.message}"
+        return f"HTTP {self.status_code} (code={self.code}, subcode={self.error_subcode}): {self.message}"
+
+
+class CircuitOpenError(GraphApiError):
+    """Levantado sem chamar a rede enquanto o circuito do host está aberto."""
+
+    def __str__(self) -> str:
+        return f"circuito aberto: {self.message}"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por host.
+
+    closed    -> chamadas normais; falhas transitórias seguidas são contadas
+    open      -> após CIRCUIT_FAILURE_THRESHOLD falhas, falha rápido por CIRCUIT_COOLDOWN_SECONDS
+    half-open -> fim do cooldown: uma chamada de teste passa; sucesso fecha, falha reabre
+    """
+
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 cooldown_seconds: float = CIRCUIT_COOLDOWN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._failures: dict[str, int] = {}
+        self._open_until: dict[str, float] = {}
+        self._trial_in_flight: set[str] = set()
+        self._lock = threading.Lock()
+
+    def before_request(self, host: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            open_until = self._open_until.get(host)
+            if open_until is None:
+                return
+            if now < open_until or host in self._trial_in_flight:
+                raise CircuitOpenError(f"{host} indisponível após {self._failures.get(host, 0)} falhas seguidas")
+            self._trial_in_flight.add(host)   # half-open: esta chamada é o teste
+
+    def record_success(self, host: str) -> None:
+        with self._lock:
+            if self._open_until.pop(host, None) is not None:
+                logger.info(f"[graph_api] Circuito de {host} fechado novamente")
+            self._failures[host] = 0
+            self._trial_in_flight.discard(host)
+
+    def record_failure(self, host: str) -> None:
+        with self._lock:
+            failures = self._failures.get(host, 0) + 1
+            self._failures[host] = failures
+            was_trial = host in self._trial_in_flight
+            self._trial_in_flight.discard(host)
+            if was_trial or failures >= self.failure_threshold:
+                self._open_until[host] = time.monotonic() + self.cooldown_seconds
+                logger.warning(
+                    f"[graph_api] Circuito de {host} aberto por {self.cooldown_seconds:.0f}s "
+                    f"({failures} falhas transitórias seguidas)"
+                )
+
+
+class GraphApiClient:
+    """
+    Cliente HTTP da Graph API com pool de conexões keep-alive.
+
+    Instanciado uma vez como singleton global (`graph_client`).
+    A Session é criada sob demanda e recriada após fork (pid diferente),
+    para que cada processo worker tenha seus próprios sockets.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, host_pool_sizes: dict[str, int] | None = None):
+        self.timeout = timeout
+        self.host_pool_sizes = host_pool_sizes or HOST_POOL_SIZES
+        self.governor = RateGovernor()
+        self.breaker = CircuitBreaker()
+        self._session: requests.Session | None = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+
+    # ─── Session ──────────────────────────────────────────────────────────────
+
+    def _build_session(self) -> requests.Session:
+        session = requests.Session()
+        # Adapter default para hosts não mapeados (ex: stub local)
+        default_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=DEFAULT_POOL_SIZE)
+        session.mount("https://", default_adapter)
+        session.mount("http://", default_adapter)
+        for host, size in self.host_pool_sizes.items():
+            session.mount(f"https://{host}/", HTTPAdapter(pool_connections=1, pool_maxsize=size))
+        return session
+
+    @property
+    def session(self) -> requests.Session:
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            with self._lock:
+                if self._session is None or self._pid != pid:
+                    self._session = self._build_session()
+                    self._pid = pid
+        return self._session
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    # ─── Requests ─────────────────────────────────────────────────────────────
+
+    def request(self, method: str, url: str, *, params: dict | None = None,
+                data: dict | None = None, timeout=None, idempotent: bool | None = None):
+        """
+        Executa a requisição e retorna o JSON decodificado.
+        Levanta GraphApiError em falha de rede ou status != 200.
+
+        Erros de throttling são refeitos após a pausa do governador.
+        Falhas transitórias são refeitas com backoff se a chamada for idempotente
+        (padrão: só GET).
+        """
+        if idempotent is None:
+            idempotent = method == "GET"
+        access_token = _extract_token(url, params, data)
+        host = urlsplit(url).netloc
+        throttle_retries = 0
+        transient_retries = 0
+
+        while True:
+            self.breaker.before_request(host)
+            self.governor.before_request(access_token)
+            try:
+                response = self.session.request(
+                    method, url, params=params, data=data,
+                    timeout=timeout or self.timeout,
+                )
+            except requests.RequestException as e:
+                error = GraphApiError.from_exception(e)
+            else:
+                self.governor.after_response(access_token, response.headers)
+                if response.status_code == 200:
+                    self.breaker.record_success(host)
+                    break
+                error = GraphApiError.from_response(response)
+
+            logger.debug(f"[graph_api] {method} {urlsplit(url).path} -> {error}")
+
+            if error.is_throttling:
+                self.breaker.record_success(host)   # host respondeu; a cota é problema do governador
+                if throttle_retries < MAX_THROTTLE_RETRIES:
+                    throttle_retries += 1
+                    self.governor.on_throttled(access_token, error.code)
+                    continue
+                raise error
+
+            if not error.is_retryable:
+                # 4xx "normal" (ex: mídia inelegível) — o host está saudável
+                self.breaker.record_success(host)
+                raise error
+
+            self.breaker.record_failure(host)
+            if not idempotent or transient_retries >= MAX_RETRIES:
+                raise error
+
+            delay = _backoff_delay(transient_retries)
+            transient_retries += 1
+            logger.warning(
+                f"[graph_api] Falha transitória em {urlsplit(url).path} ({error}) — "
+                f"tentativa {transient_retries}/{MAX_RETRIES} em {delay:.1f}s"
+            )
+            time.sleep(delay)
+
+        try:
+            return response.json()
+        except ValueError as e:
+            raise GraphApiError(
+                f"Resposta não-JSON: {response.text[:200]}", status_code=response.status_code
+            ) from e
+
+    def get(self, url: str, params: dict | None = None, timeout=None):
+        return self.request("GET", url, params=params, timeout=timeout)
+
+    def post(self, url: str, params: dict | None = None, data: dict | None = None, timeout=None):
+        return self.request("POST", url, params=params, data=data, timeout=timeout)
+
+    def batch(self, base_url: str, relative_urls: list[str], access_token: str, timeout=None) -> list:
+        """
+        Executa até GRAPH_BATCH_MAX_SIZE GETs numa única chamada HTTP.
+
+        relative_urls: caminhos relativos ao host, ex: "v25.0/{media_id}/insights?metric=reach".
+        Retorna uma lista na mesma ordem, com o body decodificado (dict) de cada item
+        ou um GraphApiError para itens que falharam (ou vieram null por timeout interno da Meta).
+        Levanta GraphApiError se a chamada batch inteira falhar.
+        """
+        if len(relative_urls) > GRAPH_BATCH_MAX_SIZE:
+            raise ValueError(f"Batch com {len(relative_urls)} itens excede o limite de {GRAPH_BATCH_MAX_SIZE}")
+
+        batch = [{"method": "GET", "relative_url": url} for url in relative_urls]
+        # Batch só de GETs: seguro refazer em falha transitória
+        items = self.request(
+            "POST", base_url,
+            data={"access_token": access_token, "batch": json.dumps(batch), "include_headers": "false"},
+            timeout=timeout, idempotent=True,
+        )
+
+        results = []
+        throttled_codes = set()
+        for item in items:
+            if item is None:
+                results.append(GraphApiError("Item do batch sem resposta (timeout interno da Graph API)"))
+            elif item.get("code") != 200:
+                error = GraphApiError.from_batch_item(item)
+                if error.is_throttling:
+                    throttled_codes.add(error.code)
+                results.append(error)
+            else:
+                try:
+                    results.append(json.loads(item.get("body") or "{}"))
+                except ValueError:
+                    results.append(GraphApiError(f"Body não-JSON no item do batch: {item.get('body', '')[:200]}",
+                                                 status_code=item.get("code")))
+        # Um registro por escopo, não por item: o batch inteiro é uma única leitura da cota
+        for code in throttled_codes:
+            self.governor.on_throttled(access_token, code)
+        return results
+
+    def iter_pages(self, url: str, params: dict | None = None, prefetch: bool = False):
+        """
+        Gera cada página (dict com data/paging) seguindo paging.next.
+
+        Cada página já é refeita com backoff em falha transitória; se mesmo assim
+        falhar, levanta GraphApiError — as páginas já geradas continuam válidas.
+
+        prefetch=True busca a próxima página numa thread enquanto o caller processa
+        a atual (ex: grava no MongoDB), sobrepondo I/O de rede e de banco. No máximo
+        uma página fica em memória além da que está sendo processada.
+        """
+        if not prefetch:
+            next_url, next_params = url, params
+            while next_url:
+                page = self.get(next_url, params=next_params)
+                yield page
+                next_url = page.get("paging", {}).get("next")
+                next_params = None   # paging.next já traz todos os parâmetros
+            return
+
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="graph_prefetch") as pool:
+            pending = pool.submit(self.get, url, params=params)
+            while pending is not None:
+                page = pending.result()
+                next_url = page.get("paging", {}).get("next")
+                pending = pool.submit(self.get, next_url) if next_url else None
+                yield page
+
+
+# ─── Singleton Global ──────────────────────────────────────────────────────────
+# Os services importam: from app.repositories.graph_api_client import graph_client
+graph_client = GraphApiClient()
@@ -0,0 +1,207 @@
+"""
+Governador de taxa da Graph API, guiado pelos headers de uso da Meta.
+
+A Meta devolve o consumo de cota em headers de toda resposta:
+
+  X-App-Usage                  -> uso do app (janela móvel de 1h), por app
+      {"call_count": 28, "total_time": 25, "total_cputime": 25}
+  X-Business-Use-Case-Usage    -> uso por business/token (Instagram Graph API)
+      {"<business_id>": [{"type": "instagram", "call_count": 96, "total_time": 12,
+                          "total_cputime": 9, "estimated_time_to_regain_access": 0}]}
+  X-Ad-Account-Usage           -> uso por conta de anúncio
+      {"acc_id_util_pct": 9.67, "reset_time_duration": 0}
+
+Todos os valores são percentuais (0-100) da cota. O governador guarda uma
+estimativa viva do uso do app e de cada token (chaveado por hash, o token nunca
+é armazenado) e, antes de cada chamada:
+
+  uso <  USAGE_SLOWDOWN_PCT               -> segue sem espera
+  USAGE_SLOWDOWN_PCT <= uso < PAUSE_PCT   -> atraso proporcional (até MAX_SLOWDOWN_DELAY)
+  uso >= USAGE_PAUSE_PCT                  -> pausa; a cada THROTTLE_COOLDOWN_SECONDS sem
+                                             leitura nova, uma única chamada de sonda passa
+  bloqueado (erro 4/17/32/613/80002)      -> pausa THROTTLE_COOLDOWN_SECONDS ou até
+                                             estimated_time_to_regain_access
+
+Sem novas respostas, a estimativa decai linearmente ao longo da janela de 1h
+da Meta. Uma pausa não espera esse decaimento (minutos a partir de ~100%): a
+sonda traz os headers atuais, que substituem a estimativa — se a cota já
+voltou, os demais callers seguem; se não, a pausa continua com a leitura nova.
+Um erro de throttling só bloqueia o escopo (blocked_until), sem inventar uma
+leitura de uso: ao fim do cooldown vale a última leitura real dos headers.
+"""
+
+import json
+import time
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+USAGE_SLOWDOWN_PCT = 75.0
+USAGE_PAUSE_PCT    = 95.0
+MAX_SLOWDOWN_DELAY = 2.0      # segundos, no limite de USAGE_PAUSE_PCT
+THROTTLE_COOLDOWN_SECONDS = 60.0
+USAGE_WINDOW_SECONDS = 3600.0  # janela móvel de uso da Meta
+
+# Erros de throttling da Graph API (app, usuário, página/BUC, chamadas por ação, Instagram BUC)
+APP_THROTTLING_CODES   = {4}
+TOKEN_THROTTLING_CODES = {17, 32, 613, 80002}
+THROTTLING_ERROR_CODES = APP_THROTTLING_CODES | TOKEN_THROTTLING_CODES
+
+
+def token_key(access_token: str | None) -> str:
+    """Chave estável e não reversível para um token."""
+    if not access_token:
+        return "anonymous"
+    return hashlib.sha256(access_token.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class UsageState:
+    """Última leitura de uso (%), até quando o escopo está bloqueado e última sonda liberada (time.monotonic)."""
+    pct: float = 0.0
+    updated_at: float = 0.0
+    blocked_until: float = 0.0
+    probe_at: float = 0.0
+
+    def estimate(self, now: float) -> float:
+        if not self.updated_at:
+            return 0.0
+        elapsed = now - self.updated_at
+        return max(0.0, self.pct * (1 - elapsed / USAGE_WINDOW_SECONDS))
+
+
+def _max_pct(values: dict, keys=("call_count", "total_time", "total_cputime")) -> float:
+    return max((float(values.get(k) or 0) for k in keys), default=0.0)
+
+
+def _load_header(headers, name: str):
+    raw = headers.get(name)
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)
+    except ValueError:
+        logger.debug(f"[graph_rate_governor] Header {name} inválido: {raw[:200]}")
+        return None
+
+
+class RateGovernor:
+    """
+    Estimativa de uso de cota por app e por token, compartilhada entre threads.
+    Usado internamente pelo GraphApiClient — os services não chamam diretamente.
+    """
+
+    def __init__(self):
+        self._app = UsageState()
+        self._tokens: dict[str, UsageState] = {}
+        self._lock = threading.Lock()
+
+    def _token_state(self, key: str) -> UsageState:
+        state = self._tokens.get(key)
+        if state is None:
+            state = self._tokens[key] = UsageState()
+        return state
+
+    def usage(self, access_token: str | None) -> float:
+        """Uso estimado (%) que limita este token: o maior entre app e token."""
+        now = time.monotonic()
+        with self._lock:
+            return max(self._app.estimate(now), self._token_state(token_key(access_token)).estimate(now))
+
+    def _wait_seconds(self, key: str) -> tuple[float, bool]:
+        """
+        Espera antes da próxima chamada e se ela precisa ser reavaliada depois
+        (pausa/bloqueio) ou se a chamada segue após o atraso (desaceleração).
+        """
+        now = time.monotonic()
+        with self._lock:
+            token = self._token_state(key)
+            blocked_until = max(self._app.blocked_until, token.blocked_until)
+            if blocked_until > now:
+                return blocked_until - now, True
+
+            app_usage, token_usage = self._app.estimate(now), token.estimate(now)
+            usage = max(app_usage, token_usage)
+            if usage >= USAGE_PAUSE_PCT:
+                state = self._app if app_usage >= token_usage else token
+                # Tempo até a estimativa decair abaixo de USAGE_PAUSE_PCT, ou até a próxima sonda
+                resume_at = state.updated_at + USAGE_WINDOW_SECONDS * (1 - USAGE_PAUSE_PCT / state.pct)
+                probe_at = max(state.updated_at, state.probe_at) + THROTTLE_COOLDOWN_SECONDS
+                if probe_at <= now:
+                    # Este caller é a sonda: os headers da resposta atualizam a estimativa
+                    state.probe_at = now
+                    return 0.0, False
+                return max(1.0, min(resume_at, probe_at) - now), True
+            if usage >= USAGE_SLOWDOWN_PCT:
+                ratio = (usage - USAGE_SLOWDOWN_PCT) / (USAGE_PAUSE_PCT - USAGE_SLOWDOWN_PCT)
+                return MAX_SLOWDOWN_DELAY * ratio, False
+            return 0.0, False
+
+    def before_request(self, access_token: str | None) -> None:
+        """Bloqueia o caller o tempo necessário para não estourar a cota."""
+        key = token_key(access_token)
+        while True:
+            wait, recheck = self._wait_seconds(key)
+            if wait >= 1:
+                logger.warning(
+                    f"[graph_rate_governor] Uso de cota alto ({self.usage(access_token):.0f}%) — "
+                    f"aguardando {wait:.1f}s"
+                )
+            if wait > 0:
+                time.sleep(wait)
+            if not recheck:
+                return
+
+    def after_response(self, access_token: str | None, headers) -> None:
+        """Atualiza a estimativa a partir dos headers de uso da resposta."""
+        now = time.monotonic()
+        key = token_key(access_token)
+
+        app_usage = _load_header(headers, "X-App-Usage")
+        buc_usage = _load_header(headers, "X-Business-Use-Case-Usage")
+        ad_usage  = _load_header(headers, "X-Ad-Account-Usage")
+
+        with self._lock:
+            if isinstance(app_usage, dict):
+                self._app.pct = _max_pct(app_usage)
+                self._app.updated_at = now
+
+            token_pct = None
+            regain_seconds = 0.0
+            if isinstance(buc_usage, dict):
+                for entries in buc_usage.values():
+                    for entry in entries if isinstance(entries, list) else []:
+                        token_pct = max(token_pct or 0.0, _max_pct(entry))
+                        regain_seconds = max(
+                            regain_seconds, float(entry.get("estimated_time_to_regain_access") or 0) * 60
+                        )
+            if isinstance(ad_usage, dict):
+                token_pct = max(token_pct or 0.0, float(ad_usage.get("acc_id_util_pct") or 0))
+                if token_pct >= 100:
+                    regain_seconds = max(regain_seconds, float(ad_usage.get("reset_time_duration") or 0))
+
+            if token_pct is not None:
+                state = self._token_state(key)
+                state.pct = token_pct
+                state.updated_at = now
+                if regain_seconds:
+                    state.blocked_until = max(state.blocked_until, now + regain_seconds)
+
+    def on_throttled(self, access_token: str | None, error_code: int | None) -> None:
+        """
+        Registra um erro de throttling: bloqueia o escopo por THROTTLE_COOLDOWN_SECONDS.
+        A estimativa de uso não é alterada — a próxima resposta traz a leitura real.
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._app if error_code in APP_THROTTLING_CODES else self._token_state(token_key(access_token))
+            already_blocked = state.blocked_until > now
+            state.blocked_until = max(state.blocked_until, now + THROTTLE_COOLDOWN_SECONDS)
+        if not already_blocked:
+            logger.warning(
+                f"[graph_rate_governor] Throttling da Graph API (code={error_code}) — "
+                f"pausando chamadas por pelo menos {THROTTLE_COOLDOWN_SECONDS:.0f}s"
+            )
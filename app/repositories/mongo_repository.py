@@ -11,9 +11,13 @@ Nomenclatura das collections:
   'posts'            -> metadados imutáveis de posts
   'post_snapshots'   -> série temporal diária de posts
   'post_insights'    -> métricas acumuladas lifetime de posts
+  'insights_ineligible' -> posts sem insights (pré-Business), com TTL para novo teste
   'comments'         -> comentários e replies embutidas
   'engagement_metrics'-> calculadas pelo Transform ETL
+  'retention_digests' -> t-digests de watch_time_per_view dos Reels, por perfil e semana de publicação
   'oauth_tokens'     -> tokens de acesso OAuth
+  'etl_state'        -> checkpoints de jobs longos (ex: backfill de profile insights)
+  'etl_watermarks'   -> até onde cada dataset de extração está completo, por perfil
 
 Collections e seus índices:
 
@@ -21,11 +25,20 @@ Collections e seus índices:
     profile_snapshots -> (profile_id, date) unique ← UM snapshot por perfil por dia
     posts -> post_id (unique), profile_id, published_at
     post_snapshots -> (post_id, date) unique ← UM snapshot por post por dia
-    post_insights -> (post_id, collected_at) - série temporal acumulada
+    post_insights -> (post_id, collected_at) - série temporal acumulada, (profile_id, post_id, collected_at)
+    insights_ineligible -> post_id (unique), profile_id, expires_at (TTL)
     comments -> comment_id (unique), post_id, profile_id
     profile_insights -> (profile_id, period_until) unique
     engagement_metrics -> (post_id, date) unique, profile_id, date
+    retention_digests -> (profile_id, day) unique
     oauth_tokens -> profile_id (unique), long_lived_token (unique), is_valid
+    etl_state -> (job, profile_id) unique
+    etl_watermarks -> (profile_id, dataset) unique
+
+Versão mínima do servidor: MongoDB 5.0 (MIN_SERVER_VERSION, checada na conexão).
+  É o que o backfill server-side do engagement_service usa ($setWindowFields/$shift,
+  $dateDiff, $lookup com localField + pipeline). Operadores mais novos (ex: $topN,
+  5.2) não são usados — cada pipeline fica dentro desse mínimo.
 """
 
 from pymongo import MongoClient, ASCENDING, DESCENDING
@@ -37,6 +50,9 @@ import logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
+# Versão mínima do MongoDB exigida pelas agregações dos services (ver docstring do módulo)
+MIN_SERVER_VERSION = (5, 0)
+
 
 class MongoRepository:
     """
@@ -59,6 +75,17 @@ class MongoRepository:
         except Exception as e:
             logger.error(f"Erro inesperado ao conectar no MongoDB: {e}")
             raise
+        self._check_server_version()
+
+    def _check_server_version(self) -> None:
+        """Loga um erro se o servidor for mais antigo que MIN_SERVER_VERSION."""
+        version = tuple(self.client.server_info().get("versionArray", [])[:2])
+        if version and version < MIN_SERVER_VERSION:
+            logger.error(
+                f"MongoDB {'.'.join(map(str, version))} é anterior ao mínimo "
+                f"{'.'.join(map(str, MIN_SERVER_VERSION))}: as agregações do engagement_service "
+                f"($setWindowFields) vão falhar."
+            )
 
     # ─── OAuth ───────────────────────────────────────────────────────────────
 
@@ -111,6 +138,14 @@ class MongoRepository:
         """
         return self.db["post_insights"]
 
+    @property
+    def insights_ineligible(self):
+        """
+        Registro de posts cujos insights falham com erro definitivo (ex: pré-Business).
+        Escrito pelo insights_service. Documentos expiram em expires_at (índice TTL).
+        """
+        return self.db["insights_ineligible"]
+
     @property
     def comments(self):
         """
@@ -133,12 +168,39 @@ class MongoRepository:
     @property
     def engagement_metrics(self):
         """
-        Métricas calculadas de engajamento (ER weighted, velocity, loyalty).
+        Métricas calculadas de engajamento (ER weighted, velocity, alcance).
         NÃO vem da API — é calculada pelo engagement_service.
         Alimenta o pipeline de ML do TCC.
         """
         return self.db["engagement_metrics"]
 
+    @property
+    def retention_digests(self):
+        """
+        Sketch t-digest de watch_time_per_view dos Reels, um documento por (profile_id, day),
+        day = segunda-feira da semana de publicação. Só o digest, sem os valores.
+        Escrito e lido pelo video_metrics_service (baselines móveis de retenção).
+        """
+        return self.db["retention_digests"]
+
+    # ─── ETL control ──────────────────────────────────────────────────────────
+
+    @property
+    def etl_state(self):
+        """
+        Checkpoints de jobs do ETL, um documento por (job, profile_id).
+        Permite retomar um job interrompido de onde parou.
+        """
+        return self.db["etl_state"]
+
+    @property
+    def etl_watermarks(self):
+        """
+        Watermarks de conclusão das etapas de extração, um documento por (profile_id, dataset).
+        Escrito pelos services de extração, lido pelos transforms (ver watermarks.py).
+        """
+        return self.db["etl_watermarks"]
+
     # ─── Index Management ─────────────────────────────────────────────────────
 
     def create_indexes(self):
@@ -191,6 +253,11 @@ class MongoRepository:
             [("profile_id", ASCENDING), ("date", ASCENDING)],
             name="post_snapshots_profile_date",
         )
+        # Snapshots alterados desde o último processamento (engagement_service incremental)
+        self.post_snapshots.create_index(
+            [("profile_id", ASCENDING), ("changed_at", ASCENDING)],
+            name="post_snapshots_profile_changed_at",
+        )
 
         # --- post_insights ---
         # Append-only — sem índice único
@@ -199,6 +266,26 @@ class MongoRepository:
             [("post_id", ASCENDING), ("collected_at", DESCENDING)],
             name="post_insights_post_collected_at",
         )
+        # Últimas coletas por post do perfil (política de recoleta do insights_service)
+        self.post_insights.create_index(
+            [("profile_id", ASCENDING), ("post_id", ASCENDING), ("collected_at", DESCENDING)],
+            name="post_insights_profile_post_collected_at",
+        )
+        # Coletas novas do perfil desde o último processamento (transforms incrementais)
+        self.post_insights.create_index(
+            [("profile_id", ASCENDING), ("collected_at", ASCENDING)],
+            name="post_insights_profile_collected_at",
+        )
+
+        # --- insights_ineligible ---
+        self.insights_ineligible.create_index([("post_id", ASCENDING)], unique=True)
+        self.insights_ineligible.create_index([("profile_id", ASCENDING)])
+        # TTL: o documento some em expires_at e o post volta a ser testado
+        self.insights_ineligible.create_index(
+            [("expires_at", ASCENDING)],
+            expireAfterSeconds=0,
+            name="insights_ineligible_expires_at_ttl",
+        )
 
         # --- comments ---
         self.comments.create_index([("comment_id", ASCENDING)], unique=True)
@@ -231,6 +318,28 @@ class MongoRepository:
             name="engagement_metrics_profile_date_desc",
         )
 
+        # --- retention_digests ---
+        # Um bucket por perfil + semana de publicação (day = segunda-feira)
+        self.retention_digests.create_index(
+            [("profile_id", ASCENDING), ("day", ASCENDING)],
+            unique=True,
+            name="retention_digests_profile_day_unique",
+        )
+
+        # --- etl_state ---
+        self.etl_state.create_index(
+            [("job", ASCENDING), ("profile_id", ASCENDING)],
+            unique=True,
+            name="etl_state_job_profile_unique",
+        )
+
+        # --- etl_watermarks ---
+        self.etl_watermarks.create_index(
+            [("profile_id", ASCENDING), ("dataset", ASCENDING)],
+            unique=True,
+            name="etl_watermarks_profile_dataset_unique",
+        )
+
         logger.info("Todos os índices criados/verificados com sucesso.")
 
 
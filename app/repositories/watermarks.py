@@ -0,0 +1,165 @@
+"""
+Watermarks de conclusão das etapas de extração, por perfil e dataset.
+
+Com as tasks do DAG rodando em ramos paralelos (e o mesmo service podendo ser
+disparado por /collect ou pelo runner), um transform pode começar enquanto outra
+execução ainda está gravando página a página. Para não ler dados pela metade,
+cada service de extração registra aqui o ponto até onde os dados estão COMPLETOS
+só depois de terminar de gravar, e os transforms leem até esse ponto.
+
+Collection: etl_watermarks — um documento por (profile_id, dataset):
+    {
+        "profile_id": str,
+        "dataset":    "post_snapshots" | "post_insights" | "comments" | ...,
+        "watermark":  date ISO (snapshots diários) ou datetime collected_at (séries append-only),
+        "in_flight":  [{"run_id", "watermark", "started_at"}],   # execuções ainda gravando
+        "updated_at": datetime,
+    }
+
+O watermark só avança ($max): uma execução atrasada de um dia anterior não faz
+o transform voltar no tempo.
+
+Execuções concorrentes:
+  Cada execução se registra em in_flight (begin_run) antes de gravar e sai de lá
+  ao concluir (mark_complete) ou falhar (abandon_run), identificada pelo run_id
+  que begin_run devolve — duas execuções do mesmo dia (DAG + /collect/refresh)
+  têm o mesmo watermark, e uma não pode tirar a outra de in_flight. Se a execução B começou
+  depois de A mas terminou antes, o $max levaria o watermark até B enquanto A
+  ainda grava documentos com collected_at menor. Por isso get_watermark nunca
+  passa do ponto imediatamente anterior à execução mais antiga em andamento.
+  Registros de execuções que morreram sem sair de in_flight expiram depois de
+  WATERMARK_IN_FLIGHT_TTL_HOURS.
+
+  started_at é o instante a partir do qual a execução pode gravar marcadores de
+  tempo (ex: changed_at dos snapshots = collected_at da execução). Transforms que
+  avançam um marcador próprio por esses tempos não passam de in_flight_since.
+
+Sem documento (perfil anterior aos watermarks) get_watermark retorna None e os
+transforms leem sem limite, como antes.
+"""
+
+import os
+import logging
+from datetime import date, datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo.errors import PyMongoError
+
+from app.repositories.mongo_repository import mongo_repo
+
+logger = logging.getLogger(__name__)
+
+# Datasets com watermark (nomes das collections que os services de extração escrevem)
+POST_SNAPSHOTS = "post_snapshots"
+POST_INSIGHTS  = "post_insights"
+COMMENTS       = "comments"
+
+# Execução em in_flight há mais tempo que isso é considerada morta
+WATERMARK_IN_FLIGHT_TTL_HOURS = int(os.getenv("WATERMARK_IN_FLIGHT_TTL_HOURS", "6"))
+
+
+def _as_utc(dt: datetime) -> datetime:
+    """pymongo devolve datetimes naive (UTC)."""
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def _just_before(watermark):
+    """Maior watermark anterior a `watermark` (dia anterior ou 1 ms antes — precisão do BSON)."""
+    if isinstance(watermark, str):
+        return (date.fromisoformat(watermark) - timedelta(days=1)).isoformat()
+    return watermark - timedelta(milliseconds=1)
+
+
+def begin_run(profile_id: str, dataset: str, watermark, started_at: datetime | None = None) -> ObjectId:
+    """
+    Registra uma execução que vai gravar `dataset` até `watermark` (ver mark_complete / abandon_run).
+    started_at: menor tempo que a execução grava nos documentos (padrão = agora).
+    Retorna o run_id a passar para mark_complete / abandon_run.
+    """
+    run_id = ObjectId()
+    try:
+        mongo_repo.etl_watermarks.update_one(
+            {"profile_id": profile_id, "dataset": dataset},
+            {
+                "$push": {"in_flight": {
+                    "run_id": run_id,
+                    "watermark": watermark,
+                    "started_at": started_at or datetime.now(timezone.utc),
+                }},
+                "$set": {"updated_at": datetime.now(timezone.utc)},
+            },
+            upsert=True,
+        )
+    except PyMongoError as e:
+        logger.error(f"[watermarks] Erro ao registrar execução de {dataset} de profile_id={profile_id}: {e}")
+    return run_id
+
+
+def abandon_run(profile_id: str, dataset: str, run_id: ObjectId) -> None:
+    """Remove a execução de in_flight sem avançar o watermark (execução com falha)."""
+    try:
+        mongo_repo.etl_watermarks.update_one(
+            {"profile_id": profile_id, "dataset": dataset},
+            {"$pull": {"in_flight": {"run_id": run_id}}},
+        )
+    except PyMongoError as e:
+        logger.error(f"[watermarks] Erro ao encerrar execução de {dataset} de profile_id={profile_id}: {e}")
+
+
+def mark_complete(profile_id: str, dataset: str, watermark, run_id: ObjectId | None = None) -> None:
+    """
+    Registra que `dataset` está completo até `watermark` para o perfil e encerra a
+    execução `run_id` (de begin_run), se informada.
+    """
+    update = {
+        "$max": {"watermark": watermark},
+        "$set": {"updated_at": datetime.now(timezone.utc)},
+    }
+    if run_id is not None:
+        update["$pull"] = {"in_flight": {"run_id": run_id}}
+    try:
+        mongo_repo.etl_watermarks.update_one(
+            {"profile_id": profile_id, "dataset": dataset},
+            update,
+            upsert=True,
+        )
+    except PyMongoError as e:
+        # Watermark atrasado só faz o transform ler dados um pouco mais antigos
+        logger.error(f"[watermarks] Erro ao registrar {dataset} de profile_id={profile_id}: {e}")
+
+
+def _live_runs(doc: dict) -> list[dict]:
+    """Execuções de in_flight ainda dentro de WATERMARK_IN_FLIGHT_TTL_HOURS."""
+    alive_since = datetime.now(timezone.utc) - timedelta(hours=WATERMARK_IN_FLIGHT_TTL_HOURS)
+    return [run for run in doc.get("in_flight", []) if _as_utc(run["started_at"]) > alive_since]
+
+
+def get_watermark(profile_id: str, dataset: str):
+    """
+    Até onde `dataset` pode ser lido para o perfil, ou None se nunca registrado.
+    Limitado ao ponto anterior à execução mais antiga ainda em andamento.
+    """
+    doc = mongo_repo.etl_watermarks.find_one(
+        {"profile_id": profile_id, "dataset": dataset},
+        {"watermark": 1, "in_flight": 1, "_id": 0},
+    )
+    if not doc:
+        return None
+
+    watermark = doc.get("watermark")
+    in_flight = [run["watermark"] for run in _live_runs(doc)]
+    if in_flight:
+        oldest = min(in_flight)
+        if watermark is None or oldest <= watermark:
+            return _just_before(oldest)
+    return watermark
+
+
+def in_flight_since(profile_id: str, dataset: str) -> datetime | None:
+    """started_at da execução mais antiga ainda em andamento, ou None se não houver."""
+    doc = mongo_repo.etl_watermarks.find_one(
+        {"profile_id": profile_id, "dataset": dataset},
+        {"in_flight": 1, "_id": 0},
+    )
+    runs = _live_runs(doc) if doc else []
+    return min(_as_utc(run["started_at"]) for run in runs) if runs else None
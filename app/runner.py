@@ -0,0 +1,272 @@
+"""
+Runner standalone do ETL — executa a cadeia Extract + Transform fora do Airflow.
+
+Para execuções em lote e backfills numa máquina com vários núcleos, sem o
+overhead do scheduler nem uma requisição HTTP presa em /collect/initial.
+
+Cada perfil roda inteiro num processo worker de um ProcessPoolExecutor:
+
+  - contexto "spawn": o worker começa num interpretador limpo e importa os
+    services lá dentro — o singleton mongo_repo (e o graph_client) de cada
+    worker tem seu próprio MongoClient / pool de conexões, nada é herdado do pai.
+  - as etapas de um perfil rodam na ordem do dag_instagram_etl; se uma etapa
+    falha (status "error" ou exceção) as seguintes daquele perfil são puladas,
+    como as tasks downstream no Airflow. Os demais perfis seguem normalmente.
+
+Pipelines:
+    daily   -> profile, media_and_snapshot, post_insights, comments,
+               engagement, video_metrics, sentiment         (dag_instagram_etl)
+    weekly  -> profile_insights, growth                     (dag_weekly_insights)
+    all     -> daily seguido de weekly
+
+Uso:
+    python -m app.runner --all-active
+    python -m app.runner --profiles 1784...,1785... --workers 8 --pipeline all
+    python -m app.runner --all-active --target-date 2026-01-31 --json resultado.json
+
+Saída: resumo por perfil (status e tempo de cada etapa) e totais. Código de saída
+1 se algum perfil falhou.
+"""
+
+import os
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = int(os.getenv("ETL_RUNNER_WORKERS", str(os.cpu_count() or 2)))
+
+# (nome da etapa, módulo, função, recebe target_date)
+DAILY_STEPS = (
+    ("profile",            "app.services.profile_service",       "run_profile_service",            False),
+    ("media_and_snapshot", "app.services.snapshot_service",      "run_media_and_snapshot_service", True),
+    ("post_insights",      "app.services.insights_service",      "run_post_insights_service",      False),
+    ("comments",           "app.services.comments_service",      "run_comments_service",           False),
+    ("engagement",         "app.services.engagement_service",    "run_engagement_service",         True),
+    ("video_metrics",      "app.services.video_metrics_service", "run_video_metrics_service",      True),
+    ("sentiment",          "app.services.sentiment_service",     "run_sentiment_service",          False),
+)
+WEEKLY_STEPS = (
+    ("profile_insights", "app.services.insights_service", "run_profile_insights_service", False),
+    ("growth",           "app.services.growth_service",   "run_growth_service",           True),
+)
+PIPELINES = {
+    "daily":  DAILY_STEPS,
+    "weekly": WEEKLY_STEPS,
+    "all":    DAILY_STEPS + WEEKLY_STEPS,
+}
+
+# Argumentos extras por etapa (mesmos que os DAGs passam)
+STEP_KWARGS = {
+    "comments": {"incremental": True},
+}
+
+# growth: série dos snapshots da semana terminada em target_date (since = target_date - 6),
+# o mesmo intervalo que o dag_weekly_insights passa
+GROWTH_SERIES_DAYS = 7
+
+
+def _init_worker() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(processName)s - %(levelname)s - %(message)s")
+
+
+def run_profile_pipeline(profile_id: str, pipeline: str = "daily", target_date: str | None = None) -> dict:
+    """
+    Executa as etapas do pipeline para um perfil. Roda dentro do processo worker.
+
+    target_date: data ISO (YYYY-MM-DD) repassada às etapas que a aceitam; None = hoje.
+    Para profile_insights vira target_until; growth recebe também since (ver GROWTH_SERIES_DAYS).
+    """
+    import importlib
+
+    parsed_date = date.fromisoformat(target_date) if target_date else None
+    started = time.perf_counter()
+    steps = []
+    failed_step = None
+
+    for name, module_name, fn_name, takes_date in PIPELINES[pipeline]:
+        if failed_step:
+            steps.append({"step": name, "status": "skipped", "elapsed_s": 0.0,
+                          "message": f"Etapa {failed_step} falhou"})
+            continue
+
+        kwargs = dict(STEP_KWARGS.get(name, {}))
+        if takes_date:
+            kwargs["target_date"] = parsed_date
+        elif name == "profile_insights":
+            kwargs["target_until"] = parsed_date
+        if name == "growth":
+            series_end = parsed_date or datetime.now(timezone.utc).date()
+            kwargs["since"] = series_end - timedelta(days=GROWTH_SERIES_DAYS - 1)
+
+        step_started = time.perf_counter()
+        try:
+            fn = getattr(importlib.import_module(module_name), fn_name)
+            result = fn(profile_id=profile_id, **kwargs)
+            status, message = result.get("status", "ok"), result.get("message", "")
+        except Exception as e:
+            logger.exception(f"[runner] Erro em {name} para profile_id={profile_id}")
+            status, message = "error", str(e)
+
+        steps.append({"step": name, "status": status, "message": message,
+                      "elapsed_s": round(time.perf_counter() - step_started, 3)})
+        if status == "error":
+            failed_step = name
+
+    return {
+        "profile_id": profile_id,
+        "status": "error" if failed_step else "ok",
+        "failed_step": failed_step,
+        "elapsed_s": round(time.perf_counter() - started, 3),
+        "steps": steps,
+        "pid": os.getpid(),
+    }
+
+
+def run_profiles(
+    profile_ids: list[str],
+    pipeline: str = "daily",
+    target_date: date | None = None,
+    workers: int = DEFAULT_WORKERS,
+) -> dict:
+    """
+    Distribui os perfis entre `workers` processos e agrega os resultados.
+
+    Retorna:
+        {
+            "status": "ok" | "partial" | "error",
+            "pipeline": str,
+            "profiles_total": int,
+            "profiles_ok": int,
+            "profiles_failed": list[str],
+            "elapsed_s": float,
+            "step_totals_s": {step: soma dos tempos entre perfis},
+            "results": list[dict],   # um por perfil, ver run_profile_pipeline
+            "message": str,
+        }
+    """
+    started = time.perf_counter()
+    target_iso = target_date.isoformat() if target_date else None
+    workers = max(1, min(workers, len(profile_ids))) if profile_ids else 1
+
+    logger.info(f"[runner] {len(profile_ids)} perfis | pipeline={pipeline} | workers={workers}")
+
+    results = []
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker) as pool:
+        futures = {
+            pool.submit(run_profile_pipeline, profile_id, pipeline, target_iso): profile_id
+            for profile_id in profile_ids
+        }
+        for future in as_completed(futures):
+            profile_id = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # Worker morreu (ex: falha ao conectar no MongoDB na importação)
+                logger.error(f"[runner] Worker falhou para profile_id={profile_id}: {e}")
+                result = {"profile_id": profile_id, "status": "error", "failed_step": None,
+                          "elapsed_s": 0.0, "steps": [], "message": str(e)}
+            results.append(result)
+            logger.info(
+                f"[runner] {profile_id}: {result['status']} em {result['elapsed_s']:.1f}s"
+                + (f" (falhou em {result['failed_step']})" if result.get("failed_step") else "")
+            )
+
+    results.sort(key=lambda r: profile_ids.index(r["profile_id"]))
+    failed = [r["profile_id"] for r in results if r["status"] != "ok"]
+    profiles_ok = len(results) - len(failed)
+
+    step_totals: dict[str, float] = {}
+    for result in results:
+        for step in result["steps"]:
+            step_totals[step["step"]] = round(step_totals.get(step["step"], 0.0) + step["elapsed_s"], 3)
+
+    if not failed:
+        status = "ok"
+    elif profiles_ok:
+        status = "partial"
+    else:
+        status = "error"
+
+    return {
+        "status": status,
+        "pipeline": pipeline,
+        "profiles_total": len(profile_ids),
+        "profiles_ok": profiles_ok,
+        "profiles_failed": failed,
+        "elapsed_s": round(time.perf_counter() - started, 3),
+        "step_totals_s": step_totals,
+        "results": results,
+        "message": f"{profiles_ok}/{len(profile_ids)} perfis processados com sucesso",
+    }
+
+
+def _print_summary(summary: dict) -> None:
+    steps = [name for name, *_ in PIPELINES[summary["pipeline"]]]
+    header = f"{'profile_id':<22} {'status':<8} {'total_s':>8}  " + " ".join(f"{s[:12]:>12}" for s in steps)
+    print(header)
+    print("-" * len(header))
+    for result in summary["results"]:
+        by_step = {s["step"]: s for s in result["steps"]}
+        cells = []
+        for name in steps:
+            step = by_step.get(name)
+            if step is None or step["status"] == "skipped":
+                cells.append(f"{'-':>12}")
+            else:
+                mark = "" if step["status"] != "error" else "!"
+                cells.append(f"{mark + format(step['elapsed_s'], '.2f'):>12}")
+        print(f"{result['profile_id']:<22} {result['status']:<8} {result['elapsed_s']:>8.2f}  " + " ".join(cells))
+    print(
+        f"\n{summary['message']} | pipeline={summary['pipeline']} | "
+        f"tempo total={summary['elapsed_s']:.2f}s"
+    )
+
+
+def _parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Executa o ETL do Instagram para vários perfis em paralelo")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--profiles", help="profile_ids separados por vírgula")
+    target.add_argument("--all-active", action="store_true", help="Todos os perfis com is_active=True")
+    parser.add_argument("--pipeline", choices=sorted(PIPELINES), default="daily")
+    parser.add_argument("--target-date", type=date.fromisoformat,
+                        help="Data de referência (YYYY-MM-DD); padrão = hoje (UTC)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Processos em paralelo")
+    parser.add_argument("--json", dest="json_path", help="Grava o resumo completo neste arquivo")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = _parse_args(argv)
+
+    if args.all_active:
+        # Import tardio: só o modo --all-active precisa do MongoDB no processo pai
+        from app.services.profile_service import list_active_profile_ids
+        profile_ids = list_active_profile_ids()
+    else:
+        profile_ids = [p.strip() for p in args.profiles.split(",") if p.strip()]
+
+    if not profile_ids:
+        logger.warning("[runner] Nenhum perfil para processar")
+        return 0
+
+    summary = run_profiles(profile_ids, args.pipeline, args.target_date, args.workers)
+    summary["finished_at"] = datetime.now(timezone.utc).isoformat()
+
+    _print_summary(summary)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, default=str, ensure_ascii=False)
+
+    return 0 if summary["status"] == "ok" else 1
+
+
+if __name__ == "__main__":
+    _init_worker()
+    raise SystemExit(main())
@@ -11,7 +11,7 @@ Extract Layer (coleta da API):
     insights_service      → métricas da API → post_insights, account_insights
 
 Transform Layer (processamento interno):
-    engagement_service    → calcula ER, velocity, loyalty → engagement_metrics
+    engagement_service    → calcula ER, velocity, alcance → engagement_metrics
     sentiment_service     → análise de sentimento → atualiza comments
     qualification_service → scoring de audiência → audience_profiles
 """
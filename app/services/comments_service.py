@@ -10,9 +10,10 @@ Fluxo do DAG:
   1. Roda APÓS snapshot_service
   2. Lê todos os post_ids ativos do banco
   3. Para cada post:
-     a. Busca comentários com paginação
-     b. Para cada comentário: busca replies com paginação
-     c. Tenta insert_one (DuplicateKeyError = já existe, skip)
+     a. Busca comentários página a página (replies embutidas via field expansion),
+        com a próxima página em prefetch
+     b. Replies que paginam: continua a partir do cursor paging.next
+     c. Buffer + insert_many(ordered=False) em lotes (duplicate key = já existe, skip)
   4. Retorna resumo com totais de novos, já existentes e erros
 
 Endpoints (v25.0):
@@ -20,16 +21,33 @@ Endpoints (v25.0):
       ?fields=id,text,timestamp,like_count,username
   GET /{base_url}/{version}/{comment_id}/replies
       ?fields=id,text,timestamp,username
+
+Modo field expansion (padrão, expand_replies=True):
+  GET /{base_url}/{version}/{media_id}/comments
+      ?fields=id,text,timestamp,like_count,username,replies.limit(100){id,text,timestamp,username}
+  Os comentários já chegam com a primeira página de replies embutida, num único
+  stream paginado por post. /{comment_id}/replies só é chamado para listas de
+  replies que têm paging.next — em vez de uma chamada por comentário (N+M).
+
+Modo incremental (incremental=True):
+  O snapshot_service grava comments_count por post por dia em post_snapshots.
+  Cada post cuja paginação de comentários chega ao fim tem o comments_count do
+  último snapshot registrado em etl_state (job="comments_crawl"). Só são
+  rastreados os posts cujo comments_count atual difere desse registro (sem
+  registro, do total já gravado em 'comments', replies incluídas), os posts sem
+  snapshot e os publicados nos últimos COMMENTS_RECENT_DAYS dias. Os demais não
+  mudaram desde a última coleta completa e são pulados sem nenhuma chamada à API.
 """
 
+import os
 import logging
-import requests
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from dateutil import parser as dateutil_parser
 
-from pymongo.errors import DuplicateKeyError
-
+from app.repositories import watermarks
 from app.repositories.mongo_repository import mongo_repo
+from app.repositories.bulk_writer import BulkInserter
+from app.repositories.graph_api_client import GraphApiError, get_base_url, graph_client
 
 logger = logging.getLogger(__name__)
 
@@ -38,6 +56,15 @@ GRAPH_VERSION = "v25.0"
 COMMENT_FIELDS = "id,text,timestamp,like_count,username"
 REPLY_FIELDS   = "id,text,timestamp,username"
 
+# Comentários por insert_many (buffer compartilhado entre posts)
+COMMENTS_INSERT_BATCH_SIZE = 500
+
+# Modo incremental: só posts com comments_count alterado + janela de posts recentes
+COMMENTS_INCREMENTAL = os.getenv("COMMENTS_INCREMENTAL", "false").lower() == "true"
+COMMENTS_RECENT_DAYS = int(os.getenv("COMMENTS_RECENT_DAYS", "3"))
+# etl_state: comments_count de cada post na última coleta completa dele
+COMMENTS_CRAWL_JOB = "comments_crawl"
+
 
 def _get_token_doc(profile_id: str) -> dict | None:
     """Busca token válido no MongoDB. Retorna None se inválido/expirado."""
@@ -55,11 +82,16 @@ def _get_token_doc(profile_id: str) -> dict | None:
     return doc
 
 
-def _get_base_url(auth_method: str) -> str:
-    return (
-        "https://graph.facebook.com" if auth_method == "facebook"
-        else "https://graph.instagram.com"
-    )
+def _expanded_comment_fields(limit: int) -> str:
+    """Campos do comentário + primeira página de replies embutida (field expansion)."""
+    return f"{COMMENT_FIELDS},replies.limit({limit}){{{REPLY_FIELDS}}}"
+
+
+def _log_comments_error(media_id: str, error: GraphApiError) -> None:
+    if error.is_network_error:
+        logger.error(f"[comments_service] Erro de rede ao buscar comentários de {media_id}: {error}")
+    else:
+        logger.warning(f"[comments_service] Erro nos comentários de {media_id}: {error}")
 
 
 def _parse_dt(ts: str | None) -> datetime | None:
@@ -74,69 +106,118 @@ def _parse_dt(ts: str | None) -> datetime | None:
 
 # ─── API fetch functions ──────────────────────────────────────────────────────
 
-def fetch_comments(
+def iter_comment_pages(
     base_url: str, media_id: str, access_token: str, limit: int = 100
-) -> list[dict]:
+):
     """
-    Coleta todos os comentários de um post com paginação.
-    Retorna lista de dicts brutos da API.
+    Gera os comentários de um post página a página (lista de dicts brutos da API),
+    com a próxima página em prefetch. Levanta GraphApiError se a paginação for interrompida.
     """
-    all_comments: list[dict] = []
-    next_url = (
+    url = (
         f"{base_url}/{GRAPH_VERSION}/{media_id}/comments"
         f"?fields={COMMENT_FIELDS}&limit={limit}&access_token={access_token}"
     )
 
-    while next_url:
-        try:
-            response = requests.get(next_url, timeout=15)
-        except requests.RequestException as e:
-            logger.error(f"[comments_service] Erro de rede ao buscar comentários de {media_id}: {e}")
-            break
-
-        if response.status_code != 200:
-            error_msg = response.json().get("error", {}).get("message", response.text)
-            logger.warning(f"[comments_service] Erro {response.status_code} nos comentários de {media_id}: {error_msg}")
-            break
+    try:
+        for data in graph_client.iter_pages(url, prefetch=True):
+            yield data.get("data", [])
+    except GraphApiError as e:
+        _log_comments_error(media_id, e)
+        raise
 
-        data = response.json()
-        all_comments.extend(data.get("data", []))
-        next_url = data.get("paging", {}).get("next")
 
-    return all_comments
+def fetch_comments(
+    base_url: str, media_id: str, access_token: str, limit: int = 100
+) -> list[dict]:
+    """
+    Coleta todos os comentários de um post com paginação.
+    Retorna lista de dicts brutos da API. Levanta GraphApiError se a paginação for interrompida.
+    """
+    return [c for page in iter_comment_pages(base_url, media_id, access_token, limit) for c in page]
 
 
 def fetch_replies(
-    base_url: str, comment_id: str, access_token: str, limit: int = 100
+    base_url: str, comment_id: str, access_token: str, limit: int = 100,
+    start_url: str | None = None,
 ) -> list[dict]:
     """
     Coleta todas as replies de um comentário com paginação.
     Retorna lista de dicts brutos da API.
+
+    start_url: continua a partir de um cursor já conhecido (paging.next de
+    uma lista de replies embutida) em vez de começar da primeira página.
+
+    Levanta GraphApiError se a paginação for interrompida — o post fica como
+    falho e é recoletado. A única exceção é o 400 que alguns comentários antigos
+    devolvem na primeira página: tratado como "sem replies".
     """
     all_replies: list[dict] = []
-    next_url = (
+    url = start_url or (
         f"{base_url}/{GRAPH_VERSION}/{comment_id}/replies"
         f"?fields={REPLY_FIELDS}&limit={limit}&access_token={access_token}"
     )
 
-    while next_url:
-        try:
-            response = requests.get(next_url, timeout=15)
-        except requests.RequestException as e:
-            logger.error(f"[comments_service] Erro de rede ao buscar replies de {comment_id}: {e}")
-            break
+    try:
+        for data in graph_client.iter_pages(url):
+            all_replies.extend(data.get("data", []))
+    except GraphApiError as e:
+        # Comentários sem replies retornam 200 com data:[], não é erro
+        # Mas alguns comentários antigos retornam 400 já na primeira página — ignoramos silenciosamente
+        if e.status_code == 400 and start_url is None and not all_replies:
+            logger.debug(f"[comments_service] Sem replies em {comment_id}: {e.status_code}")
+            return all_replies
+        logger.error(f"[comments_service] Paginação de replies de {comment_id} interrompida: {e}")
+        raise
 
-        if response.status_code != 200:
-            # Comentários sem replies retornam 200 com data:[], não é erro
-            # Mas alguns comentários antigos podem retornar 400 — ignoramos silenciosamente
-            logger.debug(f"[comments_service] Sem replies ou erro em {comment_id}: {response.status_code}")
-            break
+    return all_replies
 
-        data = response.json()
-        all_replies.extend(data.get("data", []))
-        next_url = data.get("paging", {}).get("next")
 
-    return all_replies
+def iter_comments_with_replies(
+    base_url: str, media_id: str, access_token: str, limit: int = 100
+):
+    """
+    Gera, página a página, os comentários de um post já com as replies embutidas
+    (field expansion), com a próxima página em prefetch.
+
+    Cada comentário traz `replies: {data: [...], paging: {next}}` com a primeira
+    página de replies. Só quando essa lista pagina é feita uma chamada extra
+    a partir do cursor paging.next.
+
+    Cada item gerado é uma lista de (comentário bruto, replies brutas).
+    Levanta GraphApiError se a paginação dos comentários for interrompida.
+    """
+    fields = _expanded_comment_fields(limit)
+    url = (
+        f"{base_url}/{GRAPH_VERSION}/{media_id}/comments"
+        f"?fields={fields}&limit={limit}&access_token={access_token}"
+    )
+
+    try:
+        for data in graph_client.iter_pages(url, prefetch=True):
+            page: list[tuple[dict, list[dict]]] = []
+            for raw_comment in data.get("data", []):
+                embedded = raw_comment.pop("replies", None) or {}
+                replies = list(embedded.get("data", []))
+                replies_next = embedded.get("paging", {}).get("next")
+                if replies_next:
+                    replies.extend(fetch_replies(
+                        base_url, raw_comment.get("id"), access_token, limit, start_url=replies_next
+                    ))
+                page.append((raw_comment, replies))
+            yield page
+    except GraphApiError as e:
+        _log_comments_error(media_id, e)
+        raise
+
+
+def fetch_comments_with_replies(
+    base_url: str, media_id: str, access_token: str, limit: int = 100
+) -> list[tuple[dict, list[dict]]]:
+    """
+    Coleta todos os comentários de um post já com as replies embutidas (field expansion).
+    Retorna lista de (comentário bruto, replies brutas) — ver iter_comments_with_replies.
+    """
+    return [item for page in iter_comments_with_replies(base_url, media_id, access_token, limit) for item in page]
 
 
 # ─── Mapping ──────────────────────────────────────────────────────────────────
@@ -169,22 +250,138 @@ def _map_comment(raw: dict, post_id: str, profile_id: str, replies: list[dict],
     }
 
 
+# ─── Seleção incremental ──────────────────────────────────────────────────────
+
+def _latest_snapshot_comment_counts(profile_id: str) -> tuple[str | None, dict[str, int]]:
+    """Data (YYYY-MM-DD) do último post_snapshot do perfil e o comments_count de cada post nela."""
+    doc = mongo_repo.post_snapshots.find_one({"profile_id": profile_id}, {"date": 1, "_id": 0}, sort=[("date", -1)])
+    if not doc:
+        return None, {}
+    counts = {
+        snap["post_id"]: snap.get("comments_count") or 0
+        for snap in mongo_repo.post_snapshots.find(
+            {"profile_id": profile_id, "date": doc["date"]},
+            {"post_id": 1, "comments_count": 1, "_id": 0},
+        )
+    }
+    return doc["date"], counts
+
+
+def _stored_comment_counts(profile_id: str) -> dict[str, int]:
+    """Total já gravado por post (comentários + replies embutidas), como o comments_count da API."""
+    pipeline = [
+        {"$match": {"profile_id": profile_id}},
+        {"$group": {
+            "_id": "$post_id",
+            "total": {"$sum": {"$add": [1, {"$size": {"$ifNull": ["$replies", []]}}]}},
+        }},
+    ]
+    return {doc["_id"]: doc["total"] for doc in mongo_repo.comments.aggregate(pipeline)}
+
+
+def _crawled_comment_counts(profile_id: str) -> dict[str, int | None] | None:
+    """comments_count de cada post na última coleta COMPLETA dele, ou None se nunca registrado."""
+    doc = mongo_repo.etl_state.find_one(
+        {"job": COMMENTS_CRAWL_JOB, "profile_id": profile_id},
+        {"crawled_counts": 1, "_id": 0},
+    )
+    return doc.get("crawled_counts", {}) if doc else None
+
+
+def _save_crawled_counts(profile_id: str, counts: dict[str, int | None]) -> None:
+    """Registra o comments_count dos posts cuja paginação de comentários chegou ao fim."""
+    if not counts:
+        return
+    now = datetime.now(timezone.utc)
+    mongo_repo.etl_state.update_one(
+        {"job": COMMENTS_CRAWL_JOB, "profile_id": profile_id},
+        {
+            "$set": {"updated_at": now, **{f"crawled_counts.{post_id}": count for post_id, count in counts.items()}},
+            "$setOnInsert": {"started_at": now},
+        },
+        upsert=True,
+    )
+
+
+def select_posts_to_crawl(
+    profile_id: str,
+    posts: list[dict],
+    recent_days: int = COMMENTS_RECENT_DAYS,
+    snapshot_counts: dict[str, int] | None = None,
+) -> list[str]:
+    """
+    Filtra os posts cujos comentários podem ter mudado desde a última coleta completa.
+
+    posts: docs de 'posts' com post_id e published_at.
+    snapshot_counts: comments_count do último post_snapshot (ver _latest_snapshot_comment_counts).
+    Um post é rastreado se:
+      - foi publicado nos últimos `recent_days` dias, ou
+      - não aparece no último post_snapshot, ou
+      - seu comments_count difere do registrado na última coleta completa dele
+        (sem registro — perfil anterior ao marcador —, do total gravado em 'comments').
+    Uma coleta interrompida não atualiza o registro, então o post volta na próxima execução
+    mesmo que o comments_count não mude. Sem nenhum post_snapshot do perfil, todos os posts
+    são rastreados.
+    """
+    if snapshot_counts is None:
+        _, snapshot_counts = _latest_snapshot_comment_counts(profile_id)
+    if not snapshot_counts:
+        logger.info("[comments_service] Sem post_snapshots — incremental indisponível, rastreando todos os posts")
+        return [p["post_id"] for p in posts]
+
+    crawled = _crawled_comment_counts(profile_id)
+    baseline = crawled if crawled is not None else _stored_comment_counts(profile_id)
+
+    # published_at é a string ISO da API ("2026-01-08T12:00:00+0000"): comparação lexicográfica
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=recent_days)).strftime("%Y-%m-%dT%H:%M:%S+0000")
+
+    selected = []
+    for post in posts:
+        post_id = post["post_id"]
+        if (
+            (post.get("published_at") or "") >= cutoff
+            or post_id not in snapshot_counts
+            or snapshot_counts[post_id] != baseline.get(post_id)
+        ):
+            selected.append(post_id)
+
+    logger.info(
+        f"[comments_service] Incremental: {len(selected)}/{len(posts)} posts a rastrear "
+        f"(snapshot vs {'última coleta completa' if crawled is not None else 'comments gravados'} "
+        f"+ últimos {recent_days} dias)"
+    )
+    return selected
+
+
 # ─── Entry point ──────────────────────────────────────────────────────────────
 
-def run_comments_service(profile_id: str) -> dict:
+def run_comments_service(
+    profile_id: str,
+    expand_replies: bool = True,
+    incremental: bool = COMMENTS_INCREMENTAL,
+    recent_days: int = COMMENTS_RECENT_DAYS,
+) -> dict:
     """
     Ponto de entrada principal — chamado pelo DAG do Airflow.
 
+    expand_replies: usa field expansion (comments{...,replies{...}}) para trazer
+    as replies junto com os comentários. False = uma chamada /replies por comentário.
+    incremental:    só rastreia posts com comments_count alterado desde a última coleta
+                    completa ou publicados nos últimos `recent_days` dias (ver select_posts_to_crawl).
+                    Deve rodar depois do snapshot do dia.
+
     Lê os post_ids do banco (não da API) para garantir que só processa
     posts que já foram descobertos pelo media_discovery_service.
 
     Retorna:
         {
-            "status": "ok" | "error",
+            "status": "ok" | "partial" | "error",
             "profile_id": str,
             "posts_processed": int,
+            "posts_skipped": int,        # incremental: comments_count inalterado
+            "posts_failed": int,         # paginação interrompida (refeitos na próxima execução)
             "comments_new": int,         # inseridos agora
-            "comments_known": int,       # já existiam (DuplicateKeyError)
+            "comments_known": int,       # já existiam (duplicate key)
             "comments_error": int,       # falha inesperada na inserção
             "message": str,
         }
@@ -203,19 +400,16 @@ def run_comments_service(profile_id: str) -> dict:
 
     access_token = token_doc["long_lived_token"]
     auth_method  = token_doc.get("auth_method", "facebook")
-    base_url     = _get_base_url(auth_method)
+    base_url     = get_base_url(auth_method)
     collected_at = datetime.now(timezone.utc)
 
     # 2. Lê post_ids do banco (apenas os do perfil, sem trazer documentos inteiros)
-    post_ids = [
-        doc["post_id"]
-        for doc in mongo_repo.posts.find(
-            {"profile_id": profile_id},
-            {"post_id": 1, "_id": 0},
-        )
-    ]
+    posts = list(mongo_repo.posts.find(
+        {"profile_id": profile_id},
+        {"post_id": 1, "published_at": 1, "_id": 0},
+    ))
 
-    if not post_ids:
+    if not posts:
         logger.warning(f"[comments_service] Nenhum post encontrado no banco para profile_id={profile_id}")
         return {
             "status": "ok", "profile_id": profile_id,
@@ -224,43 +418,80 @@ def run_comments_service(profile_id: str) -> dict:
             "message": "Nenhum post encontrado no banco. Execute media_discovery_service primeiro.",
         }
 
+    _, snapshot_counts = _latest_snapshot_comment_counts(profile_id)
+    if incremental:
+        post_ids = select_posts_to_crawl(profile_id, posts, recent_days, snapshot_counts)
+    else:
+        post_ids = [doc["post_id"] for doc in posts]
+    posts_skipped = len(posts) - len(post_ids)
+
     logger.info(f"[comments_service] {len(post_ids)} posts a processar")
 
     # 3. Para cada post: busca comentários e replies
-    comments_new   = 0
-    comments_known = 0
-    comments_error = 0
-
-    for post_id in post_ids:
-        raw_comments = fetch_comments(base_url, post_id, access_token)
-
-        if not raw_comments:
-            continue
-
-        for raw_comment in raw_comments:
-            comment_id = raw_comment.get("id")
-            if not comment_id:
-                continue
-
-            # Busca replies deste comentário
-            raw_replies = fetch_replies(base_url, comment_id, access_token)
-
-            comment_doc = _map_comment(raw_comment, post_id, profile_id, raw_replies, collected_at)
+    # Os documentos vão para um buffer compartilhado entre posts e são gravados
+    # com insert_many(ordered=False) a cada COMMENTS_INSERT_BATCH_SIZE
+    writer = BulkInserter(
+        mongo_repo.comments, "[comments_service]",
+        key_field="comment_id", batch_size=COMMENTS_INSERT_BATCH_SIZE,
+    )
+    posts_failed = []
 
+    run_id = watermarks.begin_run(profile_id, watermarks.COMMENTS, collected_at)
+    try:
+        for post_id in post_ids:
+            if expand_replies:
+                # Comentários + replies embutidas num único stream paginado
+                pages = iter_comments_with_replies(base_url, post_id, access_token)
+            else:
+                # Busca replies de cada comentário (uma chamada por comentário)
+                pages = (
+                    [
+                        (raw_comment, fetch_replies(base_url, raw_comment["id"], access_token))
+                        for raw_comment in page
+                        if raw_comment.get("id")
+                    ]
+                    for page in iter_comment_pages(base_url, post_id, access_token)
+                )
+
+            # A próxima página já está sendo buscada enquanto esta é mapeada/gravada
+            post_comments = 0
             try:
-                mongo_repo.comments.insert_one(comment_doc)
-                comments_new += 1
-            except DuplicateKeyError:
-                # Comentário já estava no banco — skip silencioso
-                comments_known += 1
-            except Exception as e:
-                logger.error(f"[comments_service] Erro ao inserir comment_id={comment_id}: {e}")
-                comments_error += 1
-
-        logger.info(
-            f"[comments_service] post_id={post_id} | "
-            f"comentários={len(raw_comments)} | novos={comments_new} | skip={comments_known}"
-        )
+                for raw_comments in pages:
+                    for raw_comment, raw_replies in raw_comments:
+                        if not raw_comment.get("id"):
+                            continue
+                        writer.add(_map_comment(raw_comment, post_id, profile_id, raw_replies, collected_at))
+                        post_comments += 1
+            except GraphApiError:
+                # Comentários já lidos deste post são gravados; o post fica incompleto
+                posts_failed.append(post_id)
+
+            if post_comments:
+                logger.info(f"[comments_service] post_id={post_id} | comentários={post_comments}")
+
+        writer.flush()
+    except Exception:
+        # Erro inesperado (ex: MongoDB): a execução sai de in_flight antes de propagar
+        watermarks.abandon_run(profile_id, watermarks.COMMENTS, run_id)
+        raise
+
+    # Só posts com paginação completa (e comentários gravados) ganham o registro
+    failed = set(posts_failed)
+    if not writer.result.errors:
+        _save_crawled_counts(profile_id, {
+            post_id: snapshot_counts.get(post_id) for post_id in post_ids if post_id not in failed
+        })
+    if posts_failed or writer.result.errors:
+        # Coleta incompleta (paginação interrompida ou comentários não gravados):
+        # o watermark não avança, os transforms seguem no anterior
+        watermarks.abandon_run(profile_id, watermarks.COMMENTS, run_id)
+        if posts_failed:
+            logger.warning(f"[comments_service] {len(posts_failed)} posts com paginação interrompida: {posts_failed[:10]}")
+    else:
+        watermarks.mark_complete(profile_id, watermarks.COMMENTS, collected_at, run_id)
+    comments_new   = writer.result.inserted
+    comments_known = writer.result.duplicates
+    comments_error = writer.result.errors
 
     total_comments = comments_new + comments_known + comments_error
     logger.info(
@@ -268,12 +499,25 @@ def run_comments_service(profile_id: str) -> dict:
         f"total={total_comments} | novos={comments_new} | já existiam={comments_known} | erros={comments_error}"
     )
 
+    if not posts_failed and not comments_error:
+        status = "ok"
+    elif len(posts_failed) == len(post_ids) or (comments_error and not comments_new + comments_known):
+        status = "error"
+    else:
+        status = "partial"
+
     return {
-        "status": "ok",
+        "status": status,
         "profile_id": profile_id,
         "posts_processed": len(post_ids),
+        "posts_skipped":  posts_skipped,
+        "posts_failed":   len(posts_failed),
         "comments_new":   comments_new,
         "comments_known": comments_known,
         "comments_error": comments_error,
-        "message": f"{comments_new} comentários inseridos, {comments_known} já existiam",
+        "message": (
+            f"{comments_new} comentários inseridos, {comments_known} já existiam"
+            + (f", {len(posts_failed)} posts com paginação interrompida" if posts_failed else "")
+            + (f", {comments_error} com erro de escrita" if comments_error else "")
+        ),
     }
@@ -8,170 +8,387 @@ Fórmulas implementadas:
 2. er_reach           = total_interactions / reach
 3. er_followers       = total_interactions / followers
 4. er_views           = total_interactions / views  [proxy Hootsuite para impressions]
+   er_weighted        = (likes×1 + comments×2) / followers  [Arman & Sidik 2019]
 5. relative_reach     = reach / followers
 6. amplification_rate = shares / reach               [e-WOM / advocacia]
 7. velocity_likes_24h    = delta de likes em 24h
 8. velocity_comments_24h = delta de comentários em 24h
 9. days_since_published  = dias entre publicação e coleta
 
+As fórmulas são declaradas uma vez em metric_registry.py e calculadas por um
+kernel NumPy sobre todos os post-dias de uma vez (calculate_metrics).
+
 Destino: collection `engagement_metrics` (único por post_id + date).
+
+Recálculo incremental (etl_state, job="engagement_metrics"):
+  Os post-dias sujos saem de consultas diretas, não de uma varredura do dia:
+    - post_snapshots com changed_at > snapshots_changed_until (o snapshot_service
+      só muda changed_at quando likes/comments/followers mudam) → o (post_id, date)
+      do snapshot e o do snapshot seguinte do post, cuja velocity usa este;
+    - post_insights com collected_at > insights_until (até o watermark) → os
+      (post_id, date) do post a partir do dia da primeira coleta nova.
+  Vale para qualquer data — uma correção num snapshot antigo é recalculada na
+  execução seguinte. Só esses pares são lidos e regravados, e os marcadores
+  avançam depois da gravação. Os insights de um post-dia são os coletados até o
+  fim daquele dia (como no backfill). full=True recalcula também todos os posts
+  da data alvo; o histórico inteiro é do run_engagement_backfill.
+
+Backfill server-side (run_engagement_backfill):
+  Recalcula o histórico inteiro de um perfil numa única agregação dentro do
+  MongoDB, sem trazer documentos para o worker:
+    post_snapshots
+      -> $setWindowFields (snapshot anterior de cada post, por data)  → velocity
+      -> $lookup posts                                                → published_at
+      -> $lookup post_insights (último collected_at até o fim do dia) → insights
+      -> $project gerado do metric_registry (mql_expressions)
+      -> $merge em engagement_metrics on (post_id, date), whenMatched=merge
+  whenMatched=merge preserva os campos de outros transforms (ex: reel_retention_score).
+  Requer MongoDB 5.0+ ($setWindowFields, $dateDiff, $lookup com localField + pipeline) —
+  o mínimo do projeto (MIN_SERVER_VERSION em mongo_repository).
+
+Uso:
+    python -m app.services.engagement_service --profile-id 1784... [--since 2025-01-01] [--until 2025-12-31]
 """
 
 import logging
-from datetime import datetime, date, timezone
+import argparse
+from datetime import datetime, date, timedelta, timezone
 from dateutil import parser as dateutil_parser
 
 from pymongo import UpdateOne
-from pymongo.errors import BulkWriteError
+from pymongo.errors import BulkWriteError, PyMongoError
 
+from app.repositories import watermarks
 from app.repositories.mongo_repository import mongo_repo
+from app.services import metric_registry
 
 logger = logging.getLogger(__name__)
 
 
-def _calculate_velocity(post_id: str, current_date: date, current_likes: int, current_comments: int) -> tuple[int, int]:
+# Campos de post_insights usados nas fórmulas
+INSIGHT_FIELDS = ("reach", "shares", "saved", "total_interactions", "views")
+
+# etl_state: marcadores do recálculo incremental
+ENGAGEMENT_JOB = "engagement_metrics"
+
+
+def _drop_missing(doc: dict) -> dict:
+    """$first devolve null para campos ausentes — remove para os .get(campo, 0) valerem."""
+    return {k: v for k, v in doc.items() if v is not None}
+
+
+def _previous_snapshots(post_ids: list[str], date_str: str) -> dict[str, dict]:
+    """
+    Último snapshot ANTERIOR a date_str de cada post, numa única agregação.
+    Retorna {post_id: {"like_count", "comments_count", "date", "changed_at"}}.
     """
-    Busca o snapshot do dia anterior para calcular a velocidade (crescimento no dia).
-    Retorna (delta_likes, delta_comments).
+    pipeline = [
+        {"$match": {"post_id": {"$in": post_ids}, "date": {"$lt": date_str}}},
+        # Mesma ordem do índice (post_id, date) percorrido ao contrário
+        {"$sort": {"post_id": -1, "date": -1}},
+        {"$group": {
+            "_id": "$post_id",
+            "like_count":     {"$first": "$like_count"},
+            "comments_count": {"$first": "$comments_count"},
+            "date":           {"$first": "$date"},
+            "changed_at":     {"$first": "$changed_at"},
+        }},
+    ]
+    return {doc["_id"]: _drop_missing(doc) for doc in mongo_repo.post_snapshots.aggregate(pipeline)}
+
+
+def _latest_insights(post_ids: list[str], insights_filter: dict) -> dict[str, dict]:
     """
-    # Para simplificar, buscamos o último snapshot anterior a esta data
-    prev_snapshot = mongo_repo.post_snapshots.find_one(
-        {"post_id": post_id, "date": {"$lt": current_date.isoformat()}},
-        sort=[("date", -1)]
+    post_insights mais recente de cada post (até o watermark), numa única agregação.
+    Usa o índice (post_id, collected_at desc).
+    """
+    pipeline = [
+        {"$match": {"post_id": {"$in": post_ids}, **insights_filter}},
+        {"$sort": {"post_id": 1, "collected_at": -1}},
+        {"$group": {
+            "_id": "$post_id",
+            **{field: {"$first": f"${field}"} for field in INSIGHT_FIELDS},
+            "collected_at": {"$first": "$collected_at"},
+        }},
+    ]
+    return {doc["_id"]: _drop_missing(doc) for doc in mongo_repo.post_insights.aggregate(pipeline)}
+
+
+def _as_utc(dt: datetime | None) -> datetime | None:
+    """pymongo devolve datetimes naive (UTC)."""
+    return dt.replace(tzinfo=timezone.utc) if dt is not None and dt.tzinfo is None else dt
+
+
+def _insights_filter(date_str: str, insights_watermark) -> dict:
+    """post_insights de um post-dia: coletados até o fim do dia (e até o watermark)."""
+    day = date.fromisoformat(date_str)
+    collected_at = {"$lt": datetime(day.year, day.month, day.day, tzinfo=timezone.utc) + timedelta(days=1)}
+    if insights_watermark is not None:
+        collected_at["$lte"] = insights_watermark
+    return {"collected_at": collected_at}
+
+
+def _dirty_snapshots(profile_id: str, changed_since: datetime) -> list[dict]:
+    """
+    Snapshots do perfil com changed_at > changed_since, cada um com `next_date`: a data
+    do snapshot seguinte do mesmo post, cuja velocity usa este como anterior.
+    Usa os índices (profile_id, changed_at) e (post_id, date).
+    """
+    pipeline = [
+        {"$match": {"profile_id": profile_id, "changed_at": {"$gt": changed_since}}},
+        {"$project": {"_id": 0, "post_id": 1, "date": 1, "changed_at": 1}},
+        {"$lookup": {
+            "from": "post_snapshots",
+            "localField": "post_id",
+            "foreignField": "post_id",
+            "let": {"date": "$date"},
+            "pipeline": [
+                {"$match": {"$expr": {"$gt": ["$date", "$$date"]}}},
+                {"$sort": {"date": 1}},
+                {"$limit": 1},
+                {"$project": {"_id": 0, "date": 1}},
+            ],
+            "as": "next",
+        }},
+        {"$set": {"next_date": {"$first": "$next.date"}}},
+        {"$unset": "next"},
+    ]
+    return list(mongo_repo.post_snapshots.aggregate(pipeline))
+
+
+def _dirty_insight_posts(profile_id: str, collected_since: datetime, insights_watermark) -> dict[str, dict]:
+    """
+    Posts do perfil com post_insights coletados em (collected_since, watermark].
+    Retorna {post_id: {"first": collected_at mais antigo, "last": mais recente}}.
+    """
+    collected_at = {"$gt": collected_since}
+    if insights_watermark is not None:
+        collected_at["$lte"] = insights_watermark
+    pipeline = [
+        {"$match": {"profile_id": profile_id, "collected_at": collected_at}},
+        {"$group": {
+            "_id": "$post_id",
+            "first": {"$min": "$collected_at"},
+            "last":  {"$max": "$collected_at"},
+        }},
+    ]
+    return {doc["_id"]: doc for doc in mongo_repo.post_insights.aggregate(pipeline)}
+
+
+def _snapshot_dates_since(first_days: dict[str, str], until: str | None) -> list[tuple[str, str]]:
+    """(post_id, date) dos snapshots de cada post a partir de first_days[post_id] (até `until`)."""
+    date_filter = {"$gte": min(first_days.values())}
+    if until is not None:
+        date_filter["$lte"] = until
+    cursor = mongo_repo.post_snapshots.find(
+        {"post_id": {"$in": list(first_days)}, "date": date_filter},
+        {"post_id": 1, "date": 1, "_id": 0},
     )
+    return [(doc["post_id"], doc["date"]) for doc in cursor if doc["date"] >= first_days[doc["post_id"]]]
+
+
+def _latest_collected_at(profile_id: str, insights_watermark) -> datetime | None:
+    """collected_at da última coleta de post_insights do perfil (até o watermark)."""
+    query = {"profile_id": profile_id}
+    if insights_watermark is not None:
+        query["collected_at"] = {"$lte": insights_watermark}
+    doc = mongo_repo.post_insights.find_one(query, {"collected_at": 1, "_id": 0}, sort=[("collected_at", -1)])
+    return doc["collected_at"] if doc else None
 
-    if not prev_snapshot:
-        return 0, 0
 
-    delta_likes = current_likes - prev_snapshot.get("like_count", 0)
-    delta_comments = current_comments - prev_snapshot.get("comments_count", 0)
+def _load_rows(dirty: dict[str, set[str]], insights_watermark) -> list[tuple[dict, dict, dict, dict | None]]:
+    """
+    Entradas de calculate_metrics para os post-dias sujos ({date: {post_id}}):
+    uma consulta de posts e, por data, snapshots do dia, snapshots anteriores e
+    últimos insights até o fim do dia (duas agregações $in + $sort/$group).
+    """
+    all_post_ids = sorted(set().union(*dirty.values()))
+    post_map = {p["post_id"]: p for p in mongo_repo.posts.find({"post_id": {"$in": all_post_ids}})}
 
-    # Evita deltas negativos por falha de coleta anterior ou exclusão em massa
-    return max(0, delta_likes), max(0, delta_comments)
+    rows = []
+    for date_str in sorted(dirty):
+        post_ids = sorted(dirty[date_str])
+        snapshots = mongo_repo.post_snapshots.find({"post_id": {"$in": post_ids}, "date": date_str})
+        prev_snapshots = _previous_snapshots(post_ids, date_str)
+        latest_insights = _latest_insights(post_ids, _insights_filter(date_str, insights_watermark))
 
+        # Usa defaults ({}) se o insights_service ainda não rodou para o post
+        for snap in snapshots:
+            post_id = snap["post_id"]
+            if post_id not in post_map:
+                continue
+            rows.append((post_map[post_id], snap, latest_insights.get(post_id, {}), prev_snapshots.get(post_id)))
+    return rows
 
-def calculate_metrics_for_post(
-    post: dict,
-    snapshot: dict,
-    insights: dict,
-    collected_at: datetime
-) -> dict | None:
-    """Consolida e calcula todas as métricas de um post para uma data específica."""
 
+def _days_since_published(post: dict, current_date: date) -> int | None:
+    """Dias entre a publicação e a data do snapshot (nunca negativo). None se a data for inválida."""
     try:
-        current_date_str = snapshot["date"]
-        current_date = date.fromisoformat(current_date_str)
         published_at_str = post.get("published_at")
         published_at = dateutil_parser.isoparse(published_at_str).date() if published_at_str else current_date
-        
-        days_since_published = (current_date - published_at).days
-        # Nunca negativo
-        days_since_published = max(0, days_since_published)
-
     except Exception as e:
         logger.warning(f"[engagement_service] Erro parseando datas post {post['post_id']}: {e}")
         return None
+    return max(0, (current_date - published_at).days)
 
-    # Base counts (do snapshot diário)
-    likes = snapshot.get("like_count", 0)
-    comments = snapshot.get("comments_count", 0)
-    followers = snapshot.get("followers_at_date", 0)
-
-    # Base API Insights (acumulado)
-    reach = insights.get("reach", 0)
-    shares = insights.get("shares", 0)
-    saves = insights.get("saved", 0)
-    total_interactions = insights.get("total_interactions", 0)
-    views = insights.get("views", 0)
-    
-    # Prevenção Div/0
-    safe_followers = followers if followers > 0 else 1
-    safe_reach = reach if reach > 0 else 1
-    safe_views = views if views > 0 else 1
-
-    # Métricas de engajamento
-    er_simple = (likes + comments) / safe_followers
-    er_reach = total_interactions / safe_reach
-    er_followers = total_interactions / safe_followers
-    relative_reach = reach / safe_followers
-    amplification_rate = shares / safe_reach
-    er_views = total_interactions / safe_views  # proxy Hootsuite para impressions
-
-    # 10 e 11 - Velocidade
-    vel_likes, vel_comments = _calculate_velocity(post["post_id"], current_date, likes, comments)
 
-    return {
-        "post_id":               post["post_id"],
-        "profile_id":            post["profile_id"],
-        "date":                  current_date_str,
-        "er_simple":             er_simple,
-        "er_reach":              er_reach,
-        "er_followers":          er_followers,
-        "er_views":              er_views,
-        "relative_reach":        relative_reach,
-        "amplification_rate":    amplification_rate,
-        "velocity_likes_24h":    vel_likes,
-        "velocity_comments_24h": vel_comments,
-        "days_since_published":  days_since_published,
-        "calculated_at":         collected_at,
-    }
+def calculate_metrics(
+    rows: list[tuple[dict, dict, dict, dict | None]],
+    collected_at: datetime,
+) -> list[dict]:
+    """
+    Calcula todas as métricas do registro (metric_registry) para vários post-dias de uma vez.
+
+    rows: tuplas (post, snapshot, insights, prev_snapshot) — insights {} e prev_snapshot
+    None quando não existem. Post-dias com data inválida são descartados.
+    """
+    valid_rows = []
+    days = []
+    for post, snapshot, insights, prev_snapshot in rows:
+        days_since = _days_since_published(post, date.fromisoformat(snapshot["date"]))
+        if days_since is None:
+            continue
+        valid_rows.append((post, snapshot, insights, prev_snapshot))
+        days.append(days_since)
+
+    if not valid_rows:
+        return []
 
+    posts, snapshots, insights, prev_snapshots = zip(*valid_rows)
+    metrics = metric_registry.evaluate(metric_registry.build_columns(snapshots, insights, prev_snapshots))
 
-def run_engagement_service(profile_id: str, target_date: date | None = None) -> dict:
+    return [
+        {
+            "post_id":    post["post_id"],
+            "profile_id": post["profile_id"],
+            "date":       snapshot["date"],
+            **{name: values[i] for name, values in metrics.items()},
+            "days_since_published": days[i],
+            "calculated_at":        collected_at,
+        }
+        for i, (post, snapshot) in enumerate(zip(posts, snapshots))
+    ]
+
+
+def calculate_metrics_for_post(
+    post: dict,
+    snapshot: dict,
+    insights: dict,
+    collected_at: datetime,
+    prev_snapshot: dict | None = None,
+) -> dict | None:
+    """
+    Consolida e calcula todas as métricas de um post para uma data específica.
+    Atalho de calculate_metrics para um único post-dia.
     """
-    Calcula as métricas de engajamento para todos os posts de um perfil em uma dada data.
-    Lê os dados de: posts, post_snapshots (da data alvo), e o ÚLTIMO post_insights.
+    docs = calculate_metrics([(post, snapshot, insights, prev_snapshot)], collected_at)
+    return docs[0] if docs else None
+
+
+def run_engagement_service(profile_id: str, target_date: date | None = None, full: bool = False) -> dict:
+    """
+    Calcula as métricas de engajamento dos post-dias de um perfil cujas entradas mudaram.
+    Lê os dados de: posts, post_snapshots e o último post_insights até o fim de cada dia.
     Upsert na collection: engagement_metrics.
+
+    Incremental (ver "Recálculo incremental" no docstring do módulo): os post-dias
+    sujos saem de consultas diretas — snapshots com changed_at e insights com
+    collected_at depois dos marcadores em etl_state — em qualquer data, não só na
+    data alvo. Só esses (post_id, date) são lidos e recalculados.
+
+    Set-based: por data suja, 3 consultas independentes do número de posts —
+    snapshots do dia ($in), snapshots anteriores e últimos insights (duas
+    agregações $in + $sort/$group). O join é feito em memória numa única passada.
+
+    Só lê dados completos (watermarks): a data alvo precisa ter os snapshots
+    concluídos, e post_insights é lido até a última coleta concluída — uma coleta
+    em andamento (ex: /collect em paralelo) é ignorada e entra na próxima execução.
+
+    Na primeira execução (sem marcadores), com full=True ou quando o registro de
+    métricas muda, todos os posts da data alvo também são recalculados.
     """
     calc_date = target_date or datetime.now(timezone.utc).date()
     date_str = calc_date.isoformat()
     collected_at = datetime.now(timezone.utc)
-    
+
     logger.info(f"[engagement_service] Iniciando processamento para profile_id={profile_id} em date={calc_date}")
 
-    # Puxa os snapshots do dia
-    snapshots = list(mongo_repo.post_snapshots.find({"profile_id": profile_id, "date": date_str}))
-    if not snapshots:
+    snapshots_watermark = watermarks.get_watermark(profile_id, watermarks.POST_SNAPSHOTS)
+    if snapshots_watermark is not None and snapshots_watermark < date_str:
+        # "error" para o Airflow refazer a task quando o snapshot do dia terminar
         return {
-            "status": "ok", "profile_id": profile_id, "processed": 0,
-            "message": f"Nenhum post_snapshot para {date_str}. Rode o snapshot_service primeiro."
+            "status": "error", "profile_id": profile_id, "processed": 0,
+            "message": f"post_snapshots de {date_str} ainda incompletos (último dia concluído: {snapshots_watermark})."
         }
+    insights_watermark = watermarks.get_watermark(profile_id, watermarks.POST_INSIGHTS)
 
-    # Puxa os meta-dados dos posts correspondentes
-    post_ids = [s["post_id"] for s in snapshots]
-    posts = list(mongo_repo.posts.find({"post_id": {"$in": post_ids}}))
-    post_map = {p["post_id"]: p for p in posts}
+    state = mongo_repo.etl_state.find_one({"job": ENGAGEMENT_JOB, "profile_id": profile_id}) or {}
+    snapshots_mark = _as_utc(state.get("snapshots_changed_until"))
+    insights_mark = _as_utc(state.get("insights_until"))
+    metrics_signature = ",".join(sorted(metric_registry.METRICS))
+    first_run = snapshots_mark is None or insights_mark is None
+    if not first_run and state.get("metrics") != metrics_signature:
+        logger.warning(
+            f"[engagement_service] Registro de métricas mudou: recalculando {date_str}. "
+            f"Para o histórico rode run_engagement_backfill."
+        )
 
-    operations = []
-    processed = 0
+    dirty: dict[str, set[str]] = {}   # date -> post_ids a recalcular
 
-    for snap in snapshots:
-        pos_id = snap["post_id"]
-        if pos_id not in post_map:
-            continue
-            
-        post = post_map[pos_id]
-        
-        # Puxa o último insight do post (ordenado por collected_at DESC)
-        insight = mongo_repo.post_insights.find_one(
-            {"post_id": pos_id},
-            sort=[("collected_at", -1)]
-        )
-        if not insight:
-            insight = {}  # Usa defaults se o insights_service ainda não rodou para este post
+    def mark_dirty(post_id: str, day: str | None) -> None:
+        if day is not None and (snapshots_watermark is None or day <= snapshots_watermark):
+            dirty.setdefault(day, set()).add(post_id)
 
-        metric_doc = calculate_metrics_for_post(post, snap, insight, collected_at)
-        if not metric_doc:
-            continue
+    # O marcador de snapshots não passa do changed_at de uma execução ainda gravando
+    # nem de mudanças que ainda não dá para processar inteiras (datas além do watermark)
+    hold_before = _as_utc(watermarks.in_flight_since(profile_id, watermarks.POST_SNAPSHOTS))
 
-        operations.append(
-            UpdateOne(
-                {"post_id": pos_id, "date": date_str},
-                {"$set": metric_doc},
-                upsert=True
-            )
+    if first_run:
+        # Marcadores iniciais: o histórico anterior é do run_engagement_backfill
+        day_snapshots = mongo_repo.post_snapshots.find(
+            {"profile_id": profile_id, "date": date_str}, {"changed_at": 1, "_id": 0}
+        )
+        snapshots_mark = max(
+            (_as_utc(snap["changed_at"]) for snap in day_snapshots if snap.get("changed_at")),
+            default=collected_at,
         )
-        processed += 1
+        insights_mark = _as_utc(_latest_collected_at(profile_id, insights_watermark)) or collected_at
+    else:
+        # Snapshots alterados: o próprio dia e o dia seguinte (velocity)
+        for snap in _dirty_snapshots(profile_id, snapshots_mark):
+            changed_at = _as_utc(snap["changed_at"])
+            mark_dirty(snap["post_id"], snap["date"])
+            mark_dirty(snap["post_id"], snap.get("next_date"))
+            last_day = snap.get("next_date") or snap["date"]
+            if snapshots_watermark is not None and last_day > snapshots_watermark:
+                hold_before = min(hold_before or changed_at, changed_at)
+            else:
+                snapshots_mark = max(snapshots_mark, changed_at)
+
+        # Insights novos: todos os dias do post a partir do dia da primeira coleta nova
+        new_insights = _dirty_insight_posts(profile_id, insights_mark, insights_watermark)
+        if new_insights:
+            first_days = {post_id: _as_utc(doc["first"]).date().isoformat() for post_id, doc in new_insights.items()}
+            for post_id, day in _snapshot_dates_since(first_days, snapshots_watermark):
+                mark_dirty(post_id, day)
+            insights_mark = max(insights_mark, *(_as_utc(doc["last"]) for doc in new_insights.values()))
+
+    if hold_before is not None:
+        snapshots_mark = min(snapshots_mark, hold_before - timedelta(milliseconds=1))
+
+    if first_run or full or state.get("metrics") != metrics_signature:
+        for snap in mongo_repo.post_snapshots.find({"profile_id": profile_id, "date": date_str}, {"post_id": 1, "_id": 0}):
+            mark_dirty(snap["post_id"], date_str)
+
+    # Todas as métricas registradas, vetorizadas sobre todos os post-dias sujos
+    metric_docs = calculate_metrics(_load_rows(dirty, insights_watermark), collected_at) if dirty else []
+
+    operations = [
+        UpdateOne({"post_id": doc["post_id"], "date": doc["date"]}, {"$set": doc}, upsert=True)
+        for doc in metric_docs
+    ]
+    processed = len(operations)
+    logger.info(f"[engagement_service] {processed} post-dias a recalcular em {len(dirty)} datas")
 
     if operations:
         try:
@@ -179,8 +396,226 @@ def run_engagement_service(profile_id: str, target_date: date | None = None) ->
             logger.info(f"[engagement_service] Concluído. Upserts={result.upserted_count}, Modified={result.modified_count}")
         except BulkWriteError as e:
             logger.error(f"[engagement_service] BulkWriteError: {e.details}")
+            # Sem avançar os marcadores: os mesmos post-dias são recalculados na próxima execução
+            return {"status": "error", "profile_id": profile_id, "processed": 0,
+                    "message": "Falha ao gravar engagement_metrics."}
+
+    mongo_repo.etl_state.update_one(
+        {"job": ENGAGEMENT_JOB, "profile_id": profile_id},
+        {
+            "$set": {
+                "snapshots_changed_until": snapshots_mark,
+                "insights_until": insights_mark,
+                "metrics": metrics_signature,
+                "updated_at": collected_at,
+            },
+            "$setOnInsert": {"started_at": collected_at},
+        },
+        upsert=True,
+    )
+
+    if not processed and date_str not in dirty and (first_run or full):
+        return {
+            "status": "ok", "profile_id": profile_id, "processed": 0,
+            "message": f"Nenhum post_snapshot para {date_str}. Rode o snapshot_service primeiro."
+        }
 
     return {
         "status": "ok", "profile_id": profile_id, "date": date_str, "processed": processed,
-        "message": f"Métricas de engajamento calculadas para {processed} posts."
+        "dates": sorted(dirty),
+        "message": f"Métricas de engajamento calculadas para {processed} post-dias em {len(dirty)} datas."
     }
+
+
+# Backfill server-side
+
+def _backfill_input_columns() -> dict:
+    """
+    Colunas de entrada do metric_registry como campos do pipeline — as mesmas de
+    build_columns: campos ausentes valem 0.
+    """
+    columns = {
+        "likes":         {"$ifNull": ["$like_count", 0]},
+        "comments":      {"$ifNull": ["$comments_count", 0]},
+        "followers":     {"$ifNull": ["$followers_at_date", 0]},
+        "prev_likes":    {"$ifNull": ["$prev_like_count", 0]},
+        "prev_comments": {"$ifNull": ["$prev_comments_count", 0]},
+        "has_prev":      {"$ne": [{"$ifNull": ["$prev_date", None]}, None]},
+        **{field: {"$ifNull": [{"$first": f"$insight.{field}"}, 0]} for field in INSIGHT_FIELDS},
+    }
+    missing = set(metric_registry.INPUT_COLUMNS) - set(columns)
+    if missing:
+        raise ValueError(f"Colunas do metric_registry sem campo no backfill: {sorted(missing)}")
+    return columns
+
+
+def build_engagement_backfill_pipeline(
+    profile_id: str,
+    calculated_at: datetime,
+    since: date | None = None,
+    until: date | None = None,
+    snapshots_watermark: str | None = None,
+    insights_watermark: datetime | None = None,
+) -> list[dict]:
+    """
+    Pipeline de agregação (sobre post_snapshots) que deriva engagement_metrics
+    para todas as datas do perfil em [since, until] e grava via $merge.
+    """
+    # Limite superior: until e o último dia de snapshots completo (watermark)
+    upper = min(filter(None, [until.isoformat() if until else None, snapshots_watermark]), default=None)
+    snapshot_match = {"profile_id": profile_id}
+    if upper:
+        snapshot_match["date"] = {"$lte": upper}
+
+    insights_bound = [{"$lt": ["$collected_at", {"$dateAdd": {
+        "startDate": {"$dateFromString": {"dateString": "$$snapshot_date"}},
+        "unit": "day", "amount": 1,
+    }}]}]
+    if insights_watermark is not None:
+        insights_bound.append({"$lte": ["$collected_at", insights_watermark]})
+
+    published_date = {"$dateFromString": {
+        "dateString": {"$substrCP": [
+            {"$cond": [
+                {"$eq": [{"$type": "$post.published_at"}, "date"]},
+                {"$dateToString": {"date": "$post.published_at", "format": "%Y-%m-%d"}},
+                {"$ifNull": ["$post.published_at", "$date"]},
+            ]},
+            0, 10,
+        ]},
+        "onError": None,
+    }}
+
+    pipeline = [
+        {"$match": snapshot_match},
+        # Snapshot anterior de cada post (mesma regra de _previous_snapshots: último com date menor)
+        {"$setWindowFields": {
+            "partitionBy": "$post_id",
+            "sortBy": {"date": 1},
+            "output": {
+                "prev_date":           {"$shift": {"output": "$date", "by": -1}},
+                "prev_like_count":     {"$shift": {"output": "$like_count", "by": -1}},
+                "prev_comments_count": {"$shift": {"output": "$comments_count", "by": -1}},
+            },
+        }},
+    ]
+    # O filtro de since vem depois da janela: o primeiro dia ainda enxerga o snapshot anterior
+    if since:
+        pipeline.append({"$match": {"date": {"$gte": since.isoformat()}}})
+
+    pipeline += [
+        {"$lookup": {
+            "from": "posts",
+            "localField": "post_id",
+            "foreignField": "post_id",
+            "pipeline": [{"$project": {"_id": 0, "profile_id": 1, "published_at": 1}}],
+            "as": "post",
+        }},
+        # Posts sem metadados são ignorados, como no cálculo diário
+        {"$unwind": "$post"},
+        # Último insight coletado até o fim do dia do snapshot (índice post_id + collected_at)
+        {"$lookup": {
+            "from": "post_insights",
+            "localField": "post_id",
+            "foreignField": "post_id",
+            "let": {"snapshot_date": "$date"},
+            "pipeline": [
+                {"$match": {"$expr": {"$and": insights_bound}}},
+                {"$sort": {"collected_at": -1}},
+                {"$limit": 1},
+                {"$project": {"_id": 0, **{field: 1 for field in INSIGHT_FIELDS}}},
+            ],
+            "as": "insight",
+        }},
+        {"$set": {
+            **_backfill_input_columns(),
+            "published_date": published_date,
+        }},
+        {"$project": {
+            "_id":        0,
+            "post_id":    1,
+            "profile_id": "$post.profile_id",
+            "date":       1,
+            # Todas as métricas registradas, com as fórmulas MQL do metric_registry
+            **metric_registry.mql_expressions(),
+            "days_since_published": {"$max": [0, {"$ifNull": [{"$dateDiff": {
+                "startDate": "$published_date",
+                "endDate":   {"$dateFromString": {"dateString": "$date"}},
+                "unit":      "day",
+            }}, 0]}]},
+            "calculated_at": {"$literal": calculated_at},
+        }},
+        {"$merge": {
+            "into": "engagement_metrics",
+            "on": ["post_id", "date"],   # índice único engagement_metrics_post_date_unique
+            "whenMatched": "merge",
+            "whenNotMatched": "insert",
+        }},
+    ]
+    return pipeline
+
+
+def run_engagement_backfill(
+    profile_id: str,
+    since: date | None = None,
+    until: date | None = None,
+) -> dict:
+    """
+    Recalcula engagement_metrics de todo o histórico do perfil (ou de [since, until])
+    numa única agregação server-side. Nenhum documento trafega para o worker.
+
+    Respeita os watermarks: só datas com snapshots completos e insights de coletas concluídas.
+
+    Retorna:
+        {
+            "status": "ok" | "error",
+            "profile_id": str,
+            "processed": int,   # documentos de engagement_metrics gravados nesta execução
+            "message": str,
+        }
+    """
+    calculated_at = datetime.now(timezone.utc)
+    logger.info(
+        f"[engagement_service] Backfill server-side: profile_id={profile_id} | "
+        f"período={since or 'início'} → {until or 'último snapshot'}"
+    )
+
+    pipeline = build_engagement_backfill_pipeline(
+        profile_id, calculated_at, since, until,
+        snapshots_watermark=watermarks.get_watermark(profile_id, watermarks.POST_SNAPSHOTS),
+        insights_watermark=watermarks.get_watermark(profile_id, watermarks.POST_INSIGHTS),
+    )
+
+    try:
+        # $merge não devolve documentos — o cursor vem vazio
+        list(mongo_repo.post_snapshots.aggregate(pipeline, allowDiskUse=True))
+    except PyMongoError as e:
+        logger.error(f"[engagement_service] Erro no backfill server-side: {e}")
+        return {"status": "error", "profile_id": profile_id, "processed": 0,
+                "message": f"Erro na agregação de backfill: {e}"}
+
+    processed = mongo_repo.engagement_metrics.count_documents(
+        {"profile_id": profile_id, "calculated_at": calculated_at}
+    )
+    logger.info(f"[engagement_service] Backfill concluído: profile_id={profile_id} | documentos={processed}")
+
+    return {
+        "status": "ok", "profile_id": profile_id, "processed": processed,
+        "message": f"Métricas de engajamento recalculadas para {processed} post-dias.",
+    }
+
+
+def _parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Backfill server-side de engagement_metrics")
+    parser.add_argument("--profile-id", required=True)
+    parser.add_argument("--since", type=date.fromisoformat, help="Primeira data (YYYY-MM-DD)")
+    parser.add_argument("--until", type=date.fromisoformat, help="Última data (YYYY-MM-DD)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    args = _parse_args()
+    result = run_engagement_backfill(args.profile_id, args.since, args.until)
+    logger.info(f"[engagement_service] {result['message']}")
+    raise SystemExit(0 if result["status"] == "ok" else 1)
@@ -2,128 +2,273 @@
 Transform Service 2.2 — growth_service
 
 Rodado pelo dag_weekly_insights (semanal). Lê os profile_snapshots de um perfil
-e calcula o crescimento de seguidores e publicações na janela de 7 dias.
+e calcula o crescimento de seguidores e publicações em janelas de 1, 7, 28 e 90 dias.
 
-Métricas calculadas e salvas em profile_snapshots:
-- followers_growth_7d       (absoluto — delta de 7 dias)
-- followers_growth_7d_pct   (percentual)
-- media_growth_7d           (posts publicados na semana)
+Métricas calculadas e salvas em profile_snapshots (para cada janela N em GROWTH_WINDOWS):
+- followers_growth_{N}d       (absoluto — delta de N dias)
+- followers_growth_{N}d_pct   (percentual)
+- media_growth_{N}d           (posts publicados na janela)
+- ref_date_{N}d               (data do snapshot de referência; None se não houver)
 
-Destino: campo `growth` dentro do documento em `profile_snapshots` da data-alvo.
+Os campos de 7 dias (followers_growth_7d, followers_growth_7d_pct, media_growth_7d)
+mantêm os nomes de antes.
+
+Série em uma varredura:
+  Os snapshots do intervalo (mais o lookback da maior janela) são lidos numa única
+  consulta ordenada por data. Para cada janela um ponteiro avança junto com o
+  snapshot atual até o último snapshot em ou antes de date - N, então a série
+  inteira sai em O(snapshots × janelas), sem um find_one por data.
+
+Lacunas:
+  Sem snapshot exatamente em date - N usa-se o mais próximo ANTERIOR, desde que
+  não esteja mais de GROWTH_WINDOWS[N] dias além da janela — um delta "7d" medido
+  contra um snapshot de 20 dias atrás não é crescimento de 7 dias. Sem referência
+  válida os valores ficam 0 e ref_date_{N}d None.
+
+Destino: campo `growth` dentro de cada documento de `profile_snapshots` do intervalo.
+
+Uso:
+    python -m app.services.growth_service --profile-id 1784... [--since 2025-01-01] [--until 2025-12-31]
+    python -m app.services.growth_service --all-active --since 2025-01-01
 """
 
 import logging
+import argparse
 from datetime import datetime, date, timedelta, timezone
+from itertools import groupby
 
 from pymongo import UpdateOne
 from pymongo.errors import BulkWriteError
 
 from app.repositories.mongo_repository import mongo_repo
+from app.services.profile_service import list_active_profile_ids
 
 logger = logging.getLogger(__name__)
 
+# Janela (dias) -> lacuna máxima (dias) aceita além da janela para o snapshot de referência
+GROWTH_WINDOWS = {1: 1, 7: 3, 28: 7, 90: 14}
 
-def _get_snapshot_for_date(profile_id: str, target_date: date) -> dict | None:
-    """Busca o snapshot de uma data exata ou o mais próximo anterior a ela."""
-    # Tenta um match exato
-    exact = mongo_repo.profile_snapshots.find_one({"profile_id": profile_id, "date": target_date.isoformat()})
-    if exact:
-        return exact
-        
-    # Busca o último registro antes dessa data
-    closest = mongo_repo.profile_snapshots.find_one(
-        {"profile_id": profile_id, "date": {"$lt": target_date.isoformat()}},
-        sort=[("date", -1)]
-    )
-    return closest
+# Dias antes de `since` que precisam ser lidos para a maior janela ter referência
+GROWTH_MAX_LOOKBACK_DAYS = max(days + gap for days, gap in GROWTH_WINDOWS.items())
+
+# UpdateOne por bulk_write
+GROWTH_WRITE_BATCH_SIZE = 1000
+
+SNAPSHOT_PROJECTION = {"profile_id": 1, "date": 1, "followers_count": 1, "media_count": 1}
+
+
+def _window_growth(current_snap: dict, ref_snap: dict | None, days: int) -> dict:
+    """Crescimento de seguidores e publicações entre o snapshot de referência e o atual."""
+    if not ref_snap:
+        return {
+            f"followers_growth_{days}d":     0,
+            f"followers_growth_{days}d_pct": 0.0,
+            f"media_growth_{days}d":         0,
+            f"ref_date_{days}d":             None,
+        }
+
+    current_followers = current_snap.get("followers_count", 0)
+    current_media = current_snap.get("media_count", 0)
+    prev_followers = ref_snap.get("followers_count", current_followers)
+    prev_media = ref_snap.get("media_count", current_media)
+
+    abs_growth = current_followers - prev_followers
+    return {
+        f"followers_growth_{days}d":     abs_growth,
+        f"followers_growth_{days}d_pct": (abs_growth / prev_followers) if prev_followers > 0 else 0.0,
+        f"media_growth_{days}d":         max(0, current_media - prev_media),
+        f"ref_date_{days}d":             ref_snap.get("date"),
+    }
 
 
 def calculate_growth_for_snapshot(current_snap: dict, prev_snap_7d: dict | None) -> dict:
     """
     Calcula crescimento de seguidores e publicações na janela de 7 dias.
 
-    Nota: métricas de 24h foram removidas — o service roda semanalmente
-    via dag_weekly_insights, tornando o delta diário sem significado aqui.
+    Nota: as demais janelas são calculadas em série por growth_series.
     """
-    current_followers = current_snap.get("followers_count", 0)
-    current_media = current_snap.get("media_count", 0)
+    return _window_growth(current_snap, prev_snap_7d, 7)
 
-    growth_data = {}
-
-    # # Crescimento 24h — omitido: service roda semanalmente
-    # if prev_snap_24h:
-    #     prev_followers = prev_snap_24h.get("followers_count", current_followers)
-    #     prev_media = prev_snap_24h.get("media_count", current_media)
-    #     abs_growth = current_followers - prev_followers
-    #     pct_growth = (abs_growth / prev_followers) if prev_followers > 0 else 0.0
-    #     growth_data["followers_growth_24h"] = abs_growth
-    #     growth_data["followers_growth_24h_pct"] = pct_growth
-    #     growth_data["media_growth_24h"] = max(0, current_media - prev_media)
-
-    # Crescimento 7d
-    if prev_snap_7d:
-        prev_followers_7d = prev_snap_7d.get("followers_count", current_followers)
-        prev_media_7d = prev_snap_7d.get("media_count", current_media)
-
-        abs_growth_7d = current_followers - prev_followers_7d
-        pct_growth_7d = (abs_growth_7d / prev_followers_7d) if prev_followers_7d > 0 else 0.0
-
-        growth_data["followers_growth_7d"] = abs_growth_7d
-        growth_data["followers_growth_7d_pct"] = pct_growth_7d
-        growth_data["media_growth_7d"] = max(0, current_media - prev_media_7d)
-    else:
-        growth_data["followers_growth_7d"] = 0
-        growth_data["followers_growth_7d_pct"] = 0.0
-        growth_data["media_growth_7d"] = 0
 
-    return growth_data
+def growth_series(snapshots: list[dict], windows: dict[int, int] = GROWTH_WINDOWS) -> list[dict]:
+    """
+    Crescimento de todas as janelas para cada snapshot de UM perfil.
+
+    snapshots: ordenados por data crescente (uma entrada por dia, com lacunas possíveis).
+    Retorna uma lista alinhada com `snapshots`.
+    """
+    dates = [date.fromisoformat(snap["date"]) for snap in snapshots]
+    ref_index = {days: -1 for days in windows}
+    series = []
+
+    for i, (snap, day) in enumerate(zip(snapshots, dates)):
+        growth = {}
+        for days, max_gap in windows.items():
+            cutoff = day - timedelta(days=days)
+            # Ponteiro só avança: último snapshot em ou antes de cutoff
+            j = ref_index[days]
+            while j + 1 < i and dates[j + 1] <= cutoff:
+                j += 1
+            ref_index[days] = j
+
+            ref_snap = snapshots[j] if j >= 0 and dates[j] >= cutoff - timedelta(days=max_gap) else None
+            growth.update(_window_growth(snap, ref_snap, days))
+        series.append(growth)
+
+    return series
+
+
+def _flush(operations: list[UpdateOne]) -> int:
+    """Envia as operações num bulk_write desordenado. Retorna quantos documentos foram modificados."""
+    if not operations:
+        return 0
+    try:
+        result = mongo_repo.profile_snapshots.bulk_write(operations, ordered=False)
+        return result.modified_count
+    except BulkWriteError as e:
+        logger.error(f"[growth_service] BulkWriteError: {e.details.get('writeErrors', [])[:3]}")
+        return e.details.get("nModified", 0)
+
 
+def compute_growth(profile_ids: list[str], since: date, until: date) -> dict:
+    """
+    Calcula e grava o crescimento de todos os snapshots entre since e until (inclusive)
+    dos perfis, numa única consulta ordenada por (profile_id, date) — o índice único.
 
-def run_growth_service(profile_id: str, target_date: date | None = None) -> dict:
+    Retorna:
+        {
+            "processed": int,                   # snapshots com growth gravado
+            "modified": int,
+            "by_profile": {profile_id: int},
+            "latest": {profile_id: dict},       # growth do último snapshot de cada perfil
+        }
+    """
+    since_str, until_str = since.isoformat(), until.isoformat()
+    lookback_str = (since - timedelta(days=GROWTH_MAX_LOOKBACK_DAYS)).isoformat()
+    calculated_at = datetime.now(timezone.utc)
+
+    cursor = mongo_repo.profile_snapshots.find(
+        {"profile_id": {"$in": profile_ids}, "date": {"$gte": lookback_str, "$lte": until_str}},
+        SNAPSHOT_PROJECTION,
+    ).sort([("profile_id", 1), ("date", 1)])
+
+    operations = []
+    by_profile = {}
+    latest = {}
+    modified = 0
+
+    for profile_id, group in groupby(cursor, key=lambda snap: snap["profile_id"]):
+        snapshots = list(group)
+        written = 0
+        for snap, growth in zip(snapshots, growth_series(snapshots)):
+            # Snapshots do lookback só servem de referência
+            if snap["date"] < since_str:
+                continue
+            growth["calculated_at"] = calculated_at
+            operations.append(UpdateOne({"_id": snap["_id"]}, {"$set": {"growth": growth}}))
+            latest[profile_id] = {"date": snap["date"], **growth}
+            written += 1
+            if len(operations) >= GROWTH_WRITE_BATCH_SIZE:
+                modified += _flush(operations)
+                operations = []
+        by_profile[profile_id] = written
+
+    modified += _flush(operations)
+    processed = sum(by_profile.values())
+    logger.info(
+        f"[growth_service] {processed} snapshots de {len(by_profile)} perfis entre {since_str} e {until_str} "
+        f"(modificados={modified})"
+    )
+    return {"processed": processed, "modified": modified, "by_profile": by_profile, "latest": latest}
+
+
+def run_growth_service(profile_id: str, target_date: date | None = None, since: date | None = None) -> dict:
     """
     Ponto de entrada 2.2 — chamado pelo dag_weekly_insights.
 
-    Calcula crescimento semanal de seguidores/publicações e Loyalty Rate,
-    salvando os resultados no campo `growth` do profile_snapshot da data-alvo.
+    Calcula o crescimento de seguidores/publicações (1d/7d/28d/90d) dos snapshots
+    entre `since` e `target_date`, salvando no campo `growth` de cada profile_snapshot.
 
-    target_date: data do snapshot alvo (None = hoje UTC, data da execução semanal).
+    target_date: último dia da série (None = hoje UTC, data da execução semanal).
+    since: primeiro dia da série (None = só target_date).
     """
     calc_date = target_date or datetime.now(timezone.utc).date()
+    since = since or calc_date
     date_str = calc_date.isoformat()
 
-    logger.info(f"[growth_service] Iniciando processamento para profile_id={profile_id} em date={calc_date}")
+    logger.info(f"[growth_service] Iniciando processamento para profile_id={profile_id} de {since} a {calc_date}")
+
+    try:
+        result = compute_growth([profile_id], since, calc_date)
+    except Exception as e:
+        logger.error(f"[growth_service] Erro ao calcular crescimento: {e}")
+        return {"status": "error", "message": str(e)}
 
-    # Puxa o snapshot alvo (coletado diariamente pelo dag_instagram_etl)
-    current_snap = mongo_repo.profile_snapshots.find_one({"profile_id": profile_id, "date": date_str})
-    if not current_snap:
+    if not result["processed"]:
         return {
             "status": "ok", "profile_id": profile_id, "processed": 0,
-            "message": f"Nenhum profile_snapshot para {date_str}. Rode o snapshot_service primeiro."
+            "message": f"Nenhum profile_snapshot entre {since.isoformat()} e {date_str}. Rode o snapshot_service primeiro."
         }
 
-    # Busca snapshot de referência de 7 dias atrás
-    date_7d_ago = calc_date - timedelta(days=7)
-    prev_snap_7d = _get_snapshot_for_date(profile_id, date_7d_ago)
+    return {
+        "status": "ok",
+        "profile_id": profile_id,
+        "date": date_str,
+        "processed": result["processed"],
+        "metrics": result["latest"].get(profile_id),
+        "message": f"Crescimento de perfil calculado para {result['processed']} snapshots."
+    }
+
+
+def run_growth_for_active_profiles(since: date | None = None, until: date | None = None) -> dict:
+    """
+    Série de crescimento de todos os perfis ativos num único job em lote
+    (uma consulta e bulk_writes de GROWTH_WRITE_BATCH_SIZE).
+
+    since / until: intervalo dos snapshots (None = hoje UTC em ambos).
+    """
+    until = until or datetime.now(timezone.utc).date()
+    since = since or until
 
-    growth_data = calculate_growth_for_snapshot(current_snap, prev_snap_7d)
-    growth_data["calculated_at"] = datetime.now(timezone.utc)
+    profile_ids = list_active_profile_ids()
+    if not profile_ids:
+        return {"status": "ok", "profiles": 0, "processed": 0, "message": "Nenhum perfil ativo."}
 
-    # Aplica o update no próprio profile_snapshots
     try:
-        result = mongo_repo.profile_snapshots.update_one(
-            {"_id": current_snap["_id"]},
-            {"$set": {"growth": growth_data}}
-        )
-        logger.info(f"[growth_service] Concluído. Modificado={result.modified_count}")
+        result = compute_growth(profile_ids, since, until)
     except Exception as e:
-        logger.error(f"[growth_service] Erro ao atualizar profile_snapshot: {e}")
+        logger.error(f"[growth_service] Erro ao calcular crescimento em lote: {e}")
         return {"status": "error", "message": str(e)}
 
     return {
-        "status": "ok", 
-        "profile_id": profile_id, 
-        "date": date_str, 
-        "processed": 1,
-        "metrics": growth_data,
-        "message": "Crescimento de perfil calculado com sucesso."
+        "status": "ok",
+        "profiles": len(profile_ids),
+        "processed": result["processed"],
+        "by_profile": result["by_profile"],
+        "message": f"Crescimento calculado para {result['processed']} snapshots de {len(result['by_profile'])} perfis.",
     }
+
+
+def _parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Série de crescimento (1d/7d/28d/90d) de profile_snapshots")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--profile-id", help="Perfil a processar")
+    target.add_argument("--all-active", action="store_true", help="Todos os perfis com is_active=True")
+    parser.add_argument("--since", type=date.fromisoformat, help="Primeira data (YYYY-MM-DD)")
+    parser.add_argument("--until", type=date.fromisoformat, help="Última data (YYYY-MM-DD); padrão = hoje (UTC)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    args = _parse_args(argv)
+    if args.all_active:
+        result = run_growth_for_active_profiles(args.since, args.until)
+    else:
+        result = run_growth_service(args.profile_id, target_date=args.until, since=args.since)
+    logger.info(f"[growth_service] {result['message']}")
+    return 0 if result["status"] == "ok" else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
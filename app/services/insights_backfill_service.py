@@ -0,0 +1,358 @@
+"""
+Extract Service 1.6b — insights_backfill_service
+
+Backfill histórico de profile_insights para perfis recém-conectados.
+
+run_profile_insights_service coleta uma única janela de 7 dias por execução, então
+um perfil novo só teria histórico semanal depois de várias semanas. Este service
+cobre de uma vez todo o período que a API permite consultar:
+
+  Janelas:
+    A faixa [until - lookback_days, until] é dividida em janelas de period_days
+    terminando em until, until - 7d, until - 14d, ... — os mesmos period_until do
+    DAG semanal, então backfill e coleta semanal gravam nos mesmos documentos.
+
+  Limites da API (GET /{ig_user_id}/insights com since/until):
+    - no máximo PROFILE_INSIGHTS_MAX_LOOKBACK_DAYS (~2 anos) para trás
+    - demográficos só existem para timeframe=this_month/this_week — o backfill
+      grava apenas as métricas de interação e não toca nos campos audience_*
+
+  Coleta:
+    As janelas rodam em paralelo (BACKFILL_CONCURRENCY chamadas em voo) pelo
+    graph_client — o governador de cota atrasa/pausa as chamadas quando o uso sobe.
+
+  Escrita:
+    bulk_write de UpdateOne(upsert) contra o índice único (profile_id, period_until),
+    em lotes de BACKFILL_WRITE_BATCH_SIZE janelas.
+
+  Checkpoint (etl_state, job="profile_insights_backfill"):
+    Cada lote gravado adiciona seus period_until a completed_windows. Se o processo
+    cair, a próxima execução pula as janelas já concluídas (e as que o DAG semanal
+    já coletou). Janelas com erro na API não entram no checkpoint e são refeitas
+    na próxima execução — exceto as além da retenção real da API: erro de
+    parâmetro (code 100) numa janela mais antiga que alguma janela já coletada
+    (token e métricas funcionam, o que falha é o período) vai para
+    unavailable_windows e não é mais consultada (restart=True volta a tentar).
+
+Uso:
+    python -m app.services.insights_backfill_service --profile-id 1784...
+    python -m app.services.insights_backfill_service --all-active --lookback-days 365
+"""
+
+import os
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, date, timedelta, timezone
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from app.repositories.mongo_repository import mongo_repo
+from app.repositories.graph_api_client import GraphApiError, get_base_url
+from app.services.insights_service import fetch_interaction_metrics
+from app.services.profile_service import list_active_profile_ids
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_JOB = "profile_insights_backfill"
+
+# Quanto a Graph API permite voltar nas métricas de interação do perfil
+PROFILE_INSIGHTS_MAX_LOOKBACK_DAYS = 730
+# Janelas consultadas simultaneamente
+BACKFILL_CONCURRENCY = int(os.getenv("PROFILE_INSIGHTS_BACKFILL_CONCURRENCY", "4"))
+# Janelas por bulk_write (e por atualização do checkpoint)
+BACKFILL_WRITE_BATCH_SIZE = 20
+
+
+def _get_token_doc(profile_id: str) -> dict | None:
+    """Busca token válido no MongoDB. Retorna None se inválido/expirado."""
+    doc = mongo_repo.oauth_tokens.find_one({"profile_id": profile_id})
+    if not doc:
+        logger.error(f"[insights_backfill_service] Token não encontrado para profile_id={profile_id}")
+        return None
+    if not doc.get("is_valid", False):
+        logger.error(f"[insights_backfill_service] Token inválido para profile_id={profile_id}")
+        return None
+    expires_at = doc.get("expires_at")
+    if expires_at and expires_at < datetime.now(timezone.utc):
+        logger.error(f"[insights_backfill_service] Token expirado para profile_id={profile_id}")
+        return None
+    return doc
+
+
+def backfill_windows(until: date, lookback_days: int, period_days: int = 7) -> list[tuple[date, date]]:
+    """
+    Janelas (since, until) de period_days, da mais recente para a mais antiga,
+    sem passar de until - lookback_days.
+    """
+    oldest = until - timedelta(days=lookback_days)
+    windows = []
+    window_until = until
+    while window_until - timedelta(days=period_days) >= oldest:
+        windows.append((window_until - timedelta(days=period_days), window_until))
+        window_until -= timedelta(days=period_days)
+    return windows
+
+
+# ─── Checkpoint ───────────────────────────────────────────────────────────────
+
+def _load_checkpoint(profile_id: str) -> tuple[set[str], set[str]]:
+    """period_until das janelas concluídas e das indisponíveis na API."""
+    doc = mongo_repo.etl_state.find_one(
+        {"job": BACKFILL_JOB, "profile_id": profile_id},
+        {"completed_windows": 1, "unavailable_windows": 1, "_id": 0},
+    ) or {}
+    return set(doc.get("completed_windows", [])), set(doc.get("unavailable_windows", []))
+
+
+def _collected_windows(profile_id: str) -> set[str]:
+    """period_until já coletados pelo job semanal (têm demográficos — o backfill não sobrescreve)."""
+    return set(mongo_repo.profile_insights.distinct(
+        "period_until", {"profile_id": profile_id, "backfilled": {"$ne": True}},
+    ))
+
+
+def _reset_checkpoint(profile_id: str) -> None:
+    mongo_repo.etl_state.delete_one({"job": BACKFILL_JOB, "profile_id": profile_id})
+
+
+def _save_checkpoint(
+    profile_id: str, period_untils: list[str], fields: dict | None = None, unavailable: list[str] | None = None,
+) -> None:
+    now = datetime.now(timezone.utc)
+    update = {
+        "$set": {"updated_at": now, **(fields or {})},
+        "$setOnInsert": {"started_at": now},
+    }
+    add_to_set = {}
+    if period_untils:
+        add_to_set["completed_windows"] = {"$each": period_untils}
+    if unavailable:
+        add_to_set["unavailable_windows"] = {"$each": unavailable}
+    if add_to_set:
+        update["$addToSet"] = add_to_set
+    mongo_repo.etl_state.update_one({"job": BACKFILL_JOB, "profile_id": profile_id}, update, upsert=True)
+
+
+# ─── Escrita ──────────────────────────────────────────────────────────────────
+
+def _is_unavailable_window(error: GraphApiError, period_until: str, oldest_collected: str | None) -> bool:
+    """Janela fora da retenção da API: erro de parâmetro numa janela mais antiga que uma já coletada."""
+    return (
+        error.code == 100
+        and not error.is_retryable
+        and oldest_collected is not None
+        and period_until < oldest_collected
+    )
+
+
+def _flush_windows(profile_id: str, docs: list[dict]) -> int:
+    """bulk upsert das janelas coletadas + checkpoint. Retorna quantas janelas foram gravadas."""
+    if not docs:
+        return 0
+
+    operations = [
+        UpdateOne(
+            {"profile_id": profile_id, "period_until": doc["period_until"]},
+            {"$set": doc},
+            upsert=True,
+        )
+        for doc in docs
+    ]
+    try:
+        mongo_repo.profile_insights.bulk_write(operations, ordered=False)
+    except PyMongoError as e:
+        # Sem checkpoint: as janelas deste lote são refeitas na próxima execução
+        logger.error(f"[insights_backfill_service] Erro no bulk upsert de {len(docs)} janelas: {e}")
+        return 0
+
+    _save_checkpoint(profile_id, [doc["period_until"] for doc in docs])
+    return len(docs)
+
+
+def run_profile_insights_backfill(
+    profile_id: str,
+    lookback_days: int = PROFILE_INSIGHTS_MAX_LOOKBACK_DAYS,
+    period_days: int = 7,
+    until: date | None = None,
+    concurrency: int = BACKFILL_CONCURRENCY,
+    restart: bool = False,
+) -> dict:
+    """
+    Ponto de entrada do backfill de profile_insights de um perfil.
+
+    lookback_days: quanto voltar a partir de until (limitado a PROFILE_INSIGHTS_MAX_LOOKBACK_DAYS)
+    period_days:   tamanho de cada janela (padrão=7, igual ao DAG semanal)
+    until:         fim da janela mais recente. None = hoje (UTC)
+    concurrency:   janelas consultadas simultaneamente
+    restart:       ignora o checkpoint e refaz todas as janelas
+
+    Retorna:
+        {
+            "status": "ok" | "partial" | "error",
+            "profile_id": str,
+            "windows_total": int,
+            "windows_skipped": int,   # já concluídas no checkpoint ou coletadas pelo job semanal
+            "windows_written": int,
+            "windows_failed": int,    # erro na API ou na escrita — refeitas na próxima execução
+            "windows_unavailable": int,  # fora da retenção da API — não são mais consultadas
+            "message": str,
+        }
+    """
+    until = until or datetime.now(timezone.utc).date()
+    lookback_days = min(lookback_days, PROFILE_INSIGHTS_MAX_LOOKBACK_DAYS)
+    windows = backfill_windows(until, lookback_days, period_days)
+
+    logger.info(
+        f"[insights_backfill_service] Iniciando backfill: profile_id={profile_id} | "
+        f"{len(windows)} janelas de {period_days}d até {until} | concorrência={concurrency}"
+    )
+
+    token_doc = _get_token_doc(profile_id)
+    if not token_doc:
+        return {"status": "error", "profile_id": profile_id,
+                "message": "Token não encontrado, inválido ou expirado"}
+
+    access_token = token_doc["long_lived_token"]
+    auth_method  = token_doc.get("auth_method", "facebook")
+    base_url     = get_base_url(auth_method)
+
+    if restart:
+        _reset_checkpoint(profile_id)
+    completed, unavailable = _load_checkpoint(profile_id)
+    completed |= _collected_windows(profile_id)
+    pending = [w for w in windows if w[1].isoformat() not in completed | unavailable]
+    windows_skipped = sum(1 for w in windows if w[1].isoformat() in completed)
+    _save_checkpoint(profile_id, [], {
+        "status": "running",
+        "range_since": windows[-1][0].isoformat() if windows else None,
+        "range_until": until.isoformat(),
+        "windows_total": len(windows),
+    })
+
+    def fetch_window(window: tuple[date, date]) -> dict:
+        since_dt, until_dt = window
+        interaction = fetch_interaction_metrics(
+            base_url, profile_id, access_token, auth_method,
+            datetime.combine(since_dt, datetime.min.time()),
+            datetime.combine(until_dt, datetime.min.time()),
+            raise_on_error=True,
+        )
+        return {
+            "profile_id":   profile_id,
+            "period_since": since_dt.isoformat(),
+            "period_until": until_dt.isoformat(),
+            "collected_at": datetime.now(timezone.utc),
+            "backfilled":   True,
+            "accounts_engaged":      interaction.get("accounts_engaged"),
+            "views":                 interaction.get("views"),
+            "reach":                 interaction.get("reach"),
+            "profile_views":         interaction.get("profile_views"),
+            "total_interactions":    interaction.get("total_interactions"),
+            "follows_and_unfollows": interaction.get("follows_and_unfollows"),
+        }
+
+    windows_written = 0
+    windows_failed  = 0
+    buffer: list[dict] = []
+    api_failures: list[tuple[str, GraphApiError]] = []
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="insights_backfill") as pool:
+        futures = {pool.submit(fetch_window, window): window for window in pending}
+        for future in as_completed(futures):
+            try:
+                buffer.append(future.result())
+            except GraphApiError as e:
+                api_failures.append((futures[future][1].isoformat(), e))
+                continue
+            if len(buffer) >= BACKFILL_WRITE_BATCH_SIZE:
+                written = _flush_windows(profile_id, buffer)
+                windows_failed += len(buffer) - written
+                windows_written += written
+                buffer = []
+
+    written = _flush_windows(profile_id, buffer)
+    windows_failed += len(buffer) - written
+    windows_written += written
+
+    # Falhas da API: além da retenção (permanente) ou refeitas na próxima execução
+    collected = _load_checkpoint(profile_id)[0] | _collected_windows(profile_id)
+    oldest_collected = min(collected) if collected else None
+    newly_unavailable = []
+    for period_until, error in api_failures:
+        if _is_unavailable_window(error, period_until, oldest_collected):
+            newly_unavailable.append(period_until)
+        else:
+            windows_failed += 1
+            logger.warning(
+                f"[insights_backfill_service] Janela até {period_until} falhou ({error}) — "
+                f"será refeita na próxima execução"
+            )
+    if newly_unavailable:
+        _save_checkpoint(profile_id, [], unavailable=newly_unavailable)
+        logger.info(
+            f"[insights_backfill_service] {len(newly_unavailable)} janelas anteriores a {oldest_collected} "
+            f"fora da retenção da API — não serão mais consultadas"
+        )
+    windows_unavailable = len(newly_unavailable) + sum(1 for w in windows if w[1].isoformat() in unavailable - completed)
+
+    status = "ok" if not windows_failed else ("partial" if windows_written or windows_skipped else "error")
+    _save_checkpoint(profile_id, [], {"status": "done" if status == "ok" else "incomplete"})
+
+    logger.info(
+        f"[insights_backfill_service] Backfill concluído: profile_id={profile_id} | "
+        f"janelas={len(windows)} | já concluídas={windows_skipped} | "
+        f"gravadas={windows_written} | falhas={windows_failed}"
+    )
+
+    return {
+        "status": status,
+        "profile_id": profile_id,
+        "windows_total": len(windows),
+        "windows_skipped": windows_skipped,
+        "windows_written": windows_written,
+        "windows_failed": windows_failed,
+        "windows_unavailable": windows_unavailable,
+        "message": (
+            f"{windows_written} janelas gravadas, {windows_skipped} já concluídas, "
+            f"{windows_failed} com falha, {windows_unavailable} fora da retenção da API"
+        ),
+    }
+
+
+def _parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Backfill histórico de profile_insights")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--profile-id", help="Perfil a processar")
+    target.add_argument("--all-active", action="store_true", help="Todos os perfis com is_active=True")
+    parser.add_argument("--lookback-days", type=int, default=PROFILE_INSIGHTS_MAX_LOOKBACK_DAYS)
+    parser.add_argument("--period-days", type=int, default=7)
+    parser.add_argument("--until", type=date.fromisoformat, help="Fim da janela mais recente (YYYY-MM-DD)")
+    parser.add_argument("--concurrency", type=int, default=BACKFILL_CONCURRENCY)
+    parser.add_argument("--restart", action="store_true", help="Ignora o checkpoint e refaz todas as janelas")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    args = _parse_args(argv)
+    profile_ids = list_active_profile_ids() if args.all_active else [args.profile_id]
+
+    failed = 0
+    for profile_id in profile_ids:
+        result = run_profile_insights_backfill(
+            profile_id,
+            lookback_days=args.lookback_days,
+            period_days=args.period_days,
+            until=args.until,
+            concurrency=args.concurrency,
+            restart=args.restart,
+        )
+        logger.info(f"[insights_backfill_service] {profile_id}: {result['status']} | {result['message']}")
+        failed += result["status"] != "ok"
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -21,6 +21,38 @@ Duas funções de entrada neste módulo:
   Nota: posts publicados ANTES da conversão para Business/Creator retornam erro na API. 
   Esse comportamento é esperado e documentado - o service registra o erro e continua para o próximo post.
 
+  Coleta concorrente:
+    As chamadas /{media_id}/insights são independentes entre si, então rodam em um
+    ThreadPoolExecutor limitado (POST_INSIGHTS_CONCURRENCY chamadas em voo, todas pelo
+    pool keep-alive do graph_client). Os documentos resultantes ficam em buffer
+    (BulkInserter) e são gravados com insert_many(ordered=False) em lotes de
+    INSIGHTS_INSERT_BATCH_SIZE — só a thread principal escreve no MongoDB.
+
+  Modo batch (POST_INSIGHTS_USE_BATCH):
+    Agrupa até 50 posts (tipos de mídia misturados) numa única chamada batch da
+    Graph API e demultiplexa a resposta por item — incluindo os erros por item
+    dos posts inelegíveis. Se a chamada batch falhar, o lote cai para chamadas
+    individuais.
+
+  Recoleta por faixas (POST_INSIGHTS_TIERED_REFRESH):
+    Insights lifetime de posts antigos quase não mudam. Cada post só é recoletado
+    quando vence o intervalo da sua faixa de idade (INSIGHTS_REFRESH_TIERS:
+    diário na primeira semana, a cada 3 dias até 1 mês, semanal até 1 ano,
+    mensal depois). Se as duas últimas coletas variaram ≥ INSIGHTS_VOLATILE_CHANGE_PCT
+    o post volta uma faixa. O resumo informa as chamadas evitadas.
+    O histórico lido para decidir fica limitado aos posts do perfil e às coletas
+    dos últimos INSIGHTS_HISTORY_WINDOW (duas vezes o maior intervalo): o custo
+    acompanha o número de posts, não o tamanho da série de post_insights.
+
+  Registro de inelegíveis (insights_ineligible):
+    Posts anteriores à conversão para Business/Creator falham sempre com o mesmo
+    erro. Na primeira falha com esse erro específico (INELIGIBLE_ERROR — code 100,
+    subcode 2108006; nunca permissão, token, métrica inválida, rede ou throttling)
+    o post é registrado com o código do erro e
+    as execuções seguintes o pulam. O documento expira (índice TTL em expires_at)
+    após ~INSIGHTS_INELIGIBLE_TTL_DAYS com jitter, e o post volta a ser testado
+    uma vez; se falhar de novo, é registrado outra vez.
+
     1.6 Profile Insights 
   Duas chamadas à API por execução:
 
@@ -39,16 +71,36 @@ Duas funções de entrada neste módulo:
 
       Retorna data:[] se a conta tiver < 100 seguidores no período - esperado.
 
+  As 5 chamadas (A + uma por breakdown de B) são independentes e rodam em paralelo:
+  A numa thread própria enquanto fetch_audience_demographics faz as de B, uma thread
+  por breakdown. A latência por perfil é a da chamada mais lenta.
+
   Collection: profile_insights (upsert por profile_id + period_until - único por semana)
+
+  Modo multi-perfil (run_profile_insights_for_active_profiles):
+    Roda o job semanal para todos os perfis ativos (ig_profiles.is_active), até
+    PROFILE_INSIGHTS_MAX_PROFILES_IN_FLIGHT perfis ao mesmo tempo. Todas as chamadas
+    passam pelo mesmo graph_client (pool keep-alive + governador de cota).
 """
 
+import os
 import time
+import random
 import logging
-import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, date, timedelta, timezone
 from dateutil import parser as dateutil_parser
 
+from app.repositories import watermarks
 from app.repositories.mongo_repository import mongo_repo
+from app.services.profile_service import list_active_profile_ids
+from app.repositories.bulk_writer import BulkInserter
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from app.repositories.graph_api_client import (
+    GRAPH_BATCH_MAX_SIZE, GraphApiError, get_base_url, graph_client,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -65,6 +117,41 @@ DEFAULT_METRICS = "reach,saved,shares,total_interactions"
 
 AUDIENCE_BREAKDOWNS = ("country", "city", "age", "gender")
 
+# Perfis processados em paralelo no modo multi-perfil
+PROFILE_INSIGHTS_MAX_PROFILES_IN_FLIGHT = int(os.getenv("PROFILE_INSIGHTS_MAX_PROFILES_IN_FLIGHT", "4"))
+
+# Chamadas de insights de posts em voo simultaneamente (1 = serial)
+POST_INSIGHTS_CONCURRENCY = int(os.getenv("POST_INSIGHTS_CONCURRENCY", "8"))
+# Agrupa as chamadas /insights em requisições batch da Graph API (até 50 por chamada)
+POST_INSIGHTS_USE_BATCH = os.getenv("POST_INSIGHTS_USE_BATCH", "true").lower() == "true"
+# Tamanho do lote de insert_many em post_insights
+INSIGHTS_INSERT_BATCH_SIZE = 500
+
+# Política de recoleta por idade do post: (idade máxima em dias, intervalo entre coletas)
+POST_INSIGHTS_TIERED_REFRESH = os.getenv("POST_INSIGHTS_TIERED_REFRESH", "true").lower() == "true"
+INSIGHTS_REFRESH_TIERS = (
+    (7,    timedelta(days=1)),    # primeira semana: toda execução diária
+    (30,   timedelta(days=3)),
+    (365,  timedelta(days=7)),
+    (None, timedelta(days=30)),   # mais de um ano
+)
+# Variação (%) entre as duas últimas coletas que antecipa o post para a faixa anterior
+INSIGHTS_VOLATILE_CHANGE_PCT = 5.0
+INSIGHTS_CHANGE_METRICS = ("reach", "saved", "shares", "total_interactions")
+INSIGHTS_CHANGE_LOOKBACK = 2
+INSIGHTS_REFRESH_SLACK = timedelta(hours=2)
+# Coletas mais antigas que isso não mudam a decisão: o post já venceu qualquer faixa,
+# e duas coletas da faixa mais lenta cabem na janela
+INSIGHTS_HISTORY_WINDOW = 2 * max(interval for _, interval in INSIGHTS_REFRESH_TIERS) + INSIGHTS_REFRESH_SLACK
+
+# Registro de posts inelegíveis: dias até o novo teste (± INELIGIBLE_TTL_JITTER para espalhar os testes)
+INSIGHTS_INELIGIBLE_TTL_DAYS = int(os.getenv("INSIGHTS_INELIGIBLE_TTL_DAYS", "30"))
+INELIGIBLE_TTL_JITTER = 0.2
+# (code, error_subcode) da mídia publicada antes da conversão para conta Business/Creator.
+# Só esse par: code 10 (permissão/escopo) e outros code 100 (parâmetro inválido, ex:
+# métrica não suportada) são erros de configuração, não do post, e não podem ir para o registro.
+INELIGIBLE_ERROR = (100, 2108006)
+
 
 def _get_token_doc(profile_id: str) -> dict | None:
     """Busca token válido no MongoDB. Retorna None se inválido/expirado."""
@@ -82,14 +169,49 @@ def _get_token_doc(profile_id: str) -> dict | None:
     return doc
 
 
-def _get_base_url(auth_method: str) -> str:
-    return (
-        "https://graph.facebook.com" if auth_method == "facebook"
-        else "https://graph.instagram.com"
-    )
+# 1.5 — Post Insights
 
+def _insights_relative_url(post: dict) -> str:
+    """Caminho /{media_id}/insights com a lista de métricas do tipo de mídia do post."""
+    metrics = METRICS_MAP.get(post.get("media_type", "IMAGE"), DEFAULT_METRICS)
+    return f"{GRAPH_VERSION}/{post['post_id']}/insights?metric={metrics}"
+
+
+def _flatten_insights(payload: dict) -> dict:
+    """Achata: [{name, values:[{value}]}] → {name: value}"""
+    return {
+        item["name"]: (
+            item["values"][0]["value"] if item.get("values")
+            else item.get("value")
+        )
+        for item in payload.get("data", [])
+    }
+
+
+def _log_insights_error(post: dict, error: GraphApiError) -> None:
+    media_id   = post["post_id"]
+    media_type = post.get("media_type", "IMAGE")
+    if error.is_network_error:
+        logger.error(f"[insights_service] Erro de rede no post {media_id}: {error}")
+    elif is_ineligible_error(error):
+        logger.warning(f"[insights_service] Post inelegível {media_id} ({media_type}): {error.message}")
+    else:
+        # Permissão, token ou métrica não suportada: problema de configuração, não do post
+        logger.error(f"[insights_service] Erro nos insights do post {media_id} ({media_type}): {error}")
+
+
+def _fetch_one(base_url: str, post: dict, access_token: str) -> tuple[dict | None, GraphApiError | None]:
+    """Coleta insights de um post: (métricas, None) ou (None, erro)."""
+    url = f"{base_url}/{_insights_relative_url(post)}&access_token={access_token}"
+
+    try:
+        payload = graph_client.get(url)
+    except GraphApiError as e:
+        _log_insights_error(post, e)
+        return None, e
+
+    return _flatten_insights(payload), None
 
-# 1.5 — Post Insights
 
 def fetch_post_insights(base_url: str, post: dict, access_token: str) -> dict | None:
     """
@@ -98,50 +220,258 @@ def fetch_post_insights(base_url: str, post: dict, access_token: str) -> dict |
     Returna dict com as métricas achatadas (name → value),
     ou None se o post for inelegível (pré-Business, privado, etc.)
     """
-    media_id   = post["post_id"]
-    media_type = post.get("media_type", "IMAGE")
-    metrics    = METRICS_MAP.get(media_type, DEFAULT_METRICS)
+    return _fetch_one(base_url, post, access_token)[0]
 
-    url = (
-        f"{base_url}/{GRAPH_VERSION}/{media_id}/insights"
-        f"?metric={metrics}&access_token={access_token}"
-    )
 
+def fetch_post_insights_batch(
+    base_url: str, posts: list[dict], access_token: str,
+) -> list[tuple[dict, dict | None, GraphApiError | None]]:
+    """
+    Coleta insights de até GRAPH_BATCH_MAX_SIZE posts numa única chamada batch.
+
+    Os posts podem misturar tipos de mídia — cada sub-requisição leva a lista
+    de métricas do seu próprio tipo (METRICS_MAP). A resposta é demultiplexada
+    por posição: erros por item (ex: post pré-Business) viram (post, None, erro)
+    só para aquele post.
+
+    Se a chamada batch inteira falhar, cai para chamadas individuais deste lote;
+    uma resposta com menos itens que posts refaz individualmente os que faltaram.
+    """
     try:
-        response = requests.get(url, timeout=15)
-    except requests.RequestException as e:
-        logger.error(f"[insights_service] Erro de rede no post {media_id}: {e}")
-        return None
+        results = graph_client.batch(
+            base_url, [_insights_relative_url(post) for post in posts], access_token
+        )
+    except GraphApiError as e:
+        logger.warning(
+            f"[insights_service] Batch de {len(posts)} posts falhou ({e}). "
+            f"Usando chamadas individuais para este lote."
+        )
+        return [(post, *_fetch_one(base_url, post, access_token)) for post in posts]
+
+    if len(results) < len(posts):
+        # Resposta curta: os posts sem item próprio são refeitos individualmente
+        logger.warning(
+            f"[insights_service] Batch devolveu {len(results)} de {len(posts)} itens. "
+            f"Usando chamadas individuais para os {len(posts) - len(results)} restantes."
+        )
+
+    collected = [(post, *_fetch_one(base_url, post, access_token)) for post in posts[len(results):]]
+    for post, result in zip(posts, results):
+        if isinstance(result, GraphApiError) and result.is_throttling:
+            # Item barrado por cota: refeito individualmente (espera a pausa do governador)
+            collected.append((post, *_fetch_one(base_url, post, access_token)))
+        elif isinstance(result, GraphApiError):
+            _log_insights_error(post, result)
+            collected.append((post, None, result))
+        else:
+            collected.append((post, _flatten_insights(result), None))
+    return collected
+
 
-    if response.status_code != 200:
-        error_msg = response.json().get("error", {}).get("message", response.text)
-        logger.warning(f"[insights_service] Post inelegível {media_id} ({media_type}): {error_msg}")
+def collect_post_insights(
+    base_url: str,
+    posts: list[dict],
+    access_token: str,
+    concurrency: int = POST_INSIGHTS_CONCURRENCY,
+    use_batch: bool = POST_INSIGHTS_USE_BATCH,
+):
+    """
+    Coleta insights de vários posts com até `concurrency` chamadas em voo.
+
+    use_batch=True agrupa os posts em chamadas batch de GRAPH_BATCH_MAX_SIZE
+    (~50x menos round-trips); os lotes também rodam concorrentemente.
+
+    Gera tuplas (post, metrics, error) na ordem em que as respostas chegam;
+    metrics é None (e error o GraphApiError) para posts que falharam.
+    """
+    if use_batch:
+        chunks = [posts[i:i + GRAPH_BATCH_MAX_SIZE] for i in range(0, len(posts), GRAPH_BATCH_MAX_SIZE)]
+        fetch_chunk = lambda chunk: fetch_post_insights_batch(base_url, chunk, access_token)
+    else:
+        chunks = [[post] for post in posts]
+        fetch_chunk = lambda chunk: [(chunk[0], *_fetch_one(base_url, chunk[0], access_token))]
+
+    if concurrency <= 1:
+        for chunk in chunks:
+            yield from fetch_chunk(chunk)
+        return
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="post_insights") as pool:
+        futures = [pool.submit(fetch_chunk, chunk) for chunk in chunks]
+        for future in as_completed(futures):
+            yield from future.result()
+
+
+def _as_utc(dt: datetime | None) -> datetime | None:
+    """pymongo devolve datetimes naive (UTC); a API devolve strings ISO."""
+    if dt is None:
         return None
+    if isinstance(dt, str):
+        dt = dateutil_parser.isoparse(dt)
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
 
-    # Achata: [{name, values:[{value}]}] → {name: value}
-    raw_data = response.json().get("data", [])
-    return {
-        item["name"]: (
-            item["values"][0]["value"] if item.get("values")
-            else item.get("value")
-        )
-        for item in raw_data
-    }
+
+def _latest_insights_by_post(
+    profile_id: str, post_ids: list[str], since: datetime, depth: int = INSIGHTS_CHANGE_LOOKBACK,
+) -> dict[str, list[dict]]:
+    """
+    Últimos `depth` documentos de post_insights de cada post (mais novo primeiro) coletados
+    a partir de `since`, numa única agregação. O $match e o $sort usam o índice
+    (profile_id, post_id, collected_at) com limites por post — só a janela recente é lida.
+
+    $sort + $group/$push + $slice em vez de $topN: $topN exige MongoDB 5.2, acima do
+    mínimo do projeto (5.0, ver mongo_repository); o $push fica limitado pela janela de `since`.
+    """
+    pipeline = [
+        {"$match": {
+            "profile_id": profile_id,
+            "post_id": {"$in": post_ids},
+            "collected_at": {"$gte": since},
+        }},
+        {"$sort": {"post_id": 1, "collected_at": -1}},
+        {"$group": {
+            "_id": "$post_id",
+            "latest": {"$push": {"collected_at": "$collected_at", **{m: f"${m}" for m in INSIGHTS_CHANGE_METRICS}}},
+        }},
+        {"$project": {"latest": {"$slice": ["$latest", depth]}}},
+    ]
+    return {doc["_id"]: doc["latest"] for doc in mongo_repo.post_insights.aggregate(pipeline)}
+
+
+def _recent_change_pct(history: list[dict]) -> float:
+    """Maior variação relativa (%) entre as duas últimas coletas, nas métricas de INSIGHTS_CHANGE_METRICS."""
+    if len(history) < 2:
+        return 0.0
+    latest, previous = history[0], history[1]
+    change = 0.0
+    for metric in INSIGHTS_CHANGE_METRICS:
+        new, old = latest.get(metric) or 0, previous.get(metric) or 0
+        if old:
+            change = max(change, abs(new - old) / old * 100)
+        elif new:
+            change = 100.0
+    return change
+
+
+def refresh_interval(published_at: datetime | None, history: list[dict], now: datetime) -> timedelta:
+    """
+    Intervalo de recoleta do post: faixa de idade em INSIGHTS_REFRESH_TIERS; se as
+    últimas coletas variaram ≥ INSIGHTS_VOLATILE_CHANGE_PCT, usa a faixa anterior (mais frequente).
+    """
+    age_days = (now - published_at).days if published_at else 0
+    tier = next(i for i, (max_age, _) in enumerate(INSIGHTS_REFRESH_TIERS) if max_age is None or age_days < max_age)
+    if tier > 0 and _recent_change_pct(history) >= INSIGHTS_VOLATILE_CHANGE_PCT:
+        tier -= 1
+    return INSIGHTS_REFRESH_TIERS[tier][1]
+
+
+def select_posts_due(profile_id: str, posts: list[dict], now: datetime) -> list[dict]:
+    """
+    Filtra os posts cujos insights estão vencidos segundo a política de faixas.
+    Posts sem nenhum post_insights na janela INSIGHTS_HISTORY_WINDOW são sempre coletados.
+    """
+    if not posts:
+        return []
+    history_by_post = _latest_insights_by_post(
+        profile_id, [post["post_id"] for post in posts], now - INSIGHTS_HISTORY_WINDOW,
+    )
+    due = []
+    for post in posts:
+        history = history_by_post.get(post["post_id"], [])
+        if not history:
+            due.append(post)
+            continue
+        last_collected = _as_utc(history[0]["collected_at"])
+        interval = refresh_interval(_as_utc(post.get("published_at")), history, now)
+        # Tolerância: a execução diária de amanhã pode começar minutos antes da de hoje
+        if now - last_collected >= interval - INSIGHTS_REFRESH_SLACK:
+            due.append(post)
+    return due
+
+
+def is_ineligible_error(error: GraphApiError | None) -> bool:
+    """Erro de mídia sem insights (INELIGIBLE_ERROR) — definitivo para o post."""
+    return error is not None and (error.code, error.error_subcode) == INELIGIBLE_ERROR
+
+
+def _ineligible_post_ids(profile_id: str, now: datetime) -> set[str]:
+    """post_ids registrados como inelegíveis e ainda dentro do TTL."""
+    cursor = mongo_repo.insights_ineligible.find(
+        {"profile_id": profile_id, "expires_at": {"$gt": now}},
+        {"post_id": 1, "_id": 0},
+    )
+    return {doc["post_id"] for doc in cursor}
 
 
-def run_post_insights_service(profile_id: str) -> dict:
+def _register_ineligible(profile_id: str, failures: list[tuple[dict, GraphApiError]], now: datetime) -> int:
+    """
+    Registra (upsert) os posts que falharam com erro definitivo.
+    Cada um recebe um expires_at próprio com jitter para que os novos testes não caiam todos no mesmo dia.
+    Retorna quantos posts foram registrados.
+    """
+    if not failures:
+        return 0
+
+    operations = []
+    for post, error in failures:
+        ttl_days = INSIGHTS_INELIGIBLE_TTL_DAYS * random.uniform(1 - INELIGIBLE_TTL_JITTER, 1 + INELIGIBLE_TTL_JITTER)
+        operations.append(UpdateOne(
+            {"post_id": post["post_id"]},
+            {
+                "$set": {
+                    "profile_id":      profile_id,
+                    "media_type":      post.get("media_type"),
+                    "error_code":      error.code,
+                    "error_subcode":   error.error_subcode,
+                    "error_message":   error.message,
+                    "last_checked_at": now,
+                    "expires_at":      now + timedelta(days=ttl_days),
+                },
+                "$setOnInsert": {"first_seen_at": now},
+                "$inc": {"failures": 1},
+            },
+            upsert=True,
+        ))
+
+    try:
+        mongo_repo.insights_ineligible.bulk_write(operations, ordered=False)
+    except PyMongoError as e:
+        logger.error(f"[insights_service] Erro ao registrar {len(operations)} posts inelegíveis: {e}")
+        return 0
+    return len(operations)
+
+
+def run_post_insights_service(
+    profile_id: str,
+    concurrency: int = POST_INSIGHTS_CONCURRENCY,
+    use_batch: bool = POST_INSIGHTS_USE_BATCH,
+    tiered_refresh: bool = POST_INSIGHTS_TIERED_REFRESH,
+    skip_ineligible: bool = True,
+) -> dict:
     """
     Ponto de entrada 1.5 — chamado pelo DAG do Airflow.
 
-    Append-only: cada execução diária adiciona um novo documento em post_insights.
+    Append-only: cada coleta adiciona um novo documento em post_insights.
+
+    concurrency:    máximo de chamadas /insights em voo (1 = coleta serial).
+    use_batch:      agrupa os posts em chamadas batch da Graph API (até 50 posts por chamada).
+    tiered_refresh: só recoleta os posts vencidos segundo a idade e a variação recente
+                    (INSIGHTS_REFRESH_TIERS). False = todos os posts, todo dia.
+    skip_ineligible: pula os posts do registro insights_ineligible ainda dentro do TTL.
 
     Retorna:
         {
-            "status": "ok" | "error",
+            "status": "ok" | "partial" | "error",   # partial/error: erro ao gravar post_insights
             "profile_id": str,
             "posts_total": int,
-            "posts_with_insights": int,
-            "posts_ineligible": int,   # pré-Business, privado, etc.
+            "posts_due": int,          # vencidos pela política de faixas (= elegíveis sem ela)
+            "posts_with_insights": int,   # documentos gravados
+            "write_errors": int,
+            "posts_ineligible": int,   # pré-Business, privado, etc. (falharam nesta execução)
+            "posts_skipped_ineligible": int,  # pulados por já estarem no registro de inelegíveis
+            "posts_newly_ineligible": int,    # registrados nesta execução
+            "api_calls_saved": int,    # chamadas /insights evitadas pelas faixas (itens de batch, se use_batch)
+            "http_requests_saved": int,   # idem, em requisições HTTP; não inclui os inelegíveis pulados
             "message": str,
         }
     """
@@ -154,53 +484,106 @@ def run_post_insights_service(profile_id: str) -> dict:
 
     access_token = token_doc["long_lived_token"]
     auth_method  = token_doc.get("auth_method", "facebook")
-    base_url     = _get_base_url(auth_method)
+    base_url     = get_base_url(auth_method)
     collected_at = datetime.now(timezone.utc)
 
     # Lê posts do banco (com media_type para selecionar métricas corretas)
     posts = list(mongo_repo.posts.find(
         {"profile_id": profile_id},
-        {"post_id": 1, "media_type": 1, "_id": 0},
+        {"post_id": 1, "media_type": 1, "published_at": 1, "_id": 0},
     ))
 
     if not posts:
         return {"status": "ok", "profile_id": profile_id, "posts_total": 0,
-                "posts_with_insights": 0, "posts_ineligible": 0,
+                "posts_due": 0, "posts_with_insights": 0, "posts_ineligible": 0,
+                "posts_skipped_ineligible": 0, "posts_newly_ineligible": 0, "api_calls_saved": 0, "http_requests_saved": 0,
                 "message": "Nenhum post no banco. Execute media_discovery_service primeiro."}
 
-    posts_with_insights = 0
-    posts_ineligible    = 0
+    known_ineligible = _ineligible_post_ids(profile_id, collected_at) if skip_ineligible else set()
+    candidates = [post for post in posts if post["post_id"] not in known_ineligible]
+    posts_skipped_ineligible = len(posts) - len(candidates)
 
-    for post in posts:
-        metrics = fetch_post_insights(base_url, post, access_token)
+    due_posts = select_posts_due(profile_id, candidates, collected_at) if tiered_refresh else candidates
+    # Economia das faixas: só entre os elegíveis (os inelegíveis pulados são contados à parte)
+    api_calls_saved = len(candidates) - len(due_posts)
+    if use_batch:
+        http_requests_saved = -(-len(candidates) // GRAPH_BATCH_MAX_SIZE) - -(-len(due_posts) // GRAPH_BATCH_MAX_SIZE)
+    else:
+        http_requests_saved = api_calls_saved
+    logger.info(
+        f"[insights_service] {len(due_posts)}/{len(candidates)} posts elegíveis vencidos | "
+        f"inelegíveis pulados={posts_skipped_ineligible} | "
+        f"chamadas evitadas pelas faixas={api_calls_saved} | requisições HTTP evitadas={http_requests_saved}"
+    )
 
-        if metrics is None:
-            posts_ineligible += 1
-            continue
+    posts_ineligible    = 0
+    ineligible_failures: list[tuple[dict, GraphApiError]] = []
+    writer = BulkInserter(mongo_repo.post_insights, "[insights_service]",
+                          key_field="post_id", batch_size=INSIGHTS_INSERT_BATCH_SIZE)
 
-        insight_doc = {
-            "post_id":      post["post_id"],
-            "profile_id":   profile_id,
-            "media_type":   post.get("media_type"),
-            "collected_at": collected_at,
-            **metrics,   # achata todas as métricas no nível do documento
-        }
+    # Enquanto esta coleta grava, os transforms não leem além do collected_at anterior a ela
+    run_id = watermarks.begin_run(profile_id, watermarks.POST_INSIGHTS, collected_at)
+    try:
+        for post, metrics, error in collect_post_insights(base_url, due_posts, access_token, concurrency, use_batch):
+            if metrics is None:
+                posts_ineligible += 1
+                if is_ineligible_error(error):
+                    ineligible_failures.append((post, error))
+                continue
 
-        mongo_repo.post_insights.insert_one(insight_doc)
-        posts_with_insights += 1
+            insight_doc = {
+                "post_id":      post["post_id"],
+                "profile_id":   profile_id,
+                "media_type":   post.get("media_type"),
+                "collected_at": collected_at,
+                **metrics,   # achata todas as métricas no nível do documento
+            }
+
+            writer.add(insight_doc)
+
+        writer.flush()
+    except Exception:
+        watermarks.abandon_run(profile_id, watermarks.POST_INSIGHTS, run_id)
+        raise
+    posts_newly_ineligible = _register_ineligible(profile_id, ineligible_failures, collected_at)
+
+    # Só conta o que foi gravado; com erro de escrita a coleta fica incompleta
+    posts_with_insights = writer.result.inserted
+    write_errors = writer.result.errors
+    if write_errors:
+        # O watermark não avança: os transforms seguem na coleta anterior
+        watermarks.abandon_run(profile_id, watermarks.POST_INSIGHTS, run_id)
+        status = "partial" if posts_with_insights else "error"
+    else:
+        # Todos os documentos desta coleta gravados: transforms passam a enxergá-los
+        watermarks.mark_complete(profile_id, watermarks.POST_INSIGHTS, collected_at, run_id)
+        status = "ok"
 
     logger.info(
         f"[insights_service] Post insights concluído: "
-        f"total={len(posts)} | com_insights={posts_with_insights} | inelegíveis={posts_ineligible}"
+        f"total={len(posts)} | vencidos={len(due_posts)} | "
+        f"com_insights={posts_with_insights} | erros de escrita={write_errors} | "
+        f"inelegíveis={posts_ineligible} | registrados como inelegíveis={posts_newly_ineligible}"
     )
 
     return {
-        "status": "ok",
+        "status": status,
         "profile_id": profile_id,
         "posts_total": len(posts),
+        "posts_due": len(due_posts),
         "posts_with_insights": posts_with_insights,
+        "write_errors": write_errors,
         "posts_ineligible": posts_ineligible,
-        "message": f"{posts_with_insights} posts com insights coletados",
+        "posts_skipped_ineligible": posts_skipped_ineligible,
+        "posts_newly_ineligible": posts_newly_ineligible,
+        "api_calls_saved": api_calls_saved,
+        "http_requests_saved": http_requests_saved,
+        "message": (
+            f"{posts_with_insights} posts com insights coletados ({api_calls_saved} não vencidos"
+            + (f", {posts_skipped_ineligible} inelegíveis pulados" if posts_skipped_ineligible else "")
+            + ")"
+            + (f", {write_errors} com erro de escrita" if write_errors else "")
+        ),
     }
 
 
@@ -213,6 +596,7 @@ def fetch_interaction_metrics(
     auth_method: str,
     since: datetime,
     until: datetime,
+    raise_on_error: bool = False,
 ) -> dict:
     """
     Coleta métricas de interação do perfil para o período especificado.
@@ -221,7 +605,8 @@ def fetch_interaction_metrics(
     instagram: reach, profile_views, total_interactions
               (follows_and_unfollows não disponível neste fluxo)
 
-    Retorna dict {metric_name: total_value}.
+    Retorna dict {metric_name: total_value}. Em erro retorna {}, ou levanta
+    GraphApiError se raise_on_error=True (ex: backfill, que refaz a janela depois).
     """
     if auth_method == "facebook":
         metrics = "accounts_engaged,views,reach,profile_views,total_interactions,follows_and_unfollows"
@@ -242,19 +627,16 @@ def fetch_interaction_metrics(
     )
 
     try:
-        response = requests.get(url, timeout=15)
-    except requests.RequestException as e:
-        logger.error(f"[insights_service] Erro de rede em profile insights: {e}")
-        return {}
-
-    if response.status_code != 200:
-        error_msg = response.json().get("error", {}).get("message", response.text)
-        logger.error(f"[insights_service] Erro {response.status_code} em interaction metrics: {error_msg}")
+        payload = graph_client.get(url)
+    except GraphApiError as e:
+        logger.error(f"[insights_service] Erro em interaction metrics: {e}")
+        if raise_on_error:
+            raise
         return {}
 
     # Achata: [{name, values:[{value}]}] → {name: total_value}
     result = {}
-    for item in response.json().get("data", []):
+    for item in payload.get("data", []):
         name = item["name"]
         # total_value vem como object quando metric_type=total_value
         total = item.get("total_value", {})
@@ -262,66 +644,75 @@ def fetch_interaction_metrics(
     return result
 
 
-def fetch_audience_demographics(
+def fetch_demographic_breakdown(
     base_url: str,
     profile_id: str,
     access_token: str,
+    breakdown: str,
     timeframe: str = "this_month",
 ) -> dict:
     """
-    Coleta dados demográficos da audiência por breakdown.
-    Uma chamada à API por breakdown (exigência da API).
-
-    Retorna dict {breakdown: {dimension: count}}, ex:
-        {"country": {"BR": 412, "US": 38}, "age": {"18-24": 230}, ...}
+    Coleta follower_demographics de um único breakdown.
 
-    Retorna {} por breakdown se conta tiver < 100 seguidores/engajamentos (esperado).
+    Retorna dict {dimension: count}, ex: {"BR": 412, "US": 38}.
+    Retorna {} se a conta tiver < 100 seguidores/engajamentos (esperado) ou em erro.
     """
-    results = {}
-
-    for breakdown in AUDIENCE_BREAKDOWNS:
-        url = (
-            f"{base_url}/{GRAPH_VERSION}/{profile_id}/insights"
-            f"?metric=engaged_audience_demographics,follower_demographics"
-            f"&period=lifetime"
-            f"&metric_type=total_value"
-            f"&timeframe={timeframe}"
-            f"&breakdown={breakdown}"
-            f"&access_token={access_token}"
-        )
+    url = (
+        f"{base_url}/{GRAPH_VERSION}/{profile_id}/insights"
+        f"?metric=engaged_audience_demographics,follower_demographics"
+        f"&period=lifetime"
+        f"&metric_type=total_value"
+        f"&timeframe={timeframe}"
+        f"&breakdown={breakdown}"
+        f"&access_token={access_token}"
+    )
 
-        try:
-            response = requests.get(url, timeout=15)
-        except requests.RequestException as e:
-            logger.error(f"[insights_service] Erro de rede no breakdown {breakdown}: {e}")
-            results[breakdown] = {}
-            continue
+    try:
+        payload = graph_client.get(url)
+    except GraphApiError as e:
+        logger.warning(f"[insights_service] Erro no breakdown {breakdown}: {e}")
+        return {}
+
+    data = payload.get("data", [])
 
-        if response.status_code != 200:
-            error_msg = response.json().get("error", {}).get("message", response.text)
-            logger.warning(f"[insights_service] Erro no breakdown {breakdown}: {error_msg}")
-            results[breakdown] = {}
+    # Extrai follower_demographics para o breakdown atual
+    # Estrutura: data[i].total_value.breakdowns[0].results → [{dimension_values:["BR"], value:412}]
+    agg: dict[str, int] = {}
+    for metric_item in data:
+        if metric_item.get("name") != "follower_demographics":
             continue
+        for bd in metric_item.get("total_value", {}).get("breakdowns", []):
+            for entry in bd.get("results", []):
+                dims  = entry.get("dimension_values", [])
+                value = entry.get("value", 0)
+                key   = dims[0] if dims else "unknown"
+                agg[key] = agg.get(key, 0) + value
 
-        data = response.json().get("data", [])
+    logger.info(f"[insights_service] Demográfico breakdown={breakdown} | entradas={len(agg)}")
+    return agg
 
-        # Extrai follower_demographics para o breakdown atual
-        # Estrutura: data[i].total_value.breakdowns[0].results → [{dimension_values:["BR"], value:412}]
-        agg: dict[str, int] = {}
-        for metric_item in data:
-            if metric_item.get("name") != "follower_demographics":
-                continue
-            for bd in metric_item.get("total_value", {}).get("breakdowns", []):
-                for entry in bd.get("results", []):
-                    dims  = entry.get("dimension_values", [])
-                    value = entry.get("value", 0)
-                    key   = dims[0] if dims else "unknown"
-                    agg[key] = agg.get(key, 0) + value
 
-        results[breakdown] = agg
-        logger.info(f"[insights_service] Demográfico breakdown={breakdown} | entradas={len(agg)}")
+def fetch_audience_demographics(
+    base_url: str,
+    profile_id: str,
+    access_token: str,
+    timeframe: str = "this_month",
+) -> dict:
+    """
+    Coleta dados demográficos da audiência por breakdown.
+    Uma chamada à API por breakdown (exigência da API) — as chamadas rodam em paralelo.
+
+    Retorna dict {breakdown: {dimension: count}}, ex:
+        {"country": {"BR": 412, "US": 38}, "age": {"18-24": 230}, ...}
 
-    return results
+    Retorna {} por breakdown se conta tiver < 100 seguidores/engajamentos (esperado).
+    """
+    with ThreadPoolExecutor(max_workers=len(AUDIENCE_BREAKDOWNS), thread_name_prefix="demographics") as pool:
+        futures = {
+            breakdown: pool.submit(fetch_demographic_breakdown, base_url, profile_id, access_token, breakdown, timeframe)
+            for breakdown in AUDIENCE_BREAKDOWNS
+        }
+        return {breakdown: future.result() for breakdown, future in futures.items()}
 
 
 def run_profile_insights_service(
@@ -364,15 +755,16 @@ def run_profile_insights_service(
 
     access_token = token_doc["long_lived_token"]
     auth_method  = token_doc.get("auth_method", "facebook")
-    base_url     = _get_base_url(auth_method)
+    base_url     = get_base_url(auth_method)
 
-    # A) Métricas de interação do período
-    interaction = fetch_interaction_metrics(
-        base_url, profile_id, access_token, auth_method, since_ts, until_ts
-    )
-
-    # B) Dados demográficos (sempre this_month para cobrir o período)
-    demographics = fetch_audience_demographics(base_url, profile_id, access_token)
+    # A) Métricas de interação do período, numa thread, enquanto B) os dados
+    # demográficos (sempre this_month para cobrir o período) são buscados em paralelo
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="profile_insights") as pool:
+        interaction_future = pool.submit(
+            fetch_interaction_metrics, base_url, profile_id, access_token, auth_method, since_ts, until_ts
+        )
+        demographics = fetch_audience_demographics(base_url, profile_id, access_token)
+        interaction  = interaction_future.result()
 
     # Upsert em profile_insights (índice único: profile_id + period_until)
     insight_doc = {
@@ -396,7 +788,8 @@ def run_profile_insights_service(
 
     mongo_repo.profile_insights.update_one(
         {"profile_id": profile_id, "period_until": until_dt.isoformat()},
-        {"$set": insight_doc},
+        # Coleta semanal completa (com demográficos) substitui uma janela do backfill
+        {"$set": insight_doc, "$unset": {"backfilled": ""}},
         upsert=True,
     )
 
@@ -413,3 +806,68 @@ def run_profile_insights_service(
         "period_until": until_dt.isoformat(),
         "message": f"Profile insights do período {since_dt} → {until_dt} coletados",
     }
+
+
+def run_profile_insights_for_active_profiles(
+    period_days: int = 7,
+    target_until: date | None = None,
+    max_profiles_in_flight: int = PROFILE_INSIGHTS_MAX_PROFILES_IN_FLIGHT,
+) -> dict:
+    """
+    Modo multi-perfil do 1.6 — roda run_profile_insights_service para todos os perfis ativos,
+    com até `max_profiles_in_flight` perfis ao mesmo tempo.
+
+    A falha de um perfil não interrompe os demais.
+
+    Retorna:
+        {
+            "status": "ok" | "partial" | "error",
+            "profiles_total": int,
+            "profiles_ok": int,
+            "profiles_failed": list[str],
+            "results": list[dict],   # resumo de cada run_profile_insights_service
+            "message": str,
+        }
+    """
+    profile_ids = list_active_profile_ids()
+    logger.info(
+        f"[insights_service] Profile insights multi-perfil: {len(profile_ids)} perfis ativos | "
+        f"em paralelo={max_profiles_in_flight}"
+    )
+
+    if not profile_ids:
+        return {"status": "ok", "profiles_total": 0, "profiles_ok": 0, "profiles_failed": [],
+                "results": [], "message": "Nenhum perfil ativo"}
+
+    def run_one(profile_id: str) -> dict:
+        try:
+            return run_profile_insights_service(profile_id, period_days=period_days, target_until=target_until)
+        except Exception as e:
+            logger.exception(f"[insights_service] Profile insights falhou para profile_id={profile_id}")
+            return {"status": "error", "profile_id": profile_id, "message": str(e)}
+
+    with ThreadPoolExecutor(max_workers=max(1, max_profiles_in_flight), thread_name_prefix="profiles") as pool:
+        results = list(pool.map(run_one, profile_ids))
+
+    failed = [r["profile_id"] for r in results if r.get("status") != "ok"]
+    profiles_ok = len(results) - len(failed)
+    if not failed:
+        status = "ok"
+    elif profiles_ok:
+        status = "partial"
+    else:
+        status = "error"
+
+    logger.info(
+        f"[insights_service] Profile insights multi-perfil concluído: "
+        f"ok={profiles_ok} | falhas={len(failed)}"
+    )
+
+    return {
+        "status": status,
+        "profiles_total": len(profile_ids),
+        "profiles_ok": profiles_ok,
+        "profiles_failed": failed,
+        "results": results,
+        "message": f"{profiles_ok}/{len(profile_ids)} perfis com profile insights coletados",
+    }
@@ -3,9 +3,17 @@ Extract Service 1.2 — media_discovery_service
 Responsável por descobrir e persistir posts novos de um perfil Instagram.
 Fluxo:
   GET /{ig_user_id}/media (idêntico para fluxos facebook e instagram)
-  -> paginação cursor-based via paging.next (limit=100 por página)
+  -> paginação cursor-based via paging.next (limit=100 por página, próxima página em prefetch)
   -> extração de hashtags do caption via regex
-  -> insert_one em 'posts' (write-once — DuplicateKeyError = post já existia)
+  -> $in nos ids da página + insert_many(ordered=False) só dos posts novos (write-once)
+
+Sem parada incremental:
+  Em produção (dag_instagram_etl, /collect/initial, app.runner) a descoberta roda
+  dentro da passada única de /media do snapshot_service, que percorre todas as
+  páginas porque os post_snapshots precisam dos contadores de todos os posts.
+  Parar na primeira página toda conhecida não economizaria nenhuma chamada nesse
+  caminho, então não há modo incremental: a economia nos re-runs é o $in prévio,
+  que evita enviar inserts de posts já conhecidos.
 
 Por que write-once?
   Os metadados de um post não mudam após a publicação (caption, tipo, data).
@@ -20,12 +28,11 @@ Campos coletados da API (v25.0):
 
 import re
 import logging
-import requests
 from datetime import datetime, timezone
 
-from pymongo.errors import DuplicateKeyError
-
 from app.repositories.mongo_repository import mongo_repo
+from app.repositories.bulk_writer import insert_many_unordered
+from app.repositories.graph_api_client import GraphApiError, get_base_url, graph_client
 
 logger = logging.getLogger(__name__)
 
@@ -88,62 +95,95 @@ def _map_post(raw: dict, profile_id: str, collected_at: datetime) -> dict:
     }
 
 
-def fetch_all_posts(profile_id: str, access_token: str, auth_method: str, limit: int = 100) -> list[dict]:
+def iter_post_pages(
+    profile_id: str, access_token: str, auth_method: str, limit: int = 100,
+):
     """
-    Coleta todos os posts do perfil com paginação cursor-based.
+    Gera os posts do perfil página a página (lista de itens brutos por página).
 
     O endpoint /{ig_user_id}/media funciona igual para os dois fluxos
     (facebook e instagram) — só muda o base_url.
 
     Limite prático da API: até 10.000 posts por perfil.
-    Usa limit=100 por página.
+    Usa limit=100 por página, com a próxima página pedida (prefetch) enquanto
+    o caller grava a atual — memória constante em vez da lista inteira.
+
+    Levanta GraphApiError se a paginação for interrompida: o caller não pode
+    tratar uma listagem truncada como completa.
     """
-    base_url = (
-        "https://graph.facebook.com" if auth_method == "facebook"
-        else "https://graph.instagram.com"
-    )
+    base_url = get_base_url(auth_method)
 
-    all_posts: list[dict] = []
-    page_num = 1
-    next_url = (
+    total = 0
+    page_num = 0
+    url = (
         f"{base_url}/{GRAPH_VERSION}/{profile_id}/media"
         f"?fields={MEDIA_FIELDS}&limit={limit}&access_token={access_token}"
     )
 
-    while next_url:
-        try:
-            response = requests.get(next_url, timeout=20)
-        except requests.RequestException as e:
-            logger.error(f"[media_discovery] Erro de rede na página {page_num}: {e}")
-            break
+    try:
+        for data in graph_client.iter_pages(url, prefetch=True):
+            page_num += 1
+            posts = data.get("data", [])
+            total += len(posts)
+            logger.info(f"[media_discovery] Página {page_num:>3} | +{len(posts):>3} posts | Total: {total:>5}")
+            yield posts
+    except GraphApiError as e:
+        logger.error(f"[media_discovery] Erro na página {page_num + 1}: {e}")
+        raise
+
+    logger.info(f"[media_discovery] Coleta concluída: {total} posts coletados da API")
 
-        if response.status_code != 200:
-            error_msg = response.json().get("error", {}).get("message", response.text)
-            logger.error(f"[media_discovery] Erro {response.status_code} na página {page_num}: {error_msg}")
-            break
 
-        data = response.json()
-        posts = data.get("data", [])
-        all_posts.extend(posts)
-        logger.info(f"[media_discovery] Página {page_num:>3} | +{len(posts):>3} posts | Total: {len(all_posts):>5}")
+def fetch_all_posts(profile_id: str, access_token: str, auth_method: str, limit: int = 100) -> list[dict]:
+    """Coleta todos os posts do perfil numa lista (ver iter_post_pages para o modo streaming)."""
+    return [post for page in iter_post_pages(profile_id, access_token, auth_method, limit) for post in page]
 
-        next_url = data.get("paging", {}).get("next")
-        page_num += 1
 
-    logger.info(f"[media_discovery] Coleta concluída: {len(all_posts)} posts coletados da API")
-    return all_posts
+def known_post_ids(post_ids: list[str]) -> set[str]:
+    """Quais destes post_ids já estão em 'posts' — uma consulta $in (índice único de post_id)."""
+    if not post_ids:
+        return set()
+    return {
+        doc["post_id"]
+        for doc in mongo_repo.posts.find({"post_id": {"$in": post_ids}}, {"post_id": 1, "_id": 0})
+    }
+
+
+def persist_new_posts(raw_posts: list[dict], profile_id: str, collected_at: datetime) -> dict:
+    """
+    Grava em 'posts' os itens brutos de /media ainda não conhecidos (write-once).
+
+    Os ids da página são checados antes com uma consulta $in (known_post_ids) e só
+    os desconhecidos vão para um insert_many(ordered=False) — em re-runs diários
+    quase todos os posts já existem e nenhuma escrita é enviada. Duplicatas que
+    ainda assim cheguem ao insert (code 11000, corrida entre execuções) contam
+    como já conhecidas, não erro.
+
+    Usado por run_media_discovery_service e pela passada única de /media do
+    snapshot_service (run_media_and_snapshot_service).
+    Retorna {"new_posts": int, "already_known": int}.
+    """
+    raw_posts = [raw for raw in raw_posts if raw.get("id")]
+    known = known_post_ids([raw["id"] for raw in raw_posts])
+    docs = [_map_post(raw, profile_id, collected_at) for raw in raw_posts if raw["id"] not in known]
+    if not docs:
+        return {"new_posts": 0, "already_known": len(known)}
+
+    # post_id já existe (corrida entre execuções) conta como já conhecido
+    outcome = insert_many_unordered(mongo_repo.posts, docs, "[media_discovery]", key_field="post_id")
+    return {"new_posts": outcome.inserted, "already_known": len(known) + outcome.duplicates}
 
 
 def run_media_discovery_service(profile_id: str) -> dict:
     """
-    Ponto de entrada principal — chamado pelo DAG do Airflow.
+    Ponto de entrada principal da descoberta isolada (o DAG usa a passada única
+    run_media_and_snapshot_service do snapshot_service).
     Fluxo:
       1. Busca token em oauth_tokens
-      2. Coleta todos os posts via paginação
-      3. Para cada post: tenta insert_one em 'posts'
-         - Sucesso -> novo post descoberto
-         - DuplicateKeyError -> post já existia (ignorado silenciosamente)
+      2. Coleta os posts via paginação, uma página por vez (mais novos primeiro)
+      3. Para cada página: $in nos post_ids + insert_many(ordered=False) só dos novos
       4. Retorna resumo da operação
+
     Retorna:
         {
             "status": "ok" | "error",
@@ -151,6 +191,7 @@ def run_media_discovery_service(profile_id: str) -> dict:
             "total_fetched": int,     # posts retornados pela API
             "new_posts": int,         # inseridos agora
             "already_known": int,     # já existiam no banco
+            "pages_fetched": int,
             "message": str,
         }
     """
@@ -168,41 +209,48 @@ def run_media_discovery_service(profile_id: str) -> dict:
     access_token = token_doc["long_lived_token"]
     auth_method = token_doc.get("auth_method", "facebook")
 
-    # 2. Coleta da API
-    raw_posts = fetch_all_posts(profile_id, access_token, auth_method)
-    if not raw_posts:
+    # 2 + 3. Coleta da API e persist write-once, uma página por vez
+    collected_at = datetime.now(timezone.utc)
+    total_fetched = 0
+    new_posts = 0
+    already_known = 0
+    pages_fetched = 0
+
+    try:
+        for raw_posts in iter_post_pages(profile_id, access_token, auth_method):
+            persisted = persist_new_posts(raw_posts, profile_id, collected_at)
+            pages_fetched += 1
+            total_fetched += len(raw_posts)
+            new_posts += persisted["new_posts"]
+            already_known += persisted["already_known"]
+    except GraphApiError as e:
+        # Páginas já gravadas ficam (write-once); a próxima execução percorre tudo de novo
+        return {
+            "status": "error", "profile_id": profile_id,
+            "total_fetched": total_fetched, "new_posts": new_posts, "already_known": already_known,
+            "pages_fetched": pages_fetched,
+            "message": f"Paginação de /media interrompida na página {pages_fetched + 1}: {e}",
+        }
+
+    if not total_fetched:
         return {
             "status": "ok", "profile_id": profile_id,
             "total_fetched": 0, "new_posts": 0, "already_known": 0,
+            "pages_fetched": pages_fetched,
             "message": "Nenhum post retornado pela API",
         }
 
-    # 3. Persist: write-once via insert_one + DuplicateKeyError handling
-    collected_at = datetime.now(timezone.utc)
-    new_posts = 0
-    already_known = 0
-
-    for raw in raw_posts:
-        post_doc = _map_post(raw, profile_id, collected_at)
-        try:
-            mongo_repo.posts.insert_one(post_doc)
-            new_posts += 1
-        except DuplicateKeyError:
-            # post_id já existe — comportamento esperado em re-runs do DAG
-            already_known += 1
-        except Exception as e:
-            logger.error(f"[media_discovery] Erro ao inserir post {raw.get('id')}: {e}")
-
     logger.info(
-        f"[media_discovery] Concluído: total={len(raw_posts)} | "
-        f"novos={new_posts} | já existiam={already_known}"
+        f"[media_discovery] Concluído: total={total_fetched} | "
+        f"novos={new_posts} | já existiam={already_known} | páginas={pages_fetched}"
     )
 
     return {
         "status": "ok",
         "profile_id": profile_id,
-        "total_fetched": len(raw_posts),
+        "total_fetched": total_fetched,
         "new_posts": new_posts,
         "already_known": already_known,
+        "pages_fetched": pages_fetched,
         "message": f"{new_posts} novos posts inseridos, {already_known} já existiam",
     }
@@ -0,0 +1,194 @@
+"""
+Registro declarativo das métricas de engajamento por post-dia + kernel vetorizado.
+
+Cada métrica é declarada UMA vez com as colunas de entrada de que precisa, uma
+função sobre arrays NumPy e a mesma fórmula em MQL. O kernel (evaluate) calcula
+todas as métricas registradas de uma vez sobre colunas de milhares de post-dias —
+sem loop Python por post. O backfill server-side (engagement_service) monta o
+$project a partir de mql_expressions, então uma métrica nova é só mais uma
+declaração @metric e aparece nos dois caminhos.
+
+Colunas de entrada (build_columns monta a partir dos documentos já carregados):
+    likes, comments, followers            -> post_snapshots do dia
+    prev_likes, prev_comments, has_prev   -> snapshot anterior do post
+    reach, shares, saved, total_interactions, views -> último post_insights
+
+Divisão por zero:
+    safe_div(num, den) / mql_safe_div(num, den) usam denominador 1 quando den <= 0 —
+    a mesma regra que o cálculo por post sempre usou, então os valores históricos
+    de engagement_metrics não mudam.
+
+Exemplo:
+    @metric("er_simple", inputs=("likes", "comments", "followers"),
+            mql=lambda likes, comments, followers: mql_safe_div({"$add": [likes, comments]}, followers))
+    def er_simple(likes, comments, followers):
+        return safe_div(likes + comments, followers)
+
+Em `mql` cada argumento é a expressão do campo da coluna ("$likes", ...); o
+pipeline precisa ter as colunas de INPUT_COLUMNS como campos antes do $project.
+"""
+
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+
+INPUT_COLUMNS = (
+    "likes", "comments", "followers",
+    "prev_likes", "prev_comments", "has_prev",
+    "reach", "shares", "saved", "total_interactions", "views",
+)
+
+
+@dataclass(frozen=True)
+class Metric:
+    name: str
+    inputs: tuple[str, ...]
+    fn: Callable[..., np.ndarray]
+    mql: Callable[..., dict]
+    dtype: type = float
+    description: str = ""
+
+
+METRICS: dict[str, Metric] = {}
+
+
+def metric(name: str, inputs: tuple[str, ...], mql: Callable[..., dict], dtype: type = float, description: str = ""):
+    """Decorator que registra uma métrica no METRICS (fórmula NumPy + a mesma em MQL)."""
+    unknown = set(inputs) - set(INPUT_COLUMNS)
+    if unknown:
+        raise ValueError(f"Métrica {name}: colunas de entrada desconhecidas {sorted(unknown)}")
+
+    def register(fn: Callable[..., np.ndarray]) -> Callable[..., np.ndarray]:
+        METRICS[name] = Metric(name, inputs, fn, mql, dtype, description or (fn.__doc__ or "").strip())
+        return fn
+    return register
+
+
+def safe_div(num: np.ndarray, den: np.ndarray) -> np.ndarray:
+    """num / den, com den <= 0 tratado como 1."""
+    return num / np.where(den > 0, den, 1)
+
+
+def mql_safe_div(num, den) -> dict:
+    """safe_div em MQL."""
+    return {"$divide": [num, {"$cond": [{"$gt": [den, 0]}, den, 1]}]}
+
+
+def mql_non_negative_delta(current, previous, has_prev) -> dict:
+    """max(0, atual - anterior) em MQL; 0 sem snapshot anterior."""
+    return {"$cond": [has_prev, {"$max": [0, {"$subtract": [current, previous]}]}, 0]}
+
+
+# ─── Métricas registradas ─────────────────────────────────────────────────────
+
+@metric("er_simple", inputs=("likes", "comments", "followers"),
+        mql=lambda likes, comments, followers: mql_safe_div({"$add": [likes, comments]}, followers))
+def er_simple(likes, comments, followers):
+    """(likes + comments) / followers"""
+    return safe_div(likes + comments, followers)
+
+
+@metric("er_weighted", inputs=("likes", "comments", "followers"),
+        mql=lambda likes, comments, followers: mql_safe_div({"$add": [likes, {"$multiply": [2, comments]}]}, followers))
+def er_weighted(likes, comments, followers):
+    """(likes×1 + comments×2) / followers — Arman & Sidik (2019)"""
+    return safe_div(likes + 2 * comments, followers)
+
+
+@metric("er_reach", inputs=("total_interactions", "reach"),
+        mql=lambda total_interactions, reach: mql_safe_div(total_interactions, reach))
+def er_reach(total_interactions, reach):
+    """total_interactions / reach"""
+    return safe_div(total_interactions, reach)
+
+
+@metric("er_followers", inputs=("total_interactions", "followers"),
+        mql=lambda total_interactions, followers: mql_safe_div(total_interactions, followers))
+def er_followers(total_interactions, followers):
+    """total_interactions / followers"""
+    return safe_div(total_interactions, followers)
+
+
+@metric("er_views", inputs=("total_interactions", "views"),
+        mql=lambda total_interactions, views: mql_safe_div(total_interactions, views))
+def er_views(total_interactions, views):
+    """total_interactions / views — proxy Hootsuite para impressions"""
+    return safe_div(total_interactions, views)
+
+
+@metric("relative_reach", inputs=("reach", "followers"),
+        mql=lambda reach, followers: mql_safe_div(reach, followers))
+def relative_reach(reach, followers):
+    """reach / followers"""
+    return safe_div(reach, followers)
+
+
+@metric("amplification_rate", inputs=("shares", "reach"),
+        mql=lambda shares, reach: mql_safe_div(shares, reach))
+def amplification_rate(shares, reach):
+    """shares / reach — e-WOM / advocacia"""
+    return safe_div(shares, reach)
+
+
+@metric("velocity_likes_24h", inputs=("likes", "prev_likes", "has_prev"), dtype=int,
+        mql=mql_non_negative_delta)
+def velocity_likes_24h(likes, prev_likes, has_prev):
+    """Delta de likes desde o snapshot anterior (nunca negativo; 0 sem snapshot anterior)"""
+    return np.where(has_prev, np.maximum(0, likes - prev_likes), 0)
+
+
+@metric("velocity_comments_24h", inputs=("comments", "prev_comments", "has_prev"), dtype=int,
+        mql=mql_non_negative_delta)
+def velocity_comments_24h(comments, prev_comments, has_prev):
+    """Delta de comentários desde o snapshot anterior (nunca negativo; 0 sem snapshot anterior)"""
+    return np.where(has_prev, np.maximum(0, comments - prev_comments), 0)
+
+
+# ─── Kernel ───────────────────────────────────────────────────────────────────
+
+def build_columns(snapshots: list[dict], insights: list[dict], prev_snapshots: list[dict | None]) -> dict[str, np.ndarray]:
+    """
+    Monta as colunas de entrada a partir de listas alinhadas (uma posição por post-dia).
+    Campos ausentes valem 0, como nos .get(campo, 0) do cálculo por post.
+    """
+    n = len(snapshots)
+
+    def column(rows, field: str) -> np.ndarray:
+        return np.fromiter(((row or {}).get(field) or 0 for row in rows), dtype=np.float64, count=n)
+
+    return {
+        "likes":              column(snapshots, "like_count"),
+        "comments":           column(snapshots, "comments_count"),
+        "followers":          column(snapshots, "followers_at_date"),
+        "prev_likes":         column(prev_snapshots, "like_count"),
+        "prev_comments":      column(prev_snapshots, "comments_count"),
+        "has_prev":           np.fromiter((prev is not None for prev in prev_snapshots), dtype=bool, count=n),
+        "reach":              column(insights, "reach"),
+        "shares":             column(insights, "shares"),
+        "saved":              column(insights, "saved"),
+        "total_interactions": column(insights, "total_interactions"),
+        "views":              column(insights, "views"),
+    }
+
+
+def evaluate(columns: dict[str, np.ndarray], names: list[str] | None = None) -> dict[str, list]:
+    """
+    Calcula as métricas registradas (ou só `names`) sobre as colunas.
+    Retorna {métrica: lista de valores Python (float/int)} pronta para o MongoDB.
+    """
+    results = {}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for name in names or METRICS:
+            spec = METRICS[name]
+            values = spec.fn(*(columns[col] for col in spec.inputs))
+            results[name] = values.astype(np.int64 if spec.dtype is int else np.float64).tolist()
+    return results
+
+
+def mql_expressions(names: list[str] | None = None) -> dict[str, dict]:
+    """{métrica: expressão MQL} das métricas registradas (ou só `names`), sobre os campos de INPUT_COLUMNS."""
+    return {
+        name: METRICS[name].mql(*(f"${col}" for col in METRICS[name].inputs))
+        for name in names or METRICS
+    }
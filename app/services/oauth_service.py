@@ -1,9 +1,11 @@
-import requests
 from urllib.parse import urlencode, parse_qs
 from dotenv import load_dotenv
 import os
 from datetime import datetime, timedelta, UTC
 from app.repositories.mongo_repository import mongo_repo
+from app.repositories.graph_api_client import (
+    FACEBOOK_GRAPH_URL, INSTAGRAM_GRAPH_URL, INSTAGRAM_API_URL, GraphApiError, graph_client,
+)
 
 import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -65,7 +67,7 @@ def oauth_code_to_short_lived_token(code: str, is_instagram_only: bool = False)
     Retorna dict com 'access_token' e opcionalmente 'user_id' (apenas no fluxo Instagram).
     """
     if is_instagram_only:
-        base_url = 'https://api.instagram.com/oauth/access_token'
+        base_url = f'{INSTAGRAM_API_URL}/oauth/access_token'
         params = {
             'client_id': IG_OAUTH_APP_ID,
             'client_secret': IG_OAUTH_APP_SECRET,
@@ -73,58 +75,58 @@ def oauth_code_to_short_lived_token(code: str, is_instagram_only: bool = False)
             'redirect_uri': OAUTH_REDIRECT_URI,
             'code': code,
         }
-        response = requests.post(base_url, data=params)
+        request_kwargs = {'data': params}
     else:
-        base_url = f"https://graph.facebook.com/{GRAPH_API_VERSION}/oauth/access_token"
+        base_url = f"{FACEBOOK_GRAPH_URL}/{GRAPH_API_VERSION}/oauth/access_token"
         params = {
             'client_id': FB_OAUTH_APP_ID,
             'client_secret': FB_OAUTH_APP_SECRET,
             'redirect_uri': OAUTH_REDIRECT_URI,
             'code': code
         }
-        response = requests.post(base_url, params=params)
+        request_kwargs = {'params': params}
 
-    if response.status_code == 200:
-        data = response.json()
-        logging.info('OAuth Short-Lived Token obtido com sucesso.')
-        result = {'access_token': data['access_token']}
-        # O Instagram retorna user_id junto com o short-lived token
-        if is_instagram_only and 'user_id' in data:
-            result['user_id'] = str(data['user_id'])
-        return result
+    try:
+        data = graph_client.post(base_url, **request_kwargs)
+    except GraphApiError as e:
+        logging.error(f'Erro ao obter OAuth Short-Lived Token: {e}')
+        return None
 
-    logging.error(f'Erro ao obter OAuth Short-Lived Token: {response.text}')
-    return None
+    logging.info('OAuth Short-Lived Token obtido com sucesso.')
+    result = {'access_token': data['access_token']}
+    # O Instagram retorna user_id junto com o short-lived token
+    if is_instagram_only and 'user_id' in data:
+        result['user_id'] = str(data['user_id'])
+    return result
 
 
 ### >> Exchange short lived for long lived token << ###
 
 def oauth_short_to_long_lived_token(short_tk: str, is_instagram_only: bool = False) -> str | None:
     if is_instagram_only:
-        base_url = 'https://graph.instagram.com/access_token'
+        base_url = f'{INSTAGRAM_GRAPH_URL}/access_token'
         params = {
             'grant_type': 'ig_exchange_token',
             'client_secret': IG_OAUTH_APP_SECRET,
             'access_token': short_tk
         }
-        response = requests.get(base_url, params=params)
     else:
-        base_url = f"https://graph.facebook.com/{GRAPH_API_VERSION}/oauth/access_token"
+        base_url = f"{FACEBOOK_GRAPH_URL}/{GRAPH_API_VERSION}/oauth/access_token"
         params = {
             'grant_type': 'fb_exchange_token',
             'client_id': FB_OAUTH_APP_ID,      
             'client_secret': FB_OAUTH_APP_SECRET,
             'access_token': short_tk
         }
-        response = requests.get(base_url, params=params)
 
-    if response.status_code == 200:
-        data = response.json()
-        logging.info('OAuth Long-Lived Token obtido com sucesso.')
-        return data['access_token']
+    try:
+        data = graph_client.get(base_url, params=params)
+    except GraphApiError as e:
+        logging.error(f'Erro ao obter OAuth Long-Lived Token: {e}')
+        return None
 
-    logging.error(f'Erro ao obter OAuth Long-Lived Token: {response.text}')
-    return None
+    logging.info('OAuth Long-Lived Token obtido com sucesso.')
+    return data['access_token']
 
 
 ### >> Refresh long-lived Instagram OAuth token << ###
@@ -133,20 +135,20 @@ def refresh_ig_oauth_token(long_lived_token: str) -> str | None:
     """
     Com base na documentação https://developers.facebook.com/docs/instagram-platform/reference/refresh_access_token
     """
-    base_url = 'https://graph.instagram.com/refresh_access_token'
+    base_url = f'{INSTAGRAM_GRAPH_URL}/refresh_access_token'
     params = {
         'grant_type': 'ig_refresh_token',
         'access_token': long_lived_token
     }
-    response = requests.get(base_url, params=params)
 
-    if response.status_code == 200:
-        data = response.json()
-        logging.info(f'OAuth Token IG renovado com sucesso. Expira em: {data.get("expires_in")} segundos.')
-        return data['access_token']
+    try:
+        data = graph_client.get(base_url, params=params)
+    except GraphApiError as e:
+        logging.error(f'Erro ao renovar OAuth token IG: {e}')
+        return None
 
-    logging.error(f'Erro ao renovar OAuth token IG: {response.text}')
-    return None
+    logging.info(f'OAuth Token IG renovado com sucesso. Expira em: {data.get("expires_in")} segundos.')
+    return data['access_token']
 
 
 ### >> Validate OAuth token << ###
@@ -155,27 +157,27 @@ def validate_oauth_token(user_token: str) -> dict | None:
     """
     Com base na documentação https://developers.facebook.com/docs/graph-api/reference/v25.0/debug_token
     """
-    base_url = f'https://graph.facebook.com/{GRAPH_API_VERSION}/debug_token'
+    base_url = f'{FACEBOOK_GRAPH_URL}/{GRAPH_API_VERSION}/debug_token'
     app_token = f"{FB_OAUTH_APP_ID}|{FB_OAUTH_APP_SECRET}"
     params = {
         'input_token': user_token,
         'access_token': app_token
     }
-    response = requests.get(base_url, params=params)
-
-    if response.status_code == 200:
-        data = response.json().get('data', {})
-        is_valid = data.get('is_valid', False)
-        logging.info(f'Validação OAuth token: is_valid={is_valid}, expira em={data.get("expires_at")}')
-        return {
-            'is_valid': is_valid,
-            'expires_at': data.get('expires_at'),
-            'scopes': data.get('scopes', []),
-            'user_id': data.get('user_id'),
-        }
 
-    logging.error(f'Erro ao validar OAuth token: {response.text}')
-    return None
+    try:
+        data = graph_client.get(base_url, params=params).get('data', {})
+    except GraphApiError as e:
+        logging.error(f'Erro ao validar OAuth token: {e}')
+        return None
+
+    is_valid = data.get('is_valid', False)
+    logging.info(f'Validação OAuth token: is_valid={is_valid}, expira em={data.get("expires_at")}')
+    return {
+        'is_valid': is_valid,
+        'expires_at': data.get('expires_at'),
+        'scopes': data.get('scopes', []),
+        'user_id': data.get('user_id'),
+    }
 
 ### >> Save oauth token and profile data << ###
 
@@ -247,23 +249,23 @@ def fetch_ig_user_info(access_token: str, user_id: str = None, is_instagram_only
     """
     if is_instagram_only:
         # Token do Instagram Business Login só funciona na Instagram Graph API
-        url = f"https://graph.instagram.com/{GRAPH_API_VERSION}/me"
+        url = f"{INSTAGRAM_GRAPH_URL}/{GRAPH_API_VERSION}/me"
         params = {
             'fields': 'id,username',
             'access_token': access_token
         }
     else:
-        url = f"https://graph.facebook.com/{GRAPH_API_VERSION}/{user_id}"
+        url = f"{FACEBOOK_GRAPH_URL}/{GRAPH_API_VERSION}/{user_id}"
         params = {
             'fields': 'id,username',
             'access_token': access_token
         }
 
-    response = requests.get(url, params=params)
-    if response.status_code == 200:
-        data = response.json()
-        logging.info(f'Dados do usuário obtidos com sucesso: {data}')
-        return data
-    
-    logging.error(f'Erro ao obter dados do usuário: {response.text}')
-    return None
+    try:
+        data = graph_client.get(url, params=params)
+    except GraphApiError as e:
+        logging.error(f'Erro ao obter dados do usuário: {e}')
+        return None
+
+    logging.info(f'Dados do usuário obtidos com sucesso: {data}')
+    return data
@@ -13,10 +13,10 @@ O token e o profile_id são lidos do MongoDB (oauth_tokens)
 """
 
 import logging
-import requests
 from datetime import datetime, timezone
 
 from app.repositories.mongo_repository import mongo_repo
+from app.repositories.graph_api_client import GraphApiError, get_base_url, graph_client
 
 logger = logging.getLogger(__name__)
 
@@ -60,33 +60,28 @@ def fetch_profile(profile_id: str, access_token: str, auth_method: str) -> dict
       - facebook:   endpoint /{ig_user_id}
       - instagram:  endpoint /me
     """
+    base_url = get_base_url(auth_method)
     if auth_method == "facebook":
-        base_url = "https://graph.facebook.com"
         endpoint = f"{base_url}/{GRAPH_VERSION}/{profile_id}"
     else:
-        base_url = "https://graph.instagram.com"
         endpoint = f"{base_url}/{GRAPH_VERSION}/me"
 
     fields = PROFILE_FIELDS.get(auth_method, PROFILE_FIELDS["facebook"])
 
     try:
-        response = requests.get(
-            endpoint,
-            params={"fields": fields, "access_token": access_token},
-            timeout=15,
-        )
-    except requests.RequestException as e:
-        logger.error(f"[profile_service] Erro de rede ao buscar perfil {profile_id}: {e}")
+        data = graph_client.get(endpoint, params={"fields": fields, "access_token": access_token})
+    except GraphApiError as e:
+        logger.error(f"[profile_service] Erro ao buscar perfil {profile_id}: {e}")
         return None
 
-    if response.status_code == 200:
-        data = response.json()
-        logger.info(f"[profile_service] Perfil coletado: profile_id={data.get('id')} | username={data.get('username')!r}")
-        return data
+    logger.info(f"[profile_service] Perfil coletado: profile_id={data.get('id')} | username={data.get('username')!r}")
+    return data
 
-    error_msg = response.json().get("error", {}).get("message", response.text)
-    logger.error(f"[profile_service] Erro {response.status_code} ao buscar perfil {profile_id}: {error_msg}")
-    return None
+
+def list_active_profile_ids() -> list[str]:
+    """profile_ids de ig_profiles com is_active=True (perfis que os DAGs devem processar)."""
+    cursor = mongo_repo.ig_profiles.find({"is_active": True}, {"profile_id": 1, "_id": 0}).sort("profile_id", 1)
+    return [doc["profile_id"] for doc in cursor]
 
 
 def run_profile_service(profile_id: str) -> dict:
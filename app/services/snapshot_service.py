@@ -7,16 +7,25 @@ Duas collections escritas por este service:
       profile_id, date, followers_count, follows_count, media_count
   post_snapshots -> um documento por post por dia
       post_id, profile_id, date, like_count, comments_count, followers_at_date
+
+Passada única de /media (run_media_and_snapshot_service):
+  A descoberta de posts (media_discovery_service) e os post_snapshots leem o
+  mesmo edge /{ig_user_id}/media — MEDIA_FIELDS já inclui like_count e
+  comments_count. O entry point combinado pagina /media uma vez por execução e
+  alimenta tanto o insert write-once em 'posts' quanto o bulk upsert em
+  'post_snapshots', em vez de duas paginações completas seguidas.
 """
 
 import logging
-import requests
 from datetime import datetime, date, timezone
 
 from pymongo import UpdateOne
-from pymongo.errors import BulkWriteError
+from pymongo.errors import BulkWriteError, PyMongoError
 
+from app.repositories import watermarks
 from app.repositories.mongo_repository import mongo_repo
+from app.repositories.graph_api_client import GraphApiError, get_base_url, graph_client
+from app.services.media_discovery_service import iter_post_pages, persist_new_posts
 
 logger = logging.getLogger(__name__)
 
@@ -45,13 +54,6 @@ def _get_token_doc(profile_id: str) -> dict | None:
     return doc
 
 
-def _get_base_url(auth_method: str) -> str:
-    return (
-        "https://graph.facebook.com" if auth_method == "facebook"
-        else "https://graph.instagram.com"
-    )
-
-
 # ─── Profile snapshot ─────────────────────────────────────────────────────────
 
 def fetch_profile_counts(profile_id: str, access_token: str, auth_method: str) -> dict | None:
@@ -59,7 +61,7 @@ def fetch_profile_counts(profile_id: str, access_token: str, auth_method: str) -
     Busca apenas os contadores do perfil necessários para o profile_snapshot.
     Usa o mesmo endpoint do profile_service, mas com campos mínimos.
     """
-    base_url = _get_base_url(auth_method)
+    base_url = get_base_url(auth_method)
 
     if auth_method == "facebook":
         endpoint = f"{base_url}/{GRAPH_VERSION}/{profile_id}"
@@ -67,22 +69,14 @@ def fetch_profile_counts(profile_id: str, access_token: str, auth_method: str) -
         endpoint = f"{base_url}/{GRAPH_VERSION}/me"
 
     try:
-        response = requests.get(
+        return graph_client.get(
             endpoint,
             params={"fields": PROFILE_SNAPSHOT_FIELDS, "access_token": access_token},
-            timeout=15,
         )
-    except requests.RequestException as e:
-        logger.error(f"[snapshot_service] Erro de rede ao buscar contadores do perfil: {e}")
+    except GraphApiError as e:
+        logger.error(f"[snapshot_service] Erro ao buscar contadores do perfil: {e}")
         return None
 
-    if response.status_code == 200:
-        return response.json()
-
-    error_msg = response.json().get("error", {}).get("message", response.text)
-    logger.error(f"[snapshot_service] Erro {response.status_code} ao buscar perfil: {error_msg}")
-    return None
-
 
 def upsert_profile_snapshot(
     profile_id: str,
@@ -118,47 +112,47 @@ def upsert_profile_snapshot(
 
 # ─── Post snapshots ───────────────────────────────────────────────────────────
 
-def fetch_all_post_counts(
+def iter_post_count_pages(
     profile_id: str,
     access_token: str,
     auth_method: str,
     limit: int = 100,
-) -> list[dict]:
+):
     """
-    Coleta os contadores atuais de todos os posts com paginação cursor-based.
+    Gera os contadores atuais dos posts página a página (cursor-based, com prefetch).
 
     Usa apenas os campos necessários para o snapshot (id, like_count, comments_count).
-    Mesma lógica de paginação do media_discovery_service.
+    Mesma lógica de paginação do media_discovery_service.iter_post_pages
+    (levanta GraphApiError se a paginação for interrompida).
     """
-    base_url = _get_base_url(auth_method)
-    all_posts: list[dict] = []
-    page_num = 1
-    next_url = (
+    base_url = get_base_url(auth_method)
+    total = 0
+    page_num = 0
+    url = (
         f"{base_url}/{GRAPH_VERSION}/{profile_id}/media"
         f"?fields={POST_SNAPSHOT_FIELDS}&limit={limit}&access_token={access_token}"
     )
 
-    while next_url:
-        try:
-            response = requests.get(next_url, timeout=20)
-        except requests.RequestException as e:
-            logger.error(f"[snapshot_service] Erro de rede na página {page_num} de posts: {e}")
-            break
-
-        if response.status_code != 200:
-            error_msg = response.json().get("error", {}).get("message", response.text)
-            logger.error(f"[snapshot_service] Erro {response.status_code} na página {page_num}: {error_msg}")
-            break
-
-        data = response.json()
-        posts = data.get("data", [])
-        all_posts.extend(posts)
-        logger.info(f"[snapshot_service] Posts página {page_num:>3} | +{len(posts):>3} | Total: {len(all_posts):>5}")
+    try:
+        for data in graph_client.iter_pages(url, prefetch=True):
+            page_num += 1
+            posts = data.get("data", [])
+            total += len(posts)
+            logger.info(f"[snapshot_service] Posts página {page_num:>3} | +{len(posts):>3} | Total: {total:>5}")
+            yield posts
+    except GraphApiError as e:
+        logger.error(f"[snapshot_service] Erro na página {page_num + 1} de posts: {e}")
+        raise
 
-        next_url = data.get("paging", {}).get("next")
-        page_num += 1
 
-    return all_posts
+def fetch_all_post_counts(
+    profile_id: str,
+    access_token: str,
+    auth_method: str,
+    limit: int = 100,
+) -> list[dict]:
+    """Coleta os contadores de todos os posts numa lista (ver iter_post_count_pages)."""
+    return [post for page in iter_post_count_pages(profile_id, access_token, auth_method, limit) for post in page]
 
 
 def bulk_upsert_post_snapshots(
@@ -173,28 +167,46 @@ def bulk_upsert_post_snapshots(
 
     Mais eficiente que um loop de update_one, envia todas as operações
     em uma única round-trip ao MongoDB.
+
+    changed_at (marcador de mudança para os transforms incrementais): recebe
+    collected_at quando o snapshot é criado ou quando algum contador muda; um
+    re-snapshot com os mesmos valores preserva o changed_at anterior. Por isso
+    o update é um pipeline: compara os valores gravados antes de sobrescrevê-los.
+
+    Retorna {"upserted": int, "modified": int, "errors": int}. errors > 0 indica
+    snapshots não gravados: o chamador não deve marcar o dia como completo.
     """
     if not posts:
-        return {"upserted": 0, "modified": 0}
+        return {"upserted": 0, "modified": 0, "errors": 0}
 
     date_str = snapshot_date.isoformat()
 
-    operations = [
-        UpdateOne(
+    operations = []
+    for post in posts:
+        counters = {
+            "like_count":        post.get("like_count", 0),
+            "comments_count":    post.get("comments_count", 0),
+            "followers_at_date": followers_at_date,
+        }
+        unchanged = {"$and": [{"$eq": [f"${field}", {"$literal": value}]} for field, value in counters.items()]}
+        operations.append(UpdateOne(
             {"post_id": post["id"], "date": date_str},
-            {"$set": {
-                "post_id":           post["id"],
-                "profile_id":        profile_id,
-                "date":              date_str,
-                "like_count":        post.get("like_count", 0),
-                "comments_count":    post.get("comments_count", 0),
-                "followers_at_date": followers_at_date,
-                "collected_at":      collected_at,
-            }},
+            [
+                {"$set": {"changed_at": {"$cond": [
+                    unchanged,
+                    {"$ifNull": ["$changed_at", {"$literal": collected_at}]},   # snapshots anteriores ao changed_at
+                    {"$literal": collected_at},
+                ]}}},
+                {"$set": {
+                    "post_id":      {"$literal": post["id"]},
+                    "profile_id":   {"$literal": profile_id},
+                    "date":         {"$literal": date_str},
+                    **{field: {"$literal": value} for field, value in counters.items()},
+                    "collected_at": {"$literal": collected_at},
+                }},
+            ],
             upsert=True,
-        )
-        for post in posts
-    ]
+        ))
 
     try:
         result = mongo_repo.post_snapshots.bulk_write(operations, ordered=False)
@@ -204,35 +216,68 @@ def bulk_upsert_post_snapshots(
             f"[snapshot_service] post_snapshots bulk_write: "
             f"upserted={upserted} | modified={modified} | total={len(posts)}"
         )
-        return {"upserted": upserted, "modified": modified}
+        return {"upserted": upserted, "modified": modified, "errors": 0}
     except BulkWriteError as e:
-        logger.error(f"[snapshot_service] BulkWriteError: {e.details}")
-        return {"upserted": 0, "modified": 0}
+        write_errors = e.details.get("writeErrors", [])
+        logger.error(
+            f"[snapshot_service] BulkWriteError em post_snapshots: "
+            f"{len(write_errors)} de {len(posts)} não gravados | primeiro erro: "
+            f"{write_errors[0].get('errmsg') if write_errors else e.details}"
+        )
+        return {
+            "upserted": e.details.get("nUpserted", 0),
+            "modified": e.details.get("nModified", 0),
+            "errors":   len(write_errors) or len(posts),
+        }
+    except PyMongoError as e:
+        logger.error(f"[snapshot_service] Falha no bulk_write de {len(posts)} post_snapshots: {e}")
+        return {"upserted": 0, "modified": 0, "errors": len(posts)}
+
+
+def snapshot_profile(
+    profile_id: str,
+    access_token: str,
+    auth_method: str,
+    snapshot_date: date,
+    collected_at: datetime,
+) -> int | None:
+    """
+    Busca os contadores do perfil e grava o profile_snapshot do dia.
+    Retorna followers_count (usado como followers_at_date dos post_snapshots) ou None em falha.
+    """
+    profile_data = fetch_profile_counts(profile_id, access_token, auth_method)
+    if not profile_data:
+        return None
+
+    followers_count = profile_data.get("followers_count", 0)
+    upsert_profile_snapshot(
+        profile_id, snapshot_date,
+        followers_count,
+        profile_data.get("follows_count", 0),
+        profile_data.get("media_count", 0),
+        collected_at,
+    )
+    return followers_count
 
 
 # ─── Entry point ──────────────────────────────────────────────────────────────
 
-def run_snapshot_service(profile_id: str, target_date: date | None = None) -> dict:
+def _run_snapshot_pass(profile_id: str, target_date: date | None, discover: bool) -> dict:
     """
-    Ponto de entrada principal, chamado pelo DAG do Airflow.
-
-    target_date: data do snapshot. None = hoje (UTC).
-    Retorna:
-        {
-            "status": "ok" | "error",
-            "profile_id": str,
-            "date": str (YYYY-MM-DD),
-            "followers_count": int,
-            "posts_processed": int,
-            "post_snapshots_upserted": int,
-            "post_snapshots_updated": int,
-            "message": str,
-        }
+    Fluxo comum dos dois entry points: token, profile_snapshot e uma paginação de
+    /media gravando os post_snapshots página a página entre begin_run e
+    mark_complete do watermark POST_SNAPSHOTS.
+
+    discover=True pagina com MEDIA_FIELDS e também grava os posts novos em 'posts'
+    (persist_new_posts); discover=False pagina só com POST_SNAPSHOT_FIELDS.
+    O resultado traz total_fetched/new_posts/already_known (discover) ou
+    posts_processed (snapshot apenas) — ver os docstrings dos entry points.
     """
     snapshot_date = target_date or datetime.now(timezone.utc).date()
     collected_at  = datetime.now(timezone.utc)
+    label = "descoberta + snapshot" if discover else "snapshot"
 
-    logger.info(f"[snapshot_service] Iniciando snapshot: profile_id={profile_id} | date={snapshot_date}")
+    logger.info(f"[snapshot_service] Iniciando {label}: profile_id={profile_id} | date={snapshot_date}")
 
     # 1. Token
     token_doc = _get_token_doc(profile_id)
@@ -247,45 +292,146 @@ def run_snapshot_service(profile_id: str, target_date: date | None = None) -> di
     auth_method  = token_doc.get("auth_method", "facebook")
 
     # 2. Profile snapshot
-    profile_data = fetch_profile_counts(profile_id, access_token, auth_method)
-    if not profile_data:
+    followers_count = snapshot_profile(profile_id, access_token, auth_method, snapshot_date, collected_at)
+    if followers_count is None:
         return {
             "status": "error", "profile_id": profile_id,
             "date": snapshot_date.isoformat(),
             "message": "Falha ao buscar contadores do perfil",
         }
 
-    followers_count = profile_data.get("followers_count", 0)
-    follows_count   = profile_data.get("follows_count", 0)
-    media_count     = profile_data.get("media_count", 0)
+    # 3. Uma paginação de /media, gravando página a página (com followers_at_date)
+    totals = {"total_fetched": 0, "new_posts": 0, "already_known": 0, "upserted": 0, "modified": 0, "errors": 0}
 
-    upsert_profile_snapshot(
-        profile_id, snapshot_date,
-        followers_count, follows_count, media_count,
-        collected_at,
+    def counts() -> dict:
+        if discover:
+            return {key: totals[key] for key in ("total_fetched", "new_posts", "already_known")}
+        return {"posts_processed": totals["total_fetched"]}
+
+    # started_at = collected_at: é o changed_at que esta execução grava
+    run_id = watermarks.begin_run(
+        profile_id, watermarks.POST_SNAPSHOTS, snapshot_date.isoformat(), started_at=collected_at
     )
+    if discover:
+        pages = iter_post_pages(profile_id, access_token, auth_method)
+    else:
+        pages = iter_post_count_pages(profile_id, access_token, auth_method)
+    try:
+        for raw_posts in pages:
+            if discover:
+                persisted = persist_new_posts(raw_posts, profile_id, collected_at)
+                totals["new_posts"]     += persisted["new_posts"]
+                totals["already_known"] += persisted["already_known"]
+            page_results = bulk_upsert_post_snapshots(
+                raw_posts, profile_id, snapshot_date,
+                followers_at_date=followers_count,
+                collected_at=collected_at,
+            )
+            totals["total_fetched"] += len(raw_posts)
+            totals["upserted"]      += page_results["upserted"]
+            totals["modified"]      += page_results["modified"]
+            totals["errors"]        += page_results["errors"]
+    except GraphApiError as e:
+        # Paginação truncada: os snapshots do dia não são marcados como completos
+        watermarks.abandon_run(profile_id, watermarks.POST_SNAPSHOTS, run_id)
+        return {
+            "status": "error", "profile_id": profile_id,
+            "date": snapshot_date.isoformat(),
+            **counts(),
+            "message": f"Paginação de /media interrompida após {totals['total_fetched']} posts: {e}",
+        }
+    except Exception:
+        watermarks.abandon_run(profile_id, watermarks.POST_SNAPSHOTS, run_id)
+        raise
 
-    # 3. Post snapshots (com followers_at_date)
-    raw_posts = fetch_all_post_counts(profile_id, access_token, auth_method)
+    result = {
+        "profile_id": profile_id,
+        "date": snapshot_date.isoformat(),
+        "followers_count": followers_count,
+        **counts(),
+        "post_snapshots_upserted": totals["upserted"],
+        "post_snapshots_updated":  totals["modified"],
+    }
+
+    if totals["errors"]:
+        # Snapshots não gravados: o dia não é marcado como completo e os
+        # marcadores changed_at continuam visíveis para os transforms
+        watermarks.abandon_run(profile_id, watermarks.POST_SNAPSHOTS, run_id)
+        return {
+            "status": "partial" if totals["upserted"] + totals["modified"] else "error",
+            **result,
+            "write_errors": totals["errors"],
+            "message": f"{totals['errors']} de {totals['total_fetched']} post_snapshots com erro de escrita",
+        }
 
-    post_results = bulk_upsert_post_snapshots(
-        raw_posts, profile_id, snapshot_date,
-        followers_at_date=followers_count,
-        collected_at=collected_at,
-    )
+    # Só depois da última página: transforms passam a ler os snapshots deste dia
+    watermarks.mark_complete(profile_id, watermarks.POST_SNAPSHOTS, snapshot_date.isoformat(), run_id)
 
     logger.info(
-        f"[snapshot_service] Concluído: profile_id={profile_id} | date={snapshot_date} | "
-        f"followers={followers_count} | posts={len(raw_posts)}"
+        f"[snapshot_service] {label.capitalize()} concluído: profile_id={profile_id} | "
+        f"date={snapshot_date} | followers={followers_count} | posts={totals['total_fetched']}"
+        + (f" | novos={totals['new_posts']}" if discover else "")
     )
 
-    return {
-        "status": "ok",
-        "profile_id": profile_id,
-        "date": snapshot_date.isoformat(),
-        "followers_count": followers_count,
-        "posts_processed": len(raw_posts),
-        "post_snapshots_upserted": post_results["upserted"],
-        "post_snapshots_updated":  post_results["modified"],
-        "message": f"Snapshot de {snapshot_date} concluído com sucesso",
-    }
\ No newline at end of file
+    if discover:
+        message = (
+            f"{totals['new_posts']} novos posts, "
+            f"{totals['total_fetched']} post_snapshots de {snapshot_date}"
+        )
+    else:
+        message = f"Snapshot de {snapshot_date} concluído com sucesso"
+    return {"status": "ok", **result, "message": message}
+
+
+def run_snapshot_service(profile_id: str, target_date: date | None = None) -> dict:
+    """
+    Snapshot diário sem descoberta de posts: pagina /media só com os contadores
+    (POST_SNAPSHOT_FIELDS). O DAG e as rotas de /collect usam
+    run_media_and_snapshot_service; este entry point fica para execuções isoladas
+    (ex: benchmarks/run_extract_benchmark.py).
+
+    target_date: data do snapshot. None = hoje (UTC).
+    Retorna:
+        {
+            "status": "ok" | "partial" | "error",   # partial/error: erro ao gravar post_snapshots
+            "profile_id": str,
+            "date": str (YYYY-MM-DD),
+            "followers_count": int,
+            "posts_processed": int,
+            "post_snapshots_upserted": int,
+            "post_snapshots_updated": int,
+            "write_errors": int,    # só quando > 0
+            "message": str,
+        }
+    """
+    return _run_snapshot_pass(profile_id, target_date, discover=False)
+
+
+def run_media_and_snapshot_service(profile_id: str, target_date: date | None = None) -> dict:
+    """
+    Descoberta de posts + snapshot diário numa única paginação de /media.
+
+    Substitui run_media_discovery_service seguido de run_snapshot_service no DAG:
+    cada página de /media (MEDIA_FIELDS) alimenta o insert write-once em 'posts'
+    e o bulk upsert em 'post_snapshots' assim que chega — a próxima página já
+    está sendo buscada enquanto a atual é gravada.
+
+    Sempre percorre todas as páginas: os snapshots precisam de todos os posts.
+
+    target_date: data do snapshot. None = hoje (UTC).
+    Retorna:
+        {
+            "status": "ok" | "partial" | "error",   # partial/error: erro ao gravar post_snapshots
+            "profile_id": str,
+            "date": str (YYYY-MM-DD),
+            "followers_count": int,
+            "total_fetched": int,
+            "new_posts": int,
+            "already_known": int,
+            "post_snapshots_upserted": int,
+            "post_snapshots_updated": int,
+            "write_errors": int,    # só quando > 0
+            "message": str,
+        }
+    """
+    return _run_snapshot_pass(profile_id, target_date, discover=True)
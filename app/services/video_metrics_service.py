@@ -2,58 +2,123 @@
 Transform Service 2.4 — video_metrics_service
 
 Lê os dados acumulados (post_insights) dos posts do tipo VIDEO (Reels)
-para calcular e normalizar as métricas de retenção em formato de série.
+para calcular as métricas de retenção em formato de série.
 
 Métricas calculadas:
 - watch_time_per_view (em ms) = ig_reels_video_view_total_time / views
-- reel_retention_score (0.0 a 1.0) = retenção normalizada em relação aos outros Reels do mesmo perfil
+- reel_retention_score (0.0 a 1.0) = percentile rank do watch_time_per_view entre os Reels do perfil
+- reel_retention_score_30d / _90d = o mesmo rank contra os Reels publicados nos últimos 30 / 90 dias
+- reel_retention_provisional = True se algum score foi ranqueado contra a baseline provisória
+  (ver "Baseline provisória")
 
 As métricas são atualizadas no próprio `engagement_metrics`.
+
+Baseline em t-digest (app/utils/tdigest.py):
+  O rank é calculado contra um sketch de quantis, não contra min/max — um Reel
+  outlier move um único ponto da distribuição em vez de reescalar todos os scores.
+  Nenhum valor bruto é guardado:
+    - baseline histórica: um digest corrente do perfil em etl_state (job="video_retention");
+    - baselines móveis: um digest por semana de publicação em `retention_digests`
+          {profile_id, day: segunda-feira ISO da semana, digest: TDigest.to_dict()}
+      e só as semanas dentro da janela (arredondada para semanas inteiras) são
+      mescladas — o custo depende da janela, não do tamanho do catálogo.
+
+Entrada na baseline:
+  Um digest não remove valores, e o watch_time_per_view de um Reel ainda muda
+  enquanto os insights são recoletados. Por isso cada Reel entra nas baselines
+  UMA vez, quando completa RETENTION_SETTLE_DAYS de publicado, com o valor da
+  última coleta naquele momento (aproximação: variações posteriores não entram).
+  Os Reels assentados saem de uma faixa de published_at guardada em etl_state
+  (settled_until), então cada um é lido uma única vez. Reels mais novos são
+  ranqueados contra a baseline sem fazer parte dela; um Reel sem views quando
+  assenta fica de fora. Cada bucket semanal guarda também o próprio settled_until,
+  gravado junto com o digest: uma faixa refeita após falha não conta o mesmo Reel
+  duas vezes no bucket.
+
+Baseline provisória:
+  Enquanto nenhum Reel assentou (primeiros RETENTION_SETTLE_DAYS de um perfil, ou
+  perfis só com Reels recentes) a baseline correspondente está vazia. Em vez de
+  gravar None, o score é ranqueado contra a última leitura de watch_time_per_view
+  dos Reels ainda não assentados da mesma janela — calculada só quando alguma
+  baseline está vazia — e o documento recebe reel_retention_provisional=True.
+
+Incremental (etl_state, job="video_retention"):
+  Cada execução lê só os insights de VIDEO coletados depois do último processado
+  (até o watermark de post_insights) e só esses vídeos têm o score regravado na
+  data alvo — os scores já gravados dos demais vídeos não são recalculados quando
+  a baseline muda. full=True reconstrói as baselines a partir de todos os Reels
+  assentados do perfil num estado novo: os buckets são trocados num único
+  bulk_write e o etl_state só depois — uma falha no meio mantém o estado anterior.
 """
 
+import os
 import logging
-from datetime import datetime, date, timezone
+from datetime import datetime, date, timedelta, timezone
+from dateutil import parser as dateutil_parser
 
-from pymongo import UpdateOne
-from pymongo.errors import BulkWriteError
+from pymongo import DeleteMany, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
 
+from app.repositories import watermarks
 from app.repositories.mongo_repository import mongo_repo
+from app.utils.tdigest import TDigest
 
 logger = logging.getLogger(__name__)
 
+RETENTION_JOB = "video_retention"
+
+# Baselines móveis: sufixo do campo -> dias de publicação considerados
+RETENTION_BASELINES = {"30d": 30, "90d": 90}
+
+# Dias de publicado até o Reel entrar nas baselines (watch time já estabilizado)
+RETENTION_SETTLE_DAYS = int(os.getenv("RETENTION_SETTLE_DAYS", "7"))
+
+
+def _week_start(day: date) -> str:
+    """Segunda-feira (ISO) da semana de `day` — chave do bucket em retention_digests."""
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+def _published_day(post: dict | None, fallback: date) -> date:
+    """Dia de publicação do post, ou fallback se ausente/inválido."""
+    try:
+        return dateutil_parser.isoparse(post["published_at"]).date()
+    except Exception:
+        return fallback
 
-def run_video_metrics_service(profile_id: str, target_date: date | None = None) -> dict:
+
+def _watch_time_per_view(insight: dict) -> float | None:
+    """ig_reels_video_view_total_time / views, ou None sem views (evita divisão por zero)."""
+    total_time = insight.get("ig_reels_video_view_total_time") or 0
+    views = insight.get("views") or 0
+    return total_time / views if views > 0 and total_time > 0 else None
+
+
+def _latest_video_insights(
+    profile_id: str,
+    since: datetime | None,
+    until: datetime | None,
+    post_ids: list[str] | None = None,
+) -> list[dict]:
     """
-    Calcula o score de retenção relativo para todos os vídeos ('VIDEO') do perfil.
-    A retenção é baseada no tempo médio assistido ('watch_time_per_view').
-    Salva os resultados na collection 'engagement_metrics' (upsert para a data alvo).
+    Último insight de cada VIDEO coletado em (since, until] (só de `post_ids`, se
+    informado), numa única agregação. Usa o índice (profile_id, post_id, collected_at).
     """
-    calc_date = target_date or datetime.now(timezone.utc).date()
-    date_str = calc_date.isoformat()
-    
-    logger.info(f"[video_metrics_service] Processando retain scores para profile_id={profile_id} na data {calc_date}")
+    collected_at = {}
+    if since is not None:
+        collected_at["$gt"] = since
+    if until is not None:
+        collected_at["$lte"] = until
 
-    # 1. Obter todos os IDs de vídeo deste perfil
-    video_posts = list(mongo_repo.posts.find(
-        {"profile_id": profile_id, "media_type": "VIDEO"},
-        {"post_id": 1, "_id": 0}
-    ))
-    
-    if not video_posts:
-        return {
-            "status": "ok", "profile_id": profile_id, "processed": 0,
-            "message": "Nenhum post do tipo VIDEO encontrado."
-        }
-        
-    video_ids = [vp["post_id"] for vp in video_posts]
+    match = {"profile_id": profile_id, "media_type": "VIDEO"}
+    if post_ids is not None:
+        match["post_id"] = {"$in": post_ids}
+    if collected_at:
+        match["collected_at"] = collected_at
 
-    # 2. Resgatar os insights MAIS RECENTES (pois post_insights é append-like series temporais) de cada vídeo
-    # Como não podemos fazer um subquery fácil para o mais recente de cada um sem Agreggation Pipeline,
-    # agrupamos na memória.
-    # A query de agregação mais eficiente para buscar o último insight de cada vídeo:
     pipeline = [
-        {"$match": {"post_id": {"$in": video_ids}}},
-        {"$sort": {"collected_at": -1}},
+        {"$match": match},
+        {"$sort": {"post_id": 1, "collected_at": -1}},
         {"$group": {
             "_id": "$post_id",
             "ig_reels_video_view_total_time": {"$first": "$ig_reels_video_view_total_time"},
@@ -61,77 +126,267 @@ def run_video_metrics_service(profile_id: str, target_date: date | None = None)
             "collected_at": {"$first": "$collected_at"}
         }}
     ]
-    
-    latest_insights = list(mongo_repo.post_insights.aggregate(pipeline))
+    return list(mongo_repo.post_insights.aggregate(pipeline))
 
-    # 3. Calcular watch_time_per_view
-    videometrics = {}
-    max_watch_time = 0.0
-    min_watch_time = float("inf")
-    
-    for ins in latest_insights:
-        post_id = ins["_id"]
-        total_time = ins.get("ig_reels_video_view_total_time", 0)
-        views = ins.get("views", 0)
-        
-        # Só processamos se houver views para evitar divisão por zero
-        if views > 0 and total_time > 0:
-            wt_per_view = total_time / views
-            videometrics[post_id] = wt_per_view
-            
-            if wt_per_view > max_watch_time:
-                max_watch_time = wt_per_view
-            if wt_per_view < min_watch_time:
-                min_watch_time = wt_per_view
-
-    # Trata caso de não haver mínimo útil ou ter um único valor
-    if not videometrics:
-        return {
-            "status": "ok", "profile_id": profile_id, "processed": 0,
-            "message": "Nenhum dado válido de watch time/views para calcular retenção."
-        }
 
-    # Range para normalização (Min-Max Scaler acadêmico de retenção 0-1)
-    amplitude = max_watch_time - min_watch_time
-    # Se todos vídeos tem exatamente a mesma métrica, amplitude = 0
-    if amplitude == 0:
-        amplitude = 1.0 
+def _settle_videos(
+    profile_id: str,
+    profile_digest: TDigest,
+    settled_until: str | None,
+    settle_before: str,
+    insights_watermark: datetime | None,
+    updated_at: datetime,
+    rebuild: bool = False,
+) -> int | None:
+    """
+    Adiciona às baselines os Reels publicados em [settled_until, settle_before):
+    o valor da última coleta entra no digest do perfil e no bucket da semana de
+    publicação. Retorna quantos Reels entraram, ou None se os buckets não foram gravados.
+
+    Cada bucket guarda o próprio settled_until (published_at abaixo do qual os Reels
+    da semana já foram contados), gravado no mesmo update do digest. Se a execução
+    cai antes de etl_state avançar, a próxima refaz a faixa e os buckets ignoram os
+    Reels já contados — o digest do perfil só avança junto com o settled_until de
+    etl_state, então recebe a faixa inteira.
+
+    rebuild=True: os buckets são recalculados do zero (ignorando os gravados) e os
+    das semanas sem Reels são apagados no mesmo bulk_write.
+    """
+    published_at = {"$lt": settle_before}
+    if settled_until is not None:
+        published_at["$gte"] = settled_until
+    posts = list(mongo_repo.posts.find(
+        {"profile_id": profile_id, "media_type": "VIDEO", "published_at": published_at},
+        {"post_id": 1, "published_at": 1, "_id": 0},
+    ))
+
+    fallback = date.fromisoformat(settle_before)
+    weeks = {post["post_id"]: _week_start(_published_day(post, fallback)) for post in posts}
+    published = {post["post_id"]: post.get("published_at") or "" for post in posts}
+    values_by_week: dict[str, list[tuple[str, float]]] = {}
+    if posts:
+        for ins in _latest_video_insights(profile_id, None, insights_watermark, post_ids=list(weeks)):
+            wt_per_view = _watch_time_per_view(ins)
+            if wt_per_view is not None:
+                values_by_week.setdefault(weeks[ins["_id"]], []).append((published[ins["_id"]], wt_per_view))
 
     operations = []
-    
-    # 4. Normalizar e montar as operações Bulk
-    for post_id, wt_per_view in videometrics.items():
-        # Min max scaler = (X - min) / (max - min)
-        # Se amplitude fosse zero, deixamos o valor no meio: 0.5 (ou 1.0 dependendo da preferência)
-        if max_watch_time == min_watch_time:
-            retention_score = 1.0
-        else:
-            retention_score = (wt_per_view - min_watch_time) / amplitude
-            
-        operations.append(
-            UpdateOne(
-                {"post_id": post_id, "date": date_str},
-                {"$set": {
-                    "watch_time_per_view": wt_per_view,
-                    "reel_retention_score": round(retention_score, 4),
-                    "profile_id": profile_id  # fallback se engagement doc for upserted "cego"
-                }},
-                upsert=True
+    if rebuild:
+        # Semanas que não têm mais Reels assentados saem junto com a troca dos buckets
+        operations.append(DeleteMany({"profile_id": profile_id, "day": {"$nin": list(values_by_week)}}))
+        buckets = {}
+    elif not values_by_week:
+        return 0
+    else:
+        buckets = {
+            doc["day"]: doc
+            for doc in mongo_repo.retention_digests.find(
+                {"profile_id": profile_id, "day": {"$in": list(values_by_week)}},
+                {"day": 1, "digest": 1, "settled_until": 1, "_id": 0},
             )
-        )
-        
-    # 5. Efetivar no banco
+        }
+
+    for week, values in values_by_week.items():
+        profile_digest.update([value for _, value in values])
+        doc = buckets.get(week)
+        if doc is None:
+            bucket = TDigest()
+        else:
+            # Reels publicados antes do settled_until do bucket já estão nele
+            bucket = TDigest.from_dict(doc["digest"])
+            bucket_until = doc.get("settled_until") or ""
+            values = [(pub, value) for pub, value in values if pub >= bucket_until]
+            if not values:
+                continue
+        bucket.update([value for _, value in values])
+        operations.append(UpdateOne(
+            {"profile_id": profile_id, "day": week},
+            {"$set": {"digest": bucket.to_dict(), "settled_until": settle_before, "updated_at": updated_at}},
+            upsert=True,
+        ))
+
     if operations:
+        try:
+            mongo_repo.retention_digests.bulk_write(operations, ordered=False)
+        except PyMongoError as e:
+            logger.error(f"[video_metrics_service] Falha ao gravar retention_digests de profile_id={profile_id}: {e}")
+            return None
+    return sum(len(values) for values in values_by_week.values())
+
+
+def _load_baselines(profile_id: str, profile_digest: TDigest, calc_date: date) -> dict[str, TDigest]:
+    """
+    Baseline histórica ("") = digest do perfil; móveis = merge só dos buckets semanais
+    dentro de cada janela de RETENTION_BASELINES (uma consulta pela maior janela).
+    """
+    cutoffs = {suffix: _week_start(calc_date - timedelta(days=days)) for suffix, days in RETENTION_BASELINES.items()}
+    baselines = {"": profile_digest, **{suffix: TDigest() for suffix in RETENTION_BASELINES}}
+
+    cursor = mongo_repo.retention_digests.find(
+        {"profile_id": profile_id, "day": {"$gte": min(cutoffs.values()), "$lte": calc_date.isoformat()}},
+        {"day": 1, "digest": 1, "_id": 0},
+    )
+    for doc in cursor:
+        bucket = TDigest.from_dict(doc["digest"])
+        for suffix, cutoff in cutoffs.items():
+            if doc["day"] >= cutoff:
+                baselines[suffix].merge(bucket)
+    return baselines
+
+
+def _provisional_baselines(
+    profile_id: str,
+    settled_until: str | None,
+    calc_date: date,
+    insights_watermark: datetime | None,
+) -> dict[str, TDigest]:
+    """
+    Baselines com os Reels ainda não assentados (published_at >= settled_until):
+    histórica ("") com todos, móveis só com os publicados dentro de cada janela.
+    Usadas no lugar de uma baseline vazia.
+    """
+    published_at = {"$lte": calc_date.isoformat() + "T23:59:59"}
+    if settled_until is not None:
+        published_at["$gte"] = settled_until
+    posts = list(mongo_repo.posts.find(
+        {"profile_id": profile_id, "media_type": "VIDEO", "published_at": published_at},
+        {"post_id": 1, "published_at": 1, "_id": 0},
+    ))
+    baselines = {"": TDigest(), **{suffix: TDigest() for suffix in RETENTION_BASELINES}}
+    if not posts:
+        return baselines
+
+    published = {post["post_id"]: _published_day(post, calc_date) for post in posts}
+    for ins in _latest_video_insights(profile_id, None, insights_watermark, post_ids=list(published)):
+        wt_per_view = _watch_time_per_view(ins)
+        if wt_per_view is None:
+            continue
+        baselines[""].add(wt_per_view)
+        for suffix, days in RETENTION_BASELINES.items():
+            if published[ins["_id"]] >= calc_date - timedelta(days=days):
+                baselines[suffix].add(wt_per_view)
+    return baselines
+
+
+def run_video_metrics_service(profile_id: str, target_date: date | None = None, full: bool = False) -> dict:
+    """
+    Calcula o score de retenção (percentile rank) dos vídeos ('VIDEO') com insights novos.
+    A retenção é baseada no tempo médio assistido ('watch_time_per_view').
+    Salva os resultados na collection 'engagement_metrics' (upsert para a data alvo).
+
+    full=True: reconstrói digests e buckets do perfil e recalcula o score de todos os vídeos.
+    """
+    calc_date = target_date or datetime.now(timezone.utc).date()
+    date_str = calc_date.isoformat()
+    now = datetime.now(timezone.utc)
+
+    logger.info(f"[video_metrics_service] Processando retain scores para profile_id={profile_id} na data {calc_date}")
+
+    # 1. Estado: ponto processado, faixa de Reels assentados e digest do perfil
+    # (insights até o watermark de post_insights — ignora uma coleta ainda em andamento)
+    insights_watermark = watermarks.get_watermark(profile_id, watermarks.POST_INSIGHTS)
+    if full:
+        # Reconstrói num estado novo; o gravado só é substituído depois dos buckets
+        # novos (até lá, digests e marcadores antigos seguem válidos)
+        state = {}
+    else:
+        state = mongo_repo.etl_state.find_one({"job": RETENTION_JOB, "profile_id": profile_id}) or {}
+    processed_until = state.get("insights_until")
+    profile_digest = TDigest.from_dict(state["digest"]) if state.get("digest") else TDigest()
+
+    # 2. Reels que completaram RETENTION_SETTLE_DAYS desde a última execução entram nas baselines
+    settle_before = (calc_date - timedelta(days=RETENTION_SETTLE_DAYS)).isoformat()
+    settled = 0
+    if full or settle_before > (state.get("settled_until") or ""):
+        settled = _settle_videos(
+            profile_id, profile_digest, state.get("settled_until"), settle_before, insights_watermark, now,
+            rebuild=full,
+        )
+        if settled is None:
+            # etl_state não avança: a próxima execução refaz a mesma faixa
+            return {"status": "error", "profile_id": profile_id, "message": "Falha ao gravar retention_digests."}
+        try:
+            mongo_repo.etl_state.update_one(
+                {"job": RETENTION_JOB, "profile_id": profile_id},
+                {
+                    "$set": {"settled_until": settle_before, "digest": profile_digest.to_dict(), "updated_at": now},
+                    "$setOnInsert": {"started_at": now},
+                },
+                upsert=True,
+            )
+        except PyMongoError as e:
+            # Os buckets já gravados guardam o próprio settled_until: refazer a faixa não conta duas vezes
+            logger.error(f"[video_metrics_service] Falha ao gravar etl_state de profile_id={profile_id}: {e}")
+            return {"status": "error", "profile_id": profile_id, "message": "Falha ao gravar o estado da retenção."}
+    settled_until = max(settle_before, state.get("settled_until") or "")
+
+    # 3. Insights de VIDEO novos desde a última execução
+    latest_insights = _latest_video_insights(profile_id, processed_until, insights_watermark)
+    if not latest_insights:
+        return {
+            "status": "ok", "profile_id": profile_id, "processed": 0, "settled": settled,
+            "message": "Nenhum insight novo de VIDEO desde a última execução."
+        }
+    new_insights_until = max(ins["collected_at"] for ins in latest_insights)
+
+    # 4. Calcular watch_time_per_view (só vídeos com views)
+    videometrics = {}
+    for ins in latest_insights:
+        wt_per_view = _watch_time_per_view(ins)
+        if wt_per_view is not None:
+            videometrics[ins["_id"]] = wt_per_view
+
+    if videometrics:
+        # 5. Percentile rank contra as baselines e montar as operações Bulk
+        baselines = _load_baselines(profile_id, profile_digest, calc_date)
+        empty = [suffix for suffix, digest in baselines.items() if not digest.count]
+        if empty:
+            # Nenhum Reel assentado na janela: ranqueia contra os ainda não assentados
+            provisional = _provisional_baselines(profile_id, settled_until, calc_date, insights_watermark)
+            for suffix in empty:
+                baselines[suffix] = provisional[suffix]
+        operations = []
+        for post_id, wt_per_view in videometrics.items():
+            scores = {
+                f"reel_retention_score{'_' + suffix if suffix else ''}":
+                    round(digest.cdf(wt_per_view), 4) if digest.count else None
+                for suffix, digest in baselines.items()
+            }
+            scores["reel_retention_provisional"] = bool(empty)
+            operations.append(
+                UpdateOne(
+                    {"post_id": post_id, "date": date_str},
+                    {"$set": {
+                        "watch_time_per_view": wt_per_view,
+                        **scores,
+                        "profile_id": profile_id  # fallback se engagement doc for upserted "cego"
+                    }},
+                    upsert=True
+                )
+            )
+
+        # 6. Efetivar no banco
         try:
             result = mongo_repo.engagement_metrics.bulk_write(operations, ordered=False)
             logger.info(f"[video_metrics_service] Bulk update finalizado. Modificados={result.modified_count}, Upserted={result.upserted_count}")
         except BulkWriteError as e:
             logger.error(f"[video_metrics_service] Erro BulkWrite: {e.details}")
-            
+            # Sem avançar o estado: os mesmos insights são reprocessados na próxima execução
+            return {"status": "error", "profile_id": profile_id, "message": "Falha ao gravar engagement_metrics."}
+
+    # 7. Avança o ponto processado
+    mongo_repo.etl_state.update_one(
+        {"job": RETENTION_JOB, "profile_id": profile_id},
+        {"$set": {"insights_until": new_insights_until, "updated_at": now}, "$setOnInsert": {"started_at": now}},
+        upsert=True,
+    )
+
     return {
-        "status": "ok", 
-        "profile_id": profile_id, 
-        "date": date_str, 
-        "processed": len(operations),
-        "message": f"Retenção calculada para {len(operations)} vídeos."
+        "status": "ok",
+        "profile_id": profile_id,
+        "date": date_str,
+        "processed": len(videometrics),
+        "settled": settled,
+        "videos_with_new_insights": len(latest_insights),
+        "message": f"Retenção calculada para {len(videometrics)} vídeos ({settled} novos na baseline)."
     }
@@ -0,0 +1,186 @@
+"""
+t-digest — sketch de quantis em streaming (Dunning & Ertl, "Computing Extremely
+Accurate Quantiles Using t-Digests").
+
+Resume uma distribuição em ~compression centroides (média, peso), com erro menor
+nas caudas. Permite percentile rank (cdf) e quantis sem guardar os valores, e dois
+digests podem ser combinados (merge) — é o que permite manter um digest por
+bucket e montar baselines (30d, 90d, histórico) juntando buckets.
+
+Implementação "merging": os valores novos vão para um buffer e, quando ele enche,
+são ordenados junto com os centroides e reagrupados pela função de escala k1
+(centroides pequenos perto de q=0 e q=1, maiores no meio).
+
+Serializável para o MongoDB:
+    digest.to_dict() -> {"compression", "centroids": [[média, peso], ...], "count", "min", "max"}
+    TDigest.from_dict(doc)
+
+Uso:
+    digest = TDigest()
+    digest.update([1.2, 3.4, 2.2])
+    digest.cdf(2.5)        # fração dos valores <= 2.5 (percentile rank 0-1)
+    digest.quantile(0.9)   # p90
+"""
+
+import math
+from bisect import bisect_left, bisect_right
+
+DEFAULT_COMPRESSION = 100.0
+
+
+class TDigest:
+    def __init__(self, compression: float = DEFAULT_COMPRESSION):
+        self.compression = float(compression)
+        self._means: list[float] = []
+        self._weights: list[float] = []
+        self._buffer: list[tuple[float, float]] = []
+        self._buffer_size = int(5 * self.compression)
+        self.count = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    # ─── Escrita ──────────────────────────────────────────────────────────────
+
+    def add(self, value: float, weight: float = 1.0) -> None:
+        """Adiciona um valor (com peso)."""
+        value = float(value)
+        self._buffer.append((value, float(weight)))
+        self.count += weight
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self._buffer) >= self._buffer_size:
+            self._compress()
+
+    def update(self, values) -> None:
+        """Adiciona vários valores de peso 1."""
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: "TDigest") -> None:
+        """Incorpora os centroides de outro digest."""
+        if not other.count:
+            return
+        other._compress()
+        self._buffer.extend(zip(other._means, other._weights))
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+
+    def _k(self, q: float) -> float:
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _k_inverse(self, k: float) -> float:
+        return (math.sin(k * 2 * math.pi / self.compression) + 1) / 2
+
+    def _compress(self) -> None:
+        if not self._buffer:
+            return
+        points = sorted(list(zip(self._means, self._weights)) + self._buffer)
+        self._buffer = []
+
+        total = sum(weight for _, weight in points)
+        means, weights = [], []
+        cur_mean, cur_weight = points[0]
+        weight_before = 0.0
+        q_limit = self._k_inverse(self._k(0.0) + 1)
+
+        for mean, weight in points[1:]:
+            if (weight_before + cur_weight + weight) / total <= q_limit:
+                # Cabe no centroide atual: média ponderada incremental
+                cur_weight += weight
+                cur_mean += (mean - cur_mean) * weight / cur_weight
+            else:
+                means.append(cur_mean)
+                weights.append(cur_weight)
+                weight_before += cur_weight
+                q_limit = self._k_inverse(self._k(weight_before / total) + 1)
+                cur_mean, cur_weight = mean, weight
+
+        means.append(cur_mean)
+        weights.append(cur_weight)
+        self._means, self._weights = means, weights
+
+    # ─── Leitura ──────────────────────────────────────────────────────────────
+
+    def _points(self) -> tuple[list[float], list[float]]:
+        """
+        Função de distribuição linear por partes: cada centroide fica no meio do
+        seu peso acumulado; min e max ancoram as pontas.
+        """
+        self._compress()
+        xs, ys = [], []
+        if self.min < self._means[0]:
+            xs.append(self.min)
+            ys.append(0.0)
+        cumulative = 0.0
+        for mean, weight in zip(self._means, self._weights):
+            xs.append(mean)
+            ys.append(cumulative + weight / 2)
+            cumulative += weight
+        if self.max > self._means[-1]:
+            xs.append(self.max)
+            ys.append(cumulative)
+        return xs, ys
+
+    def cdf(self, value: float) -> float:
+        """Percentile rank de `value` (0-1). NaN se o digest estiver vazio."""
+        if not self.count:
+            return math.nan
+        if value < self.min:
+            return 0.0
+        if value > self.max:
+            return 1.0
+
+        xs, ys = self._points()
+        lo, hi = bisect_left(xs, value), bisect_right(xs, value)
+        if lo < hi:
+            # Empates: posição média dos centroides com essa mesma média
+            return sum(ys[lo:hi]) / (hi - lo) / self.count
+        x0, x1, y0, y1 = xs[lo - 1], xs[lo], ys[lo - 1], ys[lo]
+        return (y0 + (y1 - y0) * (value - x0) / (x1 - x0)) / self.count
+
+    def quantile(self, q: float) -> float:
+        """Valor no quantil q (0-1). NaN se o digest estiver vazio."""
+        if not self.count:
+            return math.nan
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+
+        xs, ys = self._points()
+        target = q * self.count
+        i = bisect_left(ys, target)
+        if i == 0:
+            return xs[0]
+        if i == len(ys):
+            return xs[-1]
+        y0, y1 = ys[i - 1], ys[i]
+        return xs[i - 1] + (xs[i] - xs[i - 1]) * (target - y0) / (y1 - y0)
+
+    # ─── Serialização ─────────────────────────────────────────────────────────
+
+    def to_dict(self) -> dict:
+        self._compress()
+        return {
+            "compression": self.compression,
+            "centroids":   [[mean, weight] for mean, weight in zip(self._means, self._weights)],
+            "count":       self.count,
+            "min":         self.min if self.count else None,
+            "max":         self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, doc: dict) -> "TDigest":
+        digest = cls(doc.get("compression", DEFAULT_COMPRESSION))
+        centroids = doc.get("centroids") or []
+        digest._means = [float(mean) for mean, _ in centroids]
+        digest._weights = [float(weight) for _, weight in centroids]
+        digest.count = float(doc.get("count") or 0)
+        if digest.count:
+            digest.min, digest.max = float(doc["min"]), float(doc["max"])
+        return digest
+
+    def __len__(self) -> int:
+        return len(self._means) + len(self._buffer)
@@ -0,0 +1,490 @@
+"""
+Stub local da Graph API (Meta) para benchmark da camada Extract.
+
+Emula, com paginação por cursor, os endpoints usados pelos services:
+
+  GET  /{version}/me                      -> perfil (fluxo instagram)
+  GET  /{version}/{profile_id}            -> perfil (fluxo facebook)
+  GET  /{version}/{profile_id}/media      -> posts (fields=...)
+  GET  /{version}/{profile_id}/insights   -> métricas de interação / demográficos do perfil
+  GET  /{version}/{media_id}/insights     -> insights do post (metric=...)
+  GET  /{version}/{media_id}/comments     -> comentários (inclui field expansion replies.limit(n){...})
+  GET  /{version}/{comment_id}/replies    -> replies
+  POST /                                  -> batch (parâmetro batch=[{method, relative_url}])
+
+  GET  /__stats                           -> contadores de chamadas + dados do dataset
+  POST /__stats/reset                     -> zera os contadores
+
+Dataset:
+  Semeado a partir do snapshot mais recente em app/data/snapshots/technews24.7_*.json.
+  --posts N escala para N posts sintéticos (clones dos posts da fixture com ids,
+  datas e contadores variados); --comments-per-post e --reply-rate escalam os
+  comentários. Tudo determinístico por --seed.
+
+Falhas injetadas (por requisição ou item de batch):
+  --latency-ms / --jitter-ms  -> atraso de cada resposta
+  --error-rate                -> HTTP 500, code=2, is_transient=true
+  --throttle-rate             -> HTTP 403, code=80002 (throttling Instagram BUC)
+  --ineligible-rate           -> insights do post com code=100 / subcode=2108006 (post pré-Business)
+  --call-budget               -> chamadas/hora reportadas em X-App-Usage (0 = uso sempre 0%)
+
+Uso:
+  python -m benchmarks.graph_api_stub --port 8765 --posts 2000 --latency-ms 80
+
+  GRAPH_FACEBOOK_BASE_URL=http://127.0.0.1:8765 GRAPH_INSTAGRAM_BASE_URL=http://127.0.0.1:8765 \\
+      python -m benchmarks.run_extract_benchmark
+"""
+
+import re
+import glob
+import json
+import time
+import base64
+import random
+import asyncio
+import hashlib
+import argparse
+import logging
+from collections import Counter, deque
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+from urllib.parse import urlencode, urlsplit, parse_qsl
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+FIXTURES_GLOB = "app/data/snapshots/technews24.7_*.json"
+STUB_PROFILE_ID = "17841400000000001"
+
+DEFAULT_PAGE_LIMIT = 25
+MAX_PAGE_LIMIT = 100
+MAX_BATCH_SIZE = 50
+
+# type da fixture (Apify) -> media_type da Graph API
+FIXTURE_MEDIA_TYPES = {"Image": "IMAGE", "Carousel": "CAROUSEL_ALBUM", "Video": "VIDEO"}
+
+INELIGIBLE_SUBCODE = 2108006
+REPLY_TEXTS = ("Concordo!", "Boa pergunta", "Obrigado pelo feedback 🙌", "Também achei", "Verdade")
+
+# Divide "a,b.limit(5){c,d},e" só nas vírgulas de nível zero
+_FIELD_SPLIT = re.compile(r",(?![^{(]*[})])")
+_EXPANSION = re.compile(r"^(\w+)(?:\.limit\((\d+)\))?(?:\{(.*)\})?$")
+
+
+@dataclass
+class StubConfig:
+    profile_id: str = STUB_PROFILE_ID
+    fixtures_glob: str = FIXTURES_GLOB
+    posts: int = 0                    # 0 = posts da fixture
+    comments_per_post: int = -1       # -1 = comentários da fixture
+    reply_rate: float = 0.3
+    max_replies: int = 3
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    ineligible_rate: float = 0.1
+    call_budget: int = 0
+    seed: int = 42
+
+
+# ─── Dataset ──────────────────────────────────────────────────────────────────
+
+def _graph_ts(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%S+0000")
+
+
+def _parse_fixture_ts(ts: str) -> datetime:
+    return datetime.strptime(ts, "%Y-%m-%dT%H:%M:%S%z").replace(tzinfo=None)
+
+
+def _load_latest_fixture(pattern: str) -> dict:
+    paths = glob.glob(pattern)
+    if not paths:
+        raise FileNotFoundError(f"Nenhuma fixture encontrada em {pattern}")
+    fixtures = [json.load(open(path, encoding="utf-8")) for path in paths]
+    return max(fixtures, key=lambda f: f.get("collected_at", ""))
+
+
+class StubDataset:
+    """Perfil, posts, comentários e replies em memória, indexados por id."""
+
+    def __init__(self, config: StubConfig):
+        rng = random.Random(config.seed)
+        fixture = _load_latest_fixture(config.fixtures_glob)
+        base_posts = sorted(fixture["posts"], key=lambda p: p["timestamp"], reverse=True)
+        total_posts = config.posts or len(base_posts)
+
+        self.posts: list[dict] = []
+        self.comments: dict[str, dict] = {}
+        self.media: dict[str, dict] = {}
+
+        for i in range(total_posts):
+            src = base_posts[i % len(base_posts)]
+            generation = i // len(base_posts)
+            post = self._build_post(src, i, generation, rng)
+            post["_comments"] = self._build_comments(src, post, config, rng)
+            post["comments_count"] = len(post["_comments"]) + sum(len(c["_replies"]) for c in post["_comments"])
+            self.posts.append(post)
+            self.media[post["id"]] = post
+
+        profile = fixture["profile"]
+        self.profile = {
+            "id":              config.profile_id,
+            "username":        fixture.get("username"),
+            "name":            profile.get("name"),
+            "biography":       profile.get("biography"),
+            "website":         profile.get("website"),
+            "followers_count": profile.get("followers_count", 0),
+            "follows_count":   profile.get("follows_count", 0),
+            "media_count":     total_posts,
+            "profile_picture_url": None,
+        }
+
+    @staticmethod
+    def _build_post(src: dict, index: int, generation: int, rng: random.Random) -> dict:
+        published = _parse_fixture_ts(src["timestamp"]) - timedelta(days=7 * generation, minutes=index % 60)
+        scale = 1.0 if generation == 0 else rng.uniform(0.5, 1.5)
+        insights = {k: (round(v * scale) if isinstance(v, (int, float)) else v)
+                    for k, v in (src.get("insights") or {}).items()}
+        media_type = FIXTURE_MEDIA_TYPES.get(src.get("type"), "IMAGE")
+        short_code = f"{src.get('shortCode', 'STUB')}{index:05d}"
+        return {
+            "id":             str(19_000_000_000_000_000 + index),
+            "caption":        src.get("caption", ""),
+            "media_type":     media_type,
+            "media_url":      f"https://cdn.stub.local/{short_code}.jpg",
+            "thumbnail_url":  f"https://cdn.stub.local/{short_code}_thumb.jpg" if media_type == "VIDEO" else None,
+            "permalink":      f"https://www.instagram.com/p/{short_code}/",
+            "timestamp":      _graph_ts(published),
+            "like_count":     insights.get("likes") or round(src.get("likesCount", 0) * scale),
+            "_insights":      insights,
+        }
+
+    def _build_comments(self, src: dict, post: dict, config: StubConfig, rng: random.Random) -> list[dict]:
+        base_comments = src.get("comments") or []
+        count = len(base_comments) if config.comments_per_post < 0 else config.comments_per_post
+        published = _parse_fixture_ts(post["timestamp"])
+        comments = []
+        for j in range(count):
+            base = base_comments[j % len(base_comments)] if base_comments else {}
+            comment_id = f"{post['id']}{j:05d}"
+            created = published + timedelta(minutes=17 * (j + 1))
+            comment = {
+                "id":         comment_id,
+                "text":       base.get("text", f"Comentário {j}"),
+                "timestamp":  _graph_ts(created),
+                "like_count": base.get("like_count", 0),
+                "username":   base.get("username", f"usuario_{j}"),
+                "_replies":   [],
+            }
+            if rng.random() < config.reply_rate:
+                for k in range(rng.randint(1, max(1, config.max_replies))):
+                    comment["_replies"].append({
+                        "id":        f"{comment_id}{k:03d}",
+                        "text":      rng.choice(REPLY_TEXTS),
+                        "timestamp": _graph_ts(created + timedelta(minutes=5 * (k + 1))),
+                        "username":  f"resposta_{k}",
+                    })
+            comments.append(comment)
+            self.comments[comment_id] = comment
+        return comments
+
+
+# ─── Helpers de resposta ──────────────────────────────────────────────────────
+
+def _graph_error(status: int, message: str, code: int, subcode: int | None = None,
+                 is_transient: bool = False, error_type: str = "OAuthException") -> tuple[int, dict]:
+    error = {"message": message, "type": error_type, "code": code, "is_transient": is_transient,
+             "fbtrace_id": hashlib.md5(message.encode()).hexdigest()[:11]}
+    if subcode is not None:
+        error["error_subcode"] = subcode
+    return status, {"error": error}
+
+
+def _parse_fields(fields: str | None) -> list[str]:
+    return [f.strip() for f in _FIELD_SPLIT.split(fields or "") if f.strip()]
+
+
+def _project(obj: dict, fields: list[str]) -> dict:
+    """Aplica ?fields= (campos simples; expansões são tratadas por quem chama)."""
+    if not fields:
+        fields = ["id"]
+    return {f: obj.get(f) for f in fields if not f.startswith("_") and f in obj}
+
+
+def _encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(str(offset).encode()).decode()
+
+
+def _decode_cursor(cursor: str | None) -> int:
+    if not cursor:
+        return 0
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except ValueError:
+        return 0
+
+
+def _page(items: list, query: dict, base: str, path: str, render) -> dict:
+    """Fatia uma lista com limit/after e monta o bloco paging como a Graph API."""
+    limit = min(int(query.get("limit") or DEFAULT_PAGE_LIMIT), MAX_PAGE_LIMIT)
+    offset = _decode_cursor(query.get("after"))
+    chunk = items[offset:offset + limit]
+    body = {"data": [render(item) for item in chunk]}
+    if chunk:
+        body["paging"] = {"cursors": {"before": _encode_cursor(offset), "after": _encode_cursor(offset + len(chunk))}}
+        if offset + len(chunk) < len(items):
+            next_query = {k: v for k, v in query.items() if k != "after"}
+            next_query["after"] = _encode_cursor(offset + len(chunk))
+            body["paging"]["next"] = f"{base}{path}?{urlencode(next_query)}"
+    return body
+
+
+# ─── Servidor ─────────────────────────────────────────────────────────────────
+
+class GraphApiStub:
+    """Roteamento, injeção de falhas e contadores — independente do FastAPI para servir também o batch."""
+
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self.data = StubDataset(config)
+        self.rng = random.Random(config.seed + 1)
+        self.counters: Counter = Counter()
+        self._call_times: deque = deque()
+
+    # --- usage / falhas ---
+
+    def usage_headers(self) -> dict:
+        now = time.monotonic()
+        self._call_times.append(now)
+        while self._call_times and self._call_times[0] < now - 3600:
+            self._call_times.popleft()
+        pct = 0
+        if self.config.call_budget:
+            pct = min(100, round(100 * len(self._call_times) / self.config.call_budget))
+        return {"X-App-Usage": json.dumps({"call_count": pct, "total_time": pct, "total_cputime": pct})}
+
+    def _inject_failure(self) -> tuple[int, dict] | None:
+        if self.rng.random() < self.config.throttle_rate:
+            self.counters["throttles_injected"] += 1
+            return _graph_error(403, "Application request limit reached", 80002, error_type="OAuthException")
+        if self.rng.random() < self.config.error_rate:
+            self.counters["errors_injected"] += 1
+            return _graph_error(500, "An unexpected error has occurred. Please retry your request later.",
+                                2, is_transient=True)
+        return None
+
+    def _is_ineligible(self, media_id: str) -> bool:
+        bucket = int(hashlib.md5(media_id.encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+        return bucket < self.config.ineligible_rate
+
+    # --- dispatch ---
+
+    def dispatch(self, path: str, query: dict, base: str) -> tuple[int, dict]:
+        """Resolve um GET /{version}/{node}[/{edge}] (chamada direta ou item de batch)."""
+        if not query.get("access_token"):
+            return _graph_error(400, "An active access token must be used to query information.", 2500)
+
+        failure = self._inject_failure()
+        if failure:
+            return failure
+
+        parts = [p for p in path.strip("/").split("/") if p]
+        if len(parts) < 2 or not parts[0].startswith("v"):
+            return _graph_error(400, f"Unknown path components: /{path}", 2500)
+        node, edge = parts[1], (parts[2] if len(parts) > 2 else None)
+        path = "/" + "/".join(parts)
+
+        if node in ("me", self.config.profile_id):
+            return self._profile(edge, path, query, base)
+        if node in self.data.media:
+            return self._media(self.data.media[node], edge, path, query, base)
+        if node in self.data.comments and edge == "replies":
+            self.counters["replies"] += 1
+            comment = self.data.comments[node]
+            fields = _parse_fields(query.get("fields"))
+            return 200, _page(comment["_replies"], query, base, path, lambda r: _project(r, fields))
+        return _graph_error(400, f"Unsupported get request. Object with ID '{node}' does not exist", 100, 33,
+                            error_type="GraphMethodException")
+
+    def _profile(self, edge: str | None, path: str, query: dict, base: str) -> tuple[int, dict]:
+        if edge is None:
+            self.counters["profile"] += 1
+            return 200, _project(self.data.profile, _parse_fields(query.get("fields")))
+        if edge == "media":
+            self.counters["media"] += 1
+            fields = _parse_fields(query.get("fields"))
+            return 200, _page(self.data.posts, query, base, path, lambda p: _project(p, fields))
+        if edge == "insights":
+            self.counters["profile_insights"] += 1
+            return 200, self._profile_insights(query)
+        return _graph_error(400, f"Tried accessing nonexisting field ({edge})", 100)
+
+    def _profile_insights(self, query: dict) -> dict:
+        metrics = [m for m in (query.get("metric") or "").split(",") if m]
+        breakdown = query.get("breakdown")
+        followers = self.data.profile["followers_count"] or 0
+        data = []
+        for name in metrics:
+            if breakdown:
+                results = [{"dimension_values": [dim], "value": value} for dim, value in (
+                    ("BR", round(followers * 0.8)), ("US", round(followers * 0.1)), ("PT", round(followers * 0.1)),
+                )]
+                total = {"value": followers, "breakdowns": [{"dimension_keys": [breakdown], "results": results}]}
+            else:
+                total = {"value": sum(p["_insights"].get("reach") or 0 for p in self.data.posts[:10])}
+            data.append({"name": name, "period": query.get("period", "day"), "total_value": total,
+                         "id": f"{self.config.profile_id}/insights/{name}/{query.get('period', 'day')}"})
+        return {"data": data}
+
+    def _media(self, post: dict, edge: str | None, path: str, query: dict, base: str) -> tuple[int, dict]:
+        if edge is None:
+            self.counters["media_node"] += 1
+            return 200, _project(post, _parse_fields(query.get("fields")))
+
+        if edge == "insights":
+            self.counters["insights"] += 1
+            if self._is_ineligible(post["id"]):
+                self.counters["ineligible"] += 1
+                return _graph_error(400, "(#100) Media Posted Before Business Account Conversion", 100,
+                                    INELIGIBLE_SUBCODE)
+            data = []
+            for name in (query.get("metric") or "").split(","):
+                value = post["_insights"].get(name)
+                if value is None:
+                    value = round((post["_insights"].get("reach") or 0) * 0.1)
+                data.append({"name": name, "period": "lifetime", "values": [{"value": value}],
+                             "id": f"{post['id']}/insights/{name}/lifetime"})
+            return 200, {"data": data}
+
+        if edge == "comments":
+            self.counters["comments"] += 1
+            fields = _parse_fields(query.get("fields"))
+            return 200, _page(post["_comments"], query, base, path,
+                              lambda c: self._render_comment(c, fields, base, path.split("/")[1], query))
+
+        return _graph_error(400, f"Tried accessing nonexisting field ({edge})", 100)
+
+    def _render_comment(self, comment: dict, fields: list[str], base: str, version: str, query: dict) -> dict:
+        simple = [f for f in fields if "{" not in f and "." not in f]
+        body = _project(comment, simple)
+        for field in fields:
+            match = _EXPANSION.match(field)
+            if not match or match.group(1) != "replies" or not (match.group(2) or match.group(3)):
+                continue
+            replies_query = {"access_token": query.get("access_token"), "limit": match.group(2) or DEFAULT_PAGE_LIMIT}
+            if match.group(3):
+                replies_query["fields"] = match.group(3)
+            reply_fields = _parse_fields(match.group(3))
+            if comment["_replies"]:
+                body["replies"] = _page(
+                    comment["_replies"], replies_query, base, f"/{version}/{comment['id']}/replies",
+                    lambda r: _project(r, reply_fields),
+                )
+        return body
+
+    def dispatch_batch(self, form: dict, base: str) -> tuple[int, list | dict]:
+        """POST / com batch=[...]: cada item resolvido por dispatch(), com seu próprio code/body."""
+        try:
+            items = json.loads(form.get("batch") or "[]")
+        except ValueError:
+            return _graph_error(400, "The parameter batch must be a valid JSON array", 100)
+        if len(items) > MAX_BATCH_SIZE:
+            return _graph_error(400, f"Too many requests in batch message. Maximum batch size is {MAX_BATCH_SIZE}", 100)
+
+        self.counters["batch"] += 1
+        responses = []
+        for item in items:
+            self.counters["batch_items"] += 1
+            parts = urlsplit("/" + item.get("relative_url", "").lstrip("/"))
+            query = dict(parse_qsl(parts.query))
+            query.setdefault("access_token", form.get("access_token"))
+            code, body = self.dispatch(parts.path, query, base)
+            responses.append({"code": code, "headers": [], "body": json.dumps(body)})
+        return 200, responses
+
+    def stats(self) -> dict:
+        return {
+            "profile_id": self.config.profile_id,
+            "dataset": {
+                "posts": len(self.data.posts),
+                "comments": len(self.data.comments),
+                "replies": sum(len(c["_replies"]) for c in self.data.comments.values()),
+            },
+            "config": asdict(self.config),
+            "counters": dict(self.counters),
+        }
+
+
+def create_app(config: StubConfig) -> FastAPI:
+    stub = GraphApiStub(config)
+    app = FastAPI(title="Graph API stub")
+    app.state.stub = stub
+
+    async def _delay():
+        delay_ms = config.latency_ms + (random.uniform(-config.jitter_ms, config.jitter_ms) if config.jitter_ms else 0)
+        if delay_ms > 0:
+            await asyncio.sleep(delay_ms / 1000)
+
+    @app.get("/__stats")
+    async def get_stats():
+        return stub.stats()
+
+    @app.post("/__stats/reset")
+    async def reset_stats():
+        stub.counters.clear()
+        return stub.stats()
+
+    @app.api_route("/{path:path}", methods=["GET", "POST"])
+    async def graph(path: str, request: Request):
+        await _delay()
+        stub.counters["requests"] += 1
+        base = str(request.base_url).rstrip("/")
+        headers = stub.usage_headers()
+
+        if request.method == "POST":
+            form = dict(parse_qsl((await request.body()).decode()))
+            form.update(request.query_params)
+            if path.strip("/") or "batch" not in form:
+                status, body = _graph_error(400, "Unsupported post request", 100)
+            else:
+                status, body = stub.dispatch_batch(form, base)
+        else:
+            status, body = stub.dispatch(path, dict(request.query_params), base)
+
+        return JSONResponse(body, status_code=status, headers=headers)
+
+    return app
+
+
+def _parse_args(argv=None) -> tuple[argparse.Namespace, StubConfig]:
+    defaults = StubConfig()
+    parser = argparse.ArgumentParser(description="Stub local da Graph API para benchmarks da camada Extract")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    for field, value in asdict(defaults).items():
+        parser.add_argument(f"--{field.replace('_', '-')}", type=type(value), default=value)
+    args = parser.parse_args(argv)
+    config = StubConfig(**{field: getattr(args, field) for field in asdict(defaults)})
+    return args, config
+
+
+def main(argv=None):
+    import uvicorn
+
+    args, config = _parse_args(argv)
+    app = create_app(config)
+    stats = app.state.stub.stats()["dataset"]
+    logger.info(
+        f"[graph_api_stub] Servindo {stats['posts']} posts, {stats['comments']} comentários, "
+        f"{stats['replies']} replies em http://{args.host}:{args.port}"
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    main()
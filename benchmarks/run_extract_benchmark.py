@@ -0,0 +1,263 @@
+"""
+Benchmark ponta a ponta da camada Extract contra o stub local da Graph API.
+
+Roda os entry points dos services na ordem do DAG diário e, por etapa, mede:
+
+  wall_s        -> tempo de parede do run_*_service
+  http          -> requisições HTTP recebidas pelo stub (1 batch = 1 requisição)
+  batch_items   -> sub-requisições dentro de chamadas batch
+  endpoints     -> chamadas por endpoint emulado (media, insights, comments, replies...)
+  mongo_ops     -> comandos enviados ao MongoDB (pymongo CommandListener), por comando
+
+Etapas: media_discovery, snapshot, media_and_snapshot, post_insights, comments.
+Default: a sequência do DAG diário (media_and_snapshot, post_insights, comments);
+media_discovery e snapshot isolados servem para comparar com a passada única de /media.
+
+O harness aponta os services para o stub via GRAPH_FACEBOOK_BASE_URL /
+GRAPH_INSTAGRAM_BASE_URL e grava num banco próprio (--db, default
+ig_analytics_bench) — nunca use o banco de produção aqui: --reset apaga o banco
+inteiro antes de rodar. O token e o perfil do stub são semeados em oauth_tokens
+e ig_profiles.
+
+Uso (MONGO_URI vem do .env / ambiente, como no app):
+  python -m benchmarks.run_extract_benchmark --start-stub --reset --posts 2000 --latency-ms 80
+  python -m benchmarks.run_extract_benchmark --stub-url http://127.0.0.1:8765 --stages post_insights,comments
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import threading
+import subprocess
+from collections import Counter
+from datetime import datetime, timezone
+
+import requests
+from dotenv import dotenv_values
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STUB_URL = "http://127.0.0.1:8765"
+DEFAULT_BENCH_DB = "ig_analytics_bench"
+STUB_TOKEN = "stub-benchmark-token"
+ENV_FILE = os.path.join(os.path.dirname(__file__), "..", "app", "config", ".env")
+
+STAGES = ("media_discovery", "snapshot", "media_and_snapshot", "post_insights", "comments")
+DEFAULT_STAGES = ("media_and_snapshot", "post_insights", "comments")
+
+# Parâmetros repassados ao stub quando iniciado pelo harness (--start-stub)
+STUB_OPTIONS = (
+    "posts", "comments_per_post", "reply_rate", "latency_ms", "jitter_ms",
+    "error_rate", "throttle_rate", "ineligible_rate", "call_budget", "seed",
+)
+
+# Comandos de handshake/monitoramento do driver — não são operações do ETL
+IGNORED_MONGO_COMMANDS = {
+    "hello", "ismaster", "isMaster", "ping", "buildInfo", "endSessions",
+    "saslStart", "saslContinue", "getLastError",
+}
+
+
+class MongoOpCounter(monitoring.CommandListener):
+    """Conta os comandos enviados ao MongoDB (insert, update, find, getMore...)."""
+
+    def __init__(self):
+        self.counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name not in IGNORED_MONGO_COMMANDS:
+            with self._lock:
+                self.counts[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def snapshot_and_reset(self) -> Counter:
+        with self._lock:
+            counts, self.counts = self.counts, Counter()
+        return counts
+
+
+def _start_stub(args) -> subprocess.Popen:
+    port = args.stub_url.rsplit(":", 1)[-1].strip("/")
+    cmd = [sys.executable, "-m", "benchmarks.graph_api_stub", "--port", port]
+    for option in STUB_OPTIONS:
+        value = getattr(args, option)
+        if value is not None:
+            cmd += [f"--{option.replace('_', '-')}", str(value)]
+    logger.info(f"[benchmark] Iniciando stub: {' '.join(cmd[1:])}")
+    return subprocess.Popen(cmd)
+
+
+def _wait_for_stub(stub_url: str, timeout: float = 60.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return requests.get(f"{stub_url}/__stats", timeout=2).json()
+        except requests.RequestException:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Stub da Graph API não respondeu em {stub_url}")
+            time.sleep(0.5)
+
+
+def _seed_profile(mongo_repo, profile_id: str) -> None:
+    """Token válido + perfil ativo para o profile_id do stub (fluxo facebook)."""
+    now = datetime.now(timezone.utc)
+    mongo_repo.oauth_tokens.update_one(
+        {"profile_id": profile_id},
+        {"$set": {
+            "profile_id": profile_id,
+            "long_lived_token": STUB_TOKEN,
+            "auth_method": "facebook",
+            "is_valid": True,
+            "updated_at": now,
+        }, "$setOnInsert": {"created_at": now}},
+        upsert=True,
+    )
+    mongo_repo.ig_profiles.update_one(
+        {"profile_id": profile_id},
+        {"$set": {"profile_id": profile_id, "username": "stub_benchmark", "is_active": True},
+         "$setOnInsert": {"created_at": now}},
+        upsert=True,
+    )
+
+
+def _stage_runners() -> dict:
+    # Import tardio: os módulos leem GRAPH_*_BASE_URL / DB_NAME na importação
+    from app.services.media_discovery_service import run_media_discovery_service
+    from app.services.snapshot_service import run_snapshot_service, run_media_and_snapshot_service
+    from app.services.insights_service import run_post_insights_service
+    from app.services.comments_service import run_comments_service
+
+    return {
+        "media_discovery": run_media_discovery_service,
+        "snapshot":        run_snapshot_service,
+        "media_and_snapshot": run_media_and_snapshot_service,
+        "post_insights":   run_post_insights_service,
+        "comments":        run_comments_service,
+    }
+
+
+def run_benchmark(args) -> list[dict]:
+    os.environ["GRAPH_FACEBOOK_BASE_URL"] = args.stub_url
+    os.environ["GRAPH_INSTAGRAM_BASE_URL"] = args.stub_url
+    os.environ["DB_NAME"] = args.db
+
+    op_counter = MongoOpCounter()
+    monitoring.register(op_counter)   # precisa vir antes da criação do MongoClient
+
+    stub_info = _wait_for_stub(args.stub_url)
+    profile_id = stub_info["profile_id"]
+    logger.info(f"[benchmark] Stub pronto: profile_id={profile_id} | dataset={stub_info['dataset']}")
+
+    from app.repositories.mongo_repository import mongo_repo
+
+    if args.reset:
+        logger.warning(f"[benchmark] Apagando banco {args.db}")
+        mongo_repo.client.drop_database(args.db)
+        mongo_repo.create_indexes()
+    _seed_profile(mongo_repo, profile_id)
+
+    runners = _stage_runners()
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    results = []
+
+    for stage in stages:
+        requests.post(f"{args.stub_url}/__stats/reset", timeout=5)
+        op_counter.snapshot_and_reset()
+
+        started = time.perf_counter()
+        outcome = runners[stage](profile_id)
+        wall_s = time.perf_counter() - started
+
+        counters = requests.get(f"{args.stub_url}/__stats", timeout=5).json()["counters"]
+        mongo_ops = op_counter.snapshot_and_reset()
+        results.append({
+            "stage":       stage,
+            "status":      outcome.get("status"),
+            "wall_s":      round(wall_s, 3),
+            "http":        counters.pop("requests", 0),
+            "batch_items": counters.pop("batch_items", 0),
+            "endpoints":   counters,
+            "mongo_ops":   sum(mongo_ops.values()),
+            "mongo_by_command": dict(mongo_ops),
+            "result":      outcome,
+        })
+        logger.info(f"[benchmark] {stage}: {wall_s:.2f}s | {outcome.get('message')}")
+
+    return results
+
+
+def _print_report(results: list[dict]) -> None:
+    header = f"{'stage':<16} {'status':<7} {'wall_s':>8} {'http':>7} {'batch_it':>9} {'mongo_ops':>10}  detalhes"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        endpoints = ", ".join(f"{k}={v}" for k, v in sorted(r["endpoints"].items()))
+        mongo = ", ".join(f"{k}={v}" for k, v in sorted(r["mongo_by_command"].items()))
+        print(
+            f"{r['stage']:<16} {str(r['status']):<7} {r['wall_s']:>8.2f} {r['http']:>7} "
+            f"{r['batch_items']:>9} {r['mongo_ops']:>10}  api[{endpoints}] mongo[{mongo}]"
+        )
+    total = sum(r["wall_s"] for r in results)
+    print(f"{'total':<16} {'':<7} {total:>8.2f} {sum(r['http'] for r in results):>7} "
+          f"{sum(r['batch_items'] for r in results):>9} {sum(r['mongo_ops'] for r in results):>10}")
+
+
+def _parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark da camada Extract contra o stub da Graph API")
+    parser.add_argument("--stub-url", default=DEFAULT_STUB_URL)
+    parser.add_argument("--db", default=DEFAULT_BENCH_DB, help="Banco MongoDB do benchmark (não use o de produção)")
+    parser.add_argument("--reset", action="store_true", help="Apaga o banco --db antes de rodar")
+    parser.add_argument("--stages", default=",".join(DEFAULT_STAGES))
+    parser.add_argument("--json", dest="json_path", help="Grava os resultados completos neste arquivo")
+    parser.add_argument("--start-stub", action="store_true", help="Inicia o stub como subprocesso")
+    # Repassados ao stub com --start-stub (ver benchmarks/graph_api_stub.py)
+    parser.add_argument("--posts", type=int)
+    parser.add_argument("--comments-per-post", type=int)
+    parser.add_argument("--reply-rate", type=float)
+    parser.add_argument("--latency-ms", type=float)
+    parser.add_argument("--jitter-ms", type=float)
+    parser.add_argument("--error-rate", type=float)
+    parser.add_argument("--throttle-rate", type=float)
+    parser.add_argument("--ineligible-rate", type=float)
+    parser.add_argument("--call-budget", type=int)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    configured_db = os.getenv("DB_NAME") or dotenv_values(ENV_FILE).get("DB_NAME")
+    if args.db == configured_db:
+        parser.error(f"--db={args.db} é o banco configurado no ambiente; use um banco dedicado ao benchmark")
+    unknown = set(s.strip() for s in args.stages.split(",") if s.strip()) - set(STAGES)
+    if unknown:
+        parser.error(f"Etapas desconhecidas: {', '.join(sorted(unknown))} (disponíveis: {', '.join(STAGES)})")
+    return args
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    stub = _start_stub(args) if args.start_stub else None
+    try:
+        results = run_benchmark(args)
+    finally:
+        if stub:
+            stub.terminate()
+            stub.wait(timeout=10)
+
+    _print_report(results)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, default=str, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    main()
@@ -0,0 +1,40 @@
+"""
+Fixtures compartilhadas (dependências de teste em requirements-dev.txt).
+
+app.repositories.mongo_repository conecta (e cria os índices) na importação. Os
+testes trocam o MongoClient por um mongomock.MongoClient antes de qualquer import
+de app.*, e a fixture `mongo` limpa o banco entre os testes.
+
+O pymongo >= 4.11 passa sort= para UpdateOne/ReplaceOne no bulk_write, que o
+mongomock 4.3 ainda não aceita; o argumento é descartado (nenhum service o usa).
+"""
+
+import os
+
+import mongomock
+import pymongo
+import pytest
+
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "ig_analysis_test")
+pymongo.MongoClient = mongomock.MongoClient
+
+
+def _ignore_sort(method):
+    def wrapper(self, *args, sort=None, **kwargs):
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+for _name in ("add_update", "add_replace"):
+    setattr(mongomock.collection.BulkOperationBuilder, _name,
+            _ignore_sort(getattr(mongomock.collection.BulkOperationBuilder, _name)))
+
+
+@pytest.fixture
+def mongo():
+    from app.repositories.mongo_repository import mongo_repo
+
+    for name in mongo_repo.db.list_collection_names():
+        mongo_repo.db[name].delete_many({})
+    return mongo_repo
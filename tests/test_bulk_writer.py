@@ -0,0 +1,75 @@
+import pytest
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from app.repositories.bulk_writer import BulkInserter, DUPLICATE_KEY_ERROR, insert_many_unordered
+
+
+class FakeCollection:
+    """insert_many que devolve um BulkWriteError pré-montado (ou grava tudo)."""
+
+    name = "fake"
+
+    def __init__(self, error=None):
+        self.error = error
+        self.batches = []
+
+    def insert_many(self, docs, ordered=True):
+        assert ordered is False
+        self.batches.append(list(docs))
+        if self.error:
+            raise self.error
+
+        class Result:
+            inserted_ids = [object() for _ in docs]
+        return Result()
+
+
+def _bulk_error(n_inserted: int, codes: dict[int, int]) -> BulkWriteError:
+    return BulkWriteError({
+        "nInserted": n_inserted,
+        "writeErrors": [{"index": index, "code": code, "errmsg": f"code {code}"} for index, code in codes.items()],
+    })
+
+
+def test_duplicates_are_not_counted_as_errors():
+    docs = [{"post_id": str(i)} for i in range(5)]
+    collection = FakeCollection(_bulk_error(3, {1: DUPLICATE_KEY_ERROR, 3: DUPLICATE_KEY_ERROR}))
+
+    outcome = insert_many_unordered(collection, docs, key_field="post_id")
+
+    assert (outcome.inserted, outcome.duplicates, outcome.errors) == (3, 2, 0)
+
+
+def test_other_write_errors_are_counted_apart_from_duplicates():
+    docs = [{"post_id": str(i)} for i in range(4)]
+    collection = FakeCollection(_bulk_error(2, {0: DUPLICATE_KEY_ERROR, 2: 121}))
+
+    outcome = insert_many_unordered(collection, docs, key_field="post_id")
+
+    assert (outcome.inserted, outcome.duplicates, outcome.errors) == (2, 1, 1)
+
+
+def test_whole_batch_failure_counts_every_document_as_error():
+    docs = [{"post_id": str(i)} for i in range(3)]
+
+    outcome = insert_many_unordered(FakeCollection(AutoReconnect("rede")), docs)
+
+    assert (outcome.inserted, outcome.duplicates, outcome.errors) == (0, 0, 3)
+
+
+def test_bulk_inserter_flushes_per_batch_and_accumulates(mongo):
+    mongo.comments.insert_one({"comment_id": "c1", "post_id": "p1", "profile_id": "u1"})
+
+    with BulkInserter(mongo.comments, key_field="comment_id", batch_size=2) as writer:
+        writer.extend({"comment_id": f"c{i}", "post_id": "p1", "profile_id": "u1"} for i in range(5))
+
+    assert (writer.result.inserted, writer.result.duplicates, writer.result.errors) == (4, 1, 0)
+    assert mongo.comments.count_documents({}) == 5
+
+
+@pytest.mark.parametrize("batch_size, expected_batches", [(2, 3), (10, 1)])
+def test_bulk_inserter_batch_size(batch_size, expected_batches):
+    collection = FakeCollection()
+    with BulkInserter(collection, batch_size=batch_size) as writer:
+        writer.extend({"i": i} for i in range(5))
+    assert len(collection.batches) == expected_batches
@@ -0,0 +1,85 @@
+import json
+import os
+
+import pytest
+
+from app.repositories.graph_api_client import GraphApiClient, GraphApiError
+
+
+class FakeResponse:
+    status_code = 200
+    headers: dict = {}
+
+    def __init__(self, payload):
+        self._payload = payload
+        self.text = json.dumps(payload)
+
+    def json(self):
+        return self._payload
+
+
+class FakeSession:
+    """Session que devolve uma resposta batch fixa e guarda as requisições feitas."""
+
+    def __init__(self, items):
+        self.items = items
+        self.calls = []
+
+    def request(self, method, url, params=None, data=None, timeout=None):
+        self.calls.append({"method": method, "url": url, "data": data})
+        return FakeResponse(self.items)
+
+
+def _client(items) -> GraphApiClient:
+    client = GraphApiClient()
+    client._session, client._pid = FakeSession(items), os.getpid()
+    return client
+
+
+def _ok(body: dict) -> dict:
+    return {"code": 200, "headers": [], "body": json.dumps(body)}
+
+
+def _error(code: int, subcode: int | None = None, status: int = 400) -> dict:
+    return {"code": status, "body": json.dumps({"error": {"message": "erro", "code": code, "error_subcode": subcode}})}
+
+
+def test_batch_results_keep_the_order_of_the_sub_requests():
+    urls = ["v25.0/1/insights?metric=reach", "v25.0/2/insights?metric=reach", "v25.0/3/insights?metric=reach"]
+    client = _client([_ok({"id": "1"}), _error(10, 2108006), _ok({"id": "3"})])
+
+    results = client.batch("https://graph.facebook.com", urls, access_token="token")
+
+    assert results[0] == {"id": "1"}
+    assert isinstance(results[1], GraphApiError)
+    assert (results[1].code, results[1].error_subcode, results[1].status_code) == (10, 2108006, 400)
+    assert results[2] == {"id": "3"}
+
+    (call,) = client._session.calls
+    assert call["method"] == "POST"
+    assert [item["relative_url"] for item in json.loads(call["data"]["batch"])] == urls
+
+
+def test_null_items_become_errors_instead_of_shifting_the_results():
+    client = _client([None, _ok({"id": "2"})])
+
+    results = client.batch("https://graph.facebook.com", ["v25.0/1", "v25.0/2"], access_token="token")
+
+    assert isinstance(results[0], GraphApiError)
+    assert results[1] == {"id": "2"}
+
+
+def test_throttled_items_block_the_token_once():
+    client = _client([_error(80002), _error(80002), _ok({"id": "3"})])
+    calls = []
+    client.governor.on_throttled = lambda token, code: calls.append(code)
+
+    results = client.batch("https://graph.facebook.com", ["v25.0/1", "v25.0/2", "v25.0/3"], access_token="token")
+
+    assert [r.is_throttling for r in results[:2]] == [True, True]
+    assert calls == [80002]
+
+
+def test_batch_rejects_more_than_the_graph_api_limit():
+    with pytest.raises(ValueError):
+        _client([]).batch("https://graph.facebook.com", ["v25.0/1"] * 51, access_token="token")
@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from app.repositories import graph_rate_governor
+from app.repositories.graph_rate_governor import (
+    RateGovernor,
+    THROTTLE_COOLDOWN_SECONDS,
+    token_key,
+)
+
+TOKEN = "token-de-teste"
+
+
+class FakeClock:
+    """time.monotonic/time.sleep controláveis: sleep só avança o relógio."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+        self.slept += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(graph_rate_governor.time, "monotonic", fake.monotonic)
+    monkeypatch.setattr(graph_rate_governor.time, "sleep", fake.sleep)
+    return fake
+
+
+def _buc_headers(pct: float) -> dict:
+    return {"X-Business-Use-Case-Usage": json.dumps(
+        {"17841400000000000": [{"type": "instagram", "call_count": pct, "total_time": 1, "total_cputime": 1}]}
+    )}
+
+
+def test_single_throttle_pauses_only_for_the_cooldown(clock):
+    governor = RateGovernor()
+    governor.after_response(TOKEN, _buc_headers(40))
+    governor.on_throttled(TOKEN, 17)
+
+    governor.before_request(TOKEN)
+    assert clock.slept == pytest.approx(THROTTLE_COOLDOWN_SECONDS)
+
+    # Depois do cooldown vale a última leitura real (40%): sem pausa nem desaceleração
+    clock.slept = 0.0
+    governor.before_request(TOKEN)
+    assert clock.slept == 0.0
+
+
+def test_repeated_throttles_from_one_batch_do_not_extend_the_block(clock):
+    governor = RateGovernor()
+    for _ in range(50):
+        governor.on_throttled(TOKEN, 80002)
+
+    governor.before_request(TOKEN)
+    assert clock.slept == pytest.approx(THROTTLE_COOLDOWN_SECONDS)
+
+
+def test_high_usage_pause_lets_one_probe_through_after_the_cooldown(clock):
+    governor = RateGovernor()
+    governor.after_response(TOKEN, _buc_headers(99))
+    key = token_key(TOKEN)
+
+    wait, recheck = governor._wait_seconds(key)
+    assert recheck and wait == pytest.approx(THROTTLE_COOLDOWN_SECONDS)
+
+    clock.now += THROTTLE_COOLDOWN_SECONDS
+    assert governor._wait_seconds(key) == (0.0, False)        # sonda
+    wait, recheck = governor._wait_seconds(key)               # demais callers seguem pausados
+    assert recheck and wait >= 1
+
+    # Os headers da sonda substituem a estimativa
+    governor.after_response(TOKEN, _buc_headers(10))
+    assert governor._wait_seconds(key) == (0.0, False)
+    assert governor.usage(TOKEN) == pytest.approx(10)
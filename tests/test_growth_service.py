@@ -0,0 +1,51 @@
+from datetime import date, timedelta
+
+from app.services.growth_service import growth_series
+
+
+def _snapshots(days_with_followers: dict[int, int], start: date = date(2026, 1, 1)) -> list[dict]:
+    return [
+        {"date": (start + timedelta(days=offset)).isoformat(), "followers_count": followers, "media_count": offset}
+        for offset, followers in sorted(days_with_followers.items())
+    ]
+
+
+def test_consecutive_days_use_the_previous_day():
+    series = growth_series(_snapshots({0: 100, 1: 110}))
+
+    assert series[0]["ref_date_1d"] is None
+    assert series[1]["followers_growth_1d"] == 10
+    assert series[1]["followers_growth_1d_pct"] == 0.1
+    assert series[1]["ref_date_1d"] == "2026-01-01"
+
+
+def test_missing_days_fall_back_to_the_last_snapshot_within_the_gap():
+    # Dias 1-4 sem snapshot: no dia 9 a referência de 7d (dia 2) não existe,
+    # o último snapshot em ou antes dela é o dia 0 — dentro da lacuna de 3 dias
+    series = growth_series(_snapshots({0: 100, 5: 130, 9: 150}))
+
+    assert series[2]["ref_date_7d"] == "2026-01-01"
+    assert series[2]["followers_growth_7d"] == 50
+    assert series[2]["media_growth_7d"] == 9
+
+
+def test_reference_older_than_the_gap_gives_no_growth():
+    # Dia 1 só tem o dia 0 como referência de 1d (lacuna de 1 dia ok); o dia 20 não tem
+    # nada em [18, 19] para 1d nem em [10, 13] para 7d
+    series = growth_series(_snapshots({0: 100, 1: 101, 20: 200}))
+
+    last = series[2]
+    assert last["ref_date_1d"] is None and last["followers_growth_1d"] == 0
+    assert last["ref_date_7d"] is None and last["followers_growth_7d"] == 0
+    assert last["ref_date_28d"] is None
+
+
+def test_windows_are_independent():
+    followers = {offset: 1000 + offset for offset in range(0, 31)}
+    series = growth_series(_snapshots(followers))
+
+    last = series[-1]
+    assert last["followers_growth_1d"] == 1
+    assert last["followers_growth_7d"] == 7
+    assert last["followers_growth_28d"] == 28
+    assert last["ref_date_90d"] is None
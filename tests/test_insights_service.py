@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services.insights_service import select_posts_due
+
+NOW = datetime(2026, 3, 17, 3, 0, tzinfo=timezone.utc)
+PROFILE_ID = "17841400000000000"
+
+
+def _post(post_id: str, age_days: float) -> dict:
+    return {"post_id": post_id, "media_type": "IMAGE", "published_at": NOW - timedelta(days=age_days)}
+
+
+def _collect(mongo, post_id: str, hours_ago: float, reach: int = 100) -> None:
+    mongo.post_insights.insert_one({
+        "post_id": post_id, "profile_id": PROFILE_ID,
+        "collected_at": NOW - timedelta(hours=hours_ago),
+        "reach": reach, "saved": 1, "shares": 1, "total_interactions": 10,
+    })
+
+
+def _due_ids(posts: list[dict]) -> set[str]:
+    return {post["post_id"] for post in select_posts_due(PROFILE_ID, posts, NOW)}
+
+
+def test_post_without_history_is_always_due(mongo):
+    assert _due_ids([_post("p1", 400)]) == {"p1"}
+
+
+@pytest.mark.parametrize("age_days, hours_ago, due", [
+    # Primeira semana: intervalo de 1 dia, com 2h de tolerância
+    (3, 22, True),
+    (3, 21.5, False),
+    # 7 dias exatos já é a faixa de 3 dias
+    (7, 23, False),
+    (7, 70, True),
+    (29, 69, False),
+    # 30 dias -> faixa semanal
+    (30, 71, False),
+    (30, 7 * 24 - 2, True),
+    # Mais de um ano -> mensal
+    (365, 29 * 24, False),
+    (365, 30 * 24 - 2, True),
+])
+def test_tier_boundaries(mongo, age_days, hours_ago, due):
+    _collect(mongo, "p1", hours_ago)
+    assert _due_ids([_post("p1", age_days)]) == ({"p1"} if due else set())
+
+
+def test_volatile_post_moves_to_the_previous_tier(mongo):
+    # 10 dias (faixa de 3 dias), coletado há 23h: só vence se as duas últimas coletas variaram ≥ 5%
+    _collect(mongo, "stable", 47, reach=100)
+    _collect(mongo, "stable", 23, reach=102)
+    _collect(mongo, "volatile", 47, reach=100)
+    _collect(mongo, "volatile", 23, reach=110)
+
+    assert _due_ids([_post("stable", 10), _post("volatile", 10)]) == {"volatile"}
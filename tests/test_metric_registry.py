@@ -0,0 +1,71 @@
+import math
+
+import numpy as np
+import pytest
+
+from app.services.metric_registry import INPUT_COLUMNS, METRICS, build_columns, evaluate, mql_expressions
+
+ROWS = [
+    # Caso comum
+    {"likes": 120, "comments": 8, "followers": 2000, "prev_likes": 100, "prev_comments": 10, "has_prev": True,
+     "reach": 900, "shares": 12, "saved": 5, "total_interactions": 145, "views": 3000},
+    # Denominadores zerados: divisão por 1, não inf/NaN
+    {"likes": 5, "comments": 1, "followers": 0, "prev_likes": 0, "prev_comments": 0, "has_prev": False,
+     "reach": 0, "shares": 3, "saved": 0, "total_interactions": 9, "views": 0},
+    # Contadores que caíram desde o snapshot anterior: velocity nunca negativa
+    {"likes": 50, "comments": 2, "followers": 10, "prev_likes": 60, "prev_comments": 5, "has_prev": True,
+     "reach": 40, "shares": 0, "saved": 1, "total_interactions": 53, "views": 70},
+]
+
+
+def _kernel(rows: list[dict]) -> dict[str, list]:
+    columns = {
+        col: np.array([row[col] for row in rows], dtype=bool if col == "has_prev" else np.float64)
+        for col in INPUT_COLUMNS
+    }
+    return evaluate(columns)
+
+
+def test_kernel_matches_the_mql_formulas(mongo):
+    collection = mongo.db["metric_registry_parity"]
+    collection.insert_many([{"row": i, **row} for i, row in enumerate(ROWS)])
+
+    server = list(collection.aggregate([
+        {"$sort": {"row": 1}},
+        {"$project": {"_id": 0, **mql_expressions()}},
+    ]))
+    kernel = _kernel(ROWS)
+
+    for name in METRICS:
+        for i, doc in enumerate(server):
+            assert kernel[name][i] == pytest.approx(doc[name]), (name, i)
+
+
+def test_divide_by_zero_uses_denominator_one():
+    values = _kernel([ROWS[1]])
+
+    assert values["er_simple"] == [6.0]
+    assert values["er_reach"] == [9.0]
+    assert values["er_views"] == [9.0]
+    assert values["amplification_rate"] == [3.0]
+    assert all(math.isfinite(v[0]) for v in values.values())
+
+
+def test_velocity_is_non_negative_and_zero_without_previous_snapshot():
+    values = _kernel(ROWS)
+
+    assert values["velocity_likes_24h"] == [20, 0, 0]
+    assert values["velocity_comments_24h"] == [0, 0, 0]
+    assert all(isinstance(v, int) for v in values["velocity_likes_24h"])
+
+
+def test_build_columns_treats_missing_documents_as_zero():
+    columns = build_columns(
+        snapshots=[{"like_count": 10, "comments_count": 2, "followers_at_date": 100}],
+        insights=[None],
+        prev_snapshots=[None],
+    )
+
+    assert columns["reach"].tolist() == [0.0]
+    assert columns["has_prev"].tolist() == [False]
+    assert evaluate(columns, ["er_simple"]) == {"er_simple": [0.12]}
@@ -0,0 +1,45 @@
+import math
+import random
+
+import pytest
+
+from app.utils.tdigest import TDigest
+
+
+def test_empty_digest_has_no_rank():
+    assert math.isnan(TDigest().cdf(1.0))
+
+
+def test_cdf_matches_the_empirical_rank():
+    rng = random.Random(7)
+    values = [rng.uniform(0, 1000) for _ in range(20_000)]
+    digest = TDigest()
+    digest.update(values)
+
+    ordered = sorted(values)
+    for q in (0.01, 0.1, 0.5, 0.9, 0.99):
+        assert digest.cdf(ordered[int(q * len(ordered))]) == pytest.approx(q, abs=0.01)
+
+
+def test_values_outside_the_range_clamp_to_zero_and_one():
+    digest = TDigest()
+    digest.update([10, 20, 30])
+
+    assert digest.cdf(5) == 0.0
+    assert digest.cdf(35) == 1.0
+
+
+def test_merge_and_serialization_preserve_the_distribution():
+    rng = random.Random(11)
+    left, right, whole = TDigest(), TDigest(), TDigest()
+    for _ in range(5_000):
+        value = rng.gauss(100, 15)
+        (left if rng.random() < 0.5 else right).add(value)
+        whole.add(value)
+
+    merged = TDigest.from_dict(left.to_dict())
+    merged.merge(TDigest.from_dict(right.to_dict()))
+
+    assert merged.count == whole.count
+    for value in (70, 100, 130):
+        assert merged.cdf(value) == pytest.approx(whole.cdf(value), abs=0.01)